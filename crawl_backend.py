@@ -10,12 +10,18 @@ import sys
 import os
 import logging
 from io import StringIO
-from contextlib import redirect_stdout, redirect_stderr
+from contextlib import redirect_stdout, redirect_stderr, nullcontext
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
 from crawl4ai import BFSDeepCrawlStrategy, DFSDeepCrawlStrategy
 from urllib.parse import urljoin, urlparse
 from collections import deque
 
+from crawl_cache import CrawlCache
+from crawl_frontier import CrawlFrontier, default_checkpoint_path
+from crawl_scheduler import default_scheduler
+from crawl_progress import ProgressReporter, progress_file_path, write_progress_file
+from crawl_boilerplate import BoilerplateFilter
+
 # Suppress Crawl4AI logging output to keep JSON clean
 os.environ['CRAWL4AI_QUIET'] = '1'
 
@@ -26,8 +32,41 @@ logging.basicConfig(
     format='%(levelname)s: %(message)s'
 )
 
+def current_rss_bytes():
+    """Resident set size of this process in bytes (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+def page_record(page_result):
+    """Convert a crawl result into a {url, content, wordCount, title} page record (title may be empty)"""
+    content = page_result.markdown if hasattr(page_result, 'markdown') else ""
+    word_count = len(content.split()) if content else 0
+    
+    # Extract title from metadata or URL
+    title = ""
+    if hasattr(page_result, 'metadata') and page_result.metadata:
+        title = page_result.metadata.get('title', '')
+    if not title and hasattr(page_result, 'url'):
+        # Use last part of URL as title
+        title = page_result.url.split('/')[-1] or page_result.url
+    
+    return {
+        "url": page_result.url if hasattr(page_result, 'url') else "Unknown",
+        "content": content,
+        "wordCount": word_count,
+        "title": title
+    }
+
 async def crawl(url, extraction_type="markdown", js_code=None, css_selector=None, llm_prompt=None, headless=True, 
-                deep_crawl=False, crawl_strategy="bfs", max_pages=10, stream_progress=False, session_id=None):
+                deep_crawl=False, crawl_strategy="bfs", max_pages=10, stream_progress=False, session_id=None,
+                use_cache=False, on_page=None, on_progress=None, crawler=None, checkpoint=None, resume=False,
+                scheduler=None, strip_boilerplate=False):
     """
     Main crawl function that processes different extraction strategies
     
@@ -41,40 +80,31 @@ async def crawl(url, extraction_type="markdown", js_code=None, css_selector=None
         deep_crawl: Whether to crawl multiple pages (entire site)
         crawl_strategy: Strategy for deep crawling (bfs or dfs)
         max_pages: Maximum number of pages to crawl (limit for safety)
-        stream_progress: Whether to stream progress updates to stderr
+        stream_progress: Whether to stream PROGRESS: lines to stderr
         session_id: Session ID for progress tracking via file
+        use_cache: Revalidate pages against the persistent crawl cache (markdown only)
+        on_page: Optional callback receiving each page record as soon as it is extracted
+                 (deep crawl only). Streamed pages are not kept in the returned result.
+        on_progress: Optional callback receiving each progress update dict
+        crawler: Already-started AsyncWebCrawler to reuse (e.g. from the crawl service
+                 pool). It is left running and its output is not redirected.
+        checkpoint: SQLite file to checkpoint the deep-crawl frontier and pages to
+        resume: Continue an interrupted deep crawl from its checkpoint (uses a
+                default checkpoint path derived from the URL if none is given)
+        scheduler: CrawlScheduler for per-host rate limits and retries (default: the
+                   process-wide scheduler shared by all crawls)
+        strip_boilerplate: Remove blocks repeated across the crawled pages (nav,
+                           headers, footers) from page content (deep crawl only).
+                           The first pages are held back until repeats can be told apart.
     """
     
-    def write_progress(crawled, total, current_url="", status="crawling"):
-        """Write progress to file for polling"""
-        if session_id:
-            progress_file = f"/tmp/crawl_progress_{session_id}.json"
-            progress_data = {
-                "crawled": crawled,
-                "total": total if total != float('inf') else "unlimited",
-                "currentUrl": current_url,
-                "status": status
-            }
-            try:
-                with open(progress_file, 'w') as f:
-                    json.dump(progress_data, f)
-            except Exception as e:
-                # Don't fail crawl if progress writing fails
-                pass
+    # Throttled progress: file (atomic), stderr stream and callback sinks
+    reporter = ProgressReporter(session_id=session_id, stream=stream_progress, on_progress=on_progress)
+    
+    def write_progress(crawled, total, current_url="", status="crawling", memory=None):
+        """Report progress to the configured sinks (rate-limited)"""
+        reporter.update(crawled, total, current_url, status, memory)
     
-    def emit_progress(crawled, total, current_url=""):
-        """Emit progress to stderr for streaming API"""
-        if stream_progress:
-            progress_data = json.dumps({
-                "crawled": crawled,
-                "total": total if total != float('inf') else "unlimited",
-                "currentUrl": current_url,
-                "status": "crawling"
-            })
-            print(f"PROGRESS:{progress_data}", file=sys.stderr, flush=True)
-        
-        # Always write to file if session_id exists
-        write_progress(crawled, total, current_url)
     try:
         # Configure browser - disable verbose logging
         browser_config = BrowserConfig(
@@ -110,163 +140,241 @@ async def crawl(url, extraction_type="markdown", js_code=None, css_selector=None
                     max_pages=actual_max_pages
                 )
         
-        # Redirect stdout/stderr during crawling to suppress Crawl4AI output
-        stdout_buffer = StringIO()
-        stderr_buffer = StringIO()
+        # Per-host politeness, adaptive concurrency and retries
+        scheduler = scheduler or default_scheduler()
         
-        # Create crawler and run
-        if stream_progress:
-            # Don't redirect stderr when streaming progress
-            with redirect_stdout(stdout_buffer):
-                async with AsyncWebCrawler(config=browser_config) as crawler:
-                    if deep_crawl and crawl_strategy_obj:
-                        write_progress(0, actual_max_pages, url, "starting")
+        # Reuse stored markdown for unchanged pages (markdown extraction only)
+        cache = CrawlCache() if use_cache and extraction_type == "markdown" else None
+        
+        async def fetch_page(crawler, page_url):
+            """Fetch one page, revalidating against the crawl cache when possible"""
+            entry = cache.get(page_url) if cache else None
+            content_hash = None
+            if entry:
+                status, validators = await asyncio.to_thread(cache.revalidate, entry)
+                if status in ("not_modified", "unchanged"):
+                    cache.touch(page_url, validators)
+                    return cache.to_page(entry)
+                content_hash = validators.get("content_hash")
+            
+            result = await crawler.arun(url=page_url, config=run_config)
+            if cache and getattr(result, 'success', True) and (getattr(result, 'status_code', None) or 200) < 400:
+                headers = {key.lower() for key in (getattr(result, 'response_headers', None) or {})}
+                if content_hash is None and not headers & {"etag", "last-modified"}:
+                    # Without validators the next crawl can only compare body hashes - record one now
+                    content_hash = await asyncio.to_thread(cache.body_hash, page_url)
+                cache.store(page_url, result, content_hash=content_hash)
+            return result
+        
+        async def scheduled_fetch(crawler, page_url):
+            """Fetch through the scheduler (rate limits, backoff and retries)"""
+            return await scheduler.fetch(page_url, lambda u: fetch_page(crawler, u))
+        
+        async def fetch_compact(crawler, page_url):
+            """
+            Fetch a page and reduce it to (page record, internal links) as soon as it arrives,
+            so the raw and cleaned HTML, links and media are freed while the rest of the wave
+            is still in flight
+            """
+            result = await scheduled_fetch(crawler, page_url)
+            internal_links = []
+            if hasattr(result, 'links') and result.links:
+                internal_links = [l.get('href', '') for l in result.links.get('internal', [])]
+            return page_record(result), internal_links
+        
+        async def run_deep_crawl(crawler):
+            """Custom deep crawl with progress tracking"""
+            write_progress(0, actual_max_pages, url, "starting")
+            
+            crawled_results = []
+            failed = []
+            stats = {"pages": 0, "words": 0, "retained_bytes": 0, "failed": failed}
+            base_domain = urlparse(url).netloc
+            boilerplate = BoilerplateFilter() if strip_boilerplate else None
+            stats["boilerplate"] = boilerplate
+            
+            def emit_page(page):
+                """Hand a finished page off (or retain it)"""
+                stats["words"] += page["wordCount"]
+                if on_page:
+                    # Hand the page off immediately instead of holding it until the end
+                    on_page(page)
+                else:
+                    crawled_results.append(page)
+                    stats["retained_bytes"] += len(page["content"].encode('utf-8')) if page["content"] else 0
+            
+            def keep_page(page):
+                """Count a crawled page and pass it through the boilerplate filter"""
+                stats["pages"] += 1
+                ready = boilerplate.add(page) if boilerplate else [page]
+                for ready_page in ready:
+                    emit_page(ready_page)
+                return len(page["content"].encode('utf-8')) if page["content"] else 0
+            
+            # Checkpoint the frontier so an interrupted crawl can be resumed
+            frontier = None
+            if checkpoint or resume:
+                frontier = CrawlFrontier(checkpoint or default_checkpoint_path(url), url, crawl_strategy, resume)
+            
+            if frontier and frontier.resumed:
+                visited = frontier.load_visited()
+                to_visit = frontier.load_queue()
+                for page in frontier.replay_pages():
+                    keep_page(page)
+                print(f"Resuming crawl: {stats['pages']} pages done, {len(to_visit)} URLs queued", file=sys.stderr)
+            else:
+                visited = set()
+                to_visit = deque([url])
+            
+            # URLs popped off the queue since the last checkpoint
+            popped = 0
+            
+            try:
+                while to_visit and stats["pages"] < actual_max_pages:
+                    # Take the next wave of unvisited URLs, sized by what the host currently
+                    # allows. DFS stays one page at a time so children come before siblings.
+                    wave_size = scheduler.concurrency(url) if crawl_strategy == "bfs" else 1
+                    wave_size = min(wave_size, actual_max_pages - stats["pages"])
+                    wave = []
+                    while to_visit and len(wave) < wave_size:
+                        current_url = to_visit.popleft()
+                        popped += 1
                         
-                        # Custom deep crawl with progress tracking
-                        visited = set()
-                        to_visit = deque([url])
-                        crawled_results = []
-                        base_domain = urlparse(url).netloc
+                        # Skip if already visited
+                        if current_url in visited:
+                            continue
                         
-                        while to_visit and len(crawled_results) < actual_max_pages:
-                            current_url = to_visit.popleft()
-                            
-                            # Skip if already visited
-                            if current_url in visited:
-                                continue
-                            
-                            visited.add(current_url)
-                            
-                            try:
-                                # Crawl the current page
-                                write_progress(len(crawled_results), actual_max_pages, current_url, "crawling")
-                                
-                                result = await crawler.arun(url=current_url, config=run_config)
-                                crawled_results.append(result)
-                                
-                                # Extract links from the page (only same domain)
-                                if hasattr(result, 'links') and result.links:
-                                    for link_data in result.links.get('internal', []):
-                                        link_url = link_data.get('href', '')
-                                        if link_url:
-                                            # Make absolute URL
-                                            absolute_url = urljoin(current_url, link_url)
-                                            parsed = urlparse(absolute_url)
-                                            
-                                            # Only add if same domain and not visited
-                                            if parsed.netloc == base_domain and absolute_url not in visited:
-                                                if crawl_strategy == "bfs":
-                                                    to_visit.append(absolute_url)  # BFS: add to end
-                                                else:
-                                                    to_visit.appendleft(absolute_url)  # DFS: add to front
-                                
-                            except Exception as e:
-                                # Skip failed pages
-                                print(f"Failed to crawl {current_url}: {str(e)}", file=sys.stderr)
-                                continue
+                        visited.add(current_url)
+                        wave.append((current_url, popped))
+                        popped = 0
+                    
+                    if not wave:
+                        break
+                    
+                    # Crawl the wave concurrently. Nothing is reported until it finishes,
+                    # so deliver the update the rate limit may be holding back first
+                    write_progress(stats["pages"], actual_max_pages, wave[0][0], "crawling")
+                    reporter.flush()
+                    results = await asyncio.gather(
+                        *(fetch_compact(crawler, wave_url) for wave_url, _ in wave),
+                        return_exceptions=True
+                    )
+                    
+                    # Process in queue order so checkpoints mirror the deque
+                    for (current_url, pops), result in zip(wave, results):
+                        if isinstance(result, BaseException):
+                            if not isinstance(result, Exception):
+                                raise result
+                            # Record the failure instead of silently dropping the page
+                            print(f"Failed to crawl {current_url}: {str(result)}", file=sys.stderr)
+                            failed.append({
+                                "url": current_url,
+                                "status": getattr(result, 'status', None),
+                                "error": str(result)
+                            })
+                            if frontier:
+                                frontier.checkpoint(pops, current_url)
+                            continue
                         
-                        write_progress(len(crawled_results), actual_max_pages, "Processing results...", "processing")
-                    else:
-                        result = await crawler.arun(
-                            url=url,
-                            config=run_config
-                        )
-                        crawled_results = None
-        else:
-            # Redirect both stdout and stderr
-            with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
-                async with AsyncWebCrawler(config=browser_config) as crawler:
-                    if deep_crawl and crawl_strategy_obj:
-                        # Custom deep crawl with progress tracking
-                        visited = set()
-                        to_visit = deque([url])
-                        crawled_results = []
-                        base_domain = urlparse(url).netloc
+                        page, internal_links = result
+                        page["title"] = page["title"] or f"Page {stats['pages'] + 1}"
                         
-                        while to_visit and len(crawled_results) < actual_max_pages:
-                            current_url = to_visit.popleft()
-                            
-                            # Skip if already visited
-                            if current_url in visited:
-                                continue
-                            
-                            visited.add(current_url)
-                            
-                            try:
-                                # Crawl the current page
-                                write_progress(len(crawled_results), actual_max_pages, current_url, "crawling")
-                                
-                                result = await crawler.arun(url=current_url, config=run_config)
-                                crawled_results.append(result)
+                        # Queue links from the page (only same domain)
+                        new_links = []
+                        for link_url in internal_links:
+                            if link_url:
+                                # Make absolute URL
+                                absolute_url = urljoin(current_url, link_url)
+                                parsed = urlparse(absolute_url)
                                 
-                                # Extract links from the page (only same domain)
-                                if hasattr(result, 'links') and result.links:
-                                    for link_data in result.links.get('internal', []):
-                                        link_url = link_data.get('href', '')
-                                        if link_url:
-                                            # Make absolute URL
-                                            absolute_url = urljoin(current_url, link_url)
-                                            parsed = urlparse(absolute_url)
-                                            
-                                            # Only add if same domain and not visited
-                                            if parsed.netloc == base_domain and absolute_url not in visited:
-                                                if crawl_strategy == "bfs":
-                                                    to_visit.append(absolute_url)  # BFS: add to end
-                                                else:
-                                                    to_visit.appendleft(absolute_url)  # DFS: add to front
-                                
-                            except Exception as e:
-                                # Skip failed pages
-                                continue
+                                # Only add if same domain and not visited
+                                if parsed.netloc == base_domain and absolute_url not in visited:
+                                    new_links.append(absolute_url)
+                                    if crawl_strategy == "bfs":
+                                        to_visit.append(absolute_url)  # BFS: add to end
+                                    else:
+                                        to_visit.appendleft(absolute_url)  # DFS: add to front
+                        
+                        if frontier:
+                            frontier.checkpoint(pops, current_url, page, new_links, front=crawl_strategy != "bfs")
                         
-                        write_progress(len(crawled_results), actual_max_pages, "Processing results...", "processing")
-                    else:
-                        result = await crawler.arun(
-                            url=url,
-                            config=run_config
-                        )
-                        crawled_results = None
+                        page_bytes = keep_page(page)
+                        write_progress(stats["pages"], actual_max_pages, current_url, "crawling", memory={
+                            "pageBytes": page_bytes,
+                            "retainedBytes": stats["retained_bytes"],
+                            "rssBytes": current_rss_bytes()
+                        })
+            except BaseException:
+                # Keep the checkpoint for --resume
+                if frontier:
+                    frontier.close()
+                raise
+            
+            if frontier:
+                frontier.close(completed=True)
+            if boilerplate:
+                for ready_page in boilerplate.flush():
+                    emit_page(ready_page)
+            
+            write_progress(stats["pages"], actual_max_pages, "Processing results...", "processing")
+            return crawled_results, stats
+        
+        async def run_with(crawler):
+            """Run the single-page or deep crawl on a started crawler"""
+            if deep_crawl and crawl_strategy_obj:
+                crawled_results, stats = await run_deep_crawl(crawler)
+                return None, crawled_results, stats
+            return await scheduled_fetch(crawler, url), None, None
+        
+        # Redirect stdout/stderr during crawling to suppress Crawl4AI output
+        stdout_buffer = StringIO()
+        stderr_buffer = StringIO()
+        
+        # Don't redirect stderr when streaming progress
+        redirect_err = nullcontext() if stream_progress else redirect_stderr(stderr_buffer)
+        
+        # Create crawler and run
+        try:
+            if crawler is not None:
+                # Pooled crawler - redirecting the process-wide stdout would race
+                # with the other jobs sharing this process
+                result, crawled_results, stats = await run_with(crawler)
+            else:
+                with redirect_stdout(stdout_buffer), redirect_err:
+                    async with AsyncWebCrawler(config=browser_config) as owned_crawler:
+                        result, crawled_results, stats = await run_with(owned_crawler)
+        finally:
+            if cache:
+                if deep_crawl:
+                    print(f"Crawl cache: {cache.hits} reused, {cache.misses} rendered", file=sys.stderr)
+                cache.close()
         
         # Process result based on extraction type (outside redirect blocks)
         if extraction_type == "markdown":
             # Handle deep crawl results
             if deep_crawl:
-                if crawled_results and len(crawled_results) > 0:
-                    pages = []
-                    total_words = 0
-                    
-                    # Process each crawled page
-                    for page_result in crawled_results:
-                        content = page_result.markdown if hasattr(page_result, 'markdown') else ""
-                        word_count = len(content.split()) if content else 0
-                        total_words += word_count
-                        
-                        # Extract title from metadata or URL
-                        title = ""
-                        if hasattr(page_result, 'metadata') and page_result.metadata:
-                            title = page_result.metadata.get('title', '')
-                        if not title and hasattr(page_result, 'url'):
-                            # Use last part of URL as title
-                            title = page_result.url.split('/')[-1] or page_result.url
-                        
-                        pages.append({
-                            "url": page_result.url if hasattr(page_result, 'url') else "Unknown",
-                            "content": content,
-                            "wordCount": word_count,
-                            "title": title or f"Page {len(pages) + 1}"
-                        })
-                    
+                if stats["pages"] > 0:
                     # Write final progress before returning
-                    write_progress(len(pages), actual_max_pages, "Completed", "completed")
+                    write_progress(stats["pages"], actual_max_pages, "Completed", "completed", memory={
+                        "retainedBytes": stats["retained_bytes"],
+                        "rssBytes": current_rss_bytes()
+                    })
                     
-                    return {
+                    response = {
                         "success": True,
                         "deepCrawl": True,
-                        "pages": pages,
-                        "totalPages": len(pages),
-                        "totalWords": total_words,
+                        "pages": crawled_results,
+                        "totalPages": stats["pages"],
+                        "totalWords": stats["words"],
+                        "failedPages": stats["failed"],
                         "status": "completed"
                     }
+                    if stats["boilerplate"]:
+                        response["boilerplate"] = stats["boilerplate"].summary()
+                    if on_page:
+                        # Pages were already handed to on_page
+                        response["streamed"] = True
+                    return response
                 else:
                     return {
                         "success": False,
@@ -328,9 +436,33 @@ async def crawl(url, extraction_type="markdown", js_code=None, css_selector=None
             "error": str(e)
         }
 
+def crawl_kwargs(params):
+    """Map a JSON crawl request (camelCase keys) onto crawl() keyword arguments"""
+    return {
+        "url": params.get("url"),
+        "extraction_type": params.get("extractionType", "markdown"),
+        "js_code": params.get("jsCode"),
+        "css_selector": params.get("cssSelector"),
+        "llm_prompt": params.get("llmPrompt"),
+        "headless": params.get("headless", True),
+        "deep_crawl": params.get("deepCrawl", False),
+        "crawl_strategy": params.get("crawlStrategy", "bfs"),
+        "max_pages": params.get("maxPages", 10),
+        "stream_progress": params.get("streamProgress", False),
+        "session_id": params.get("sessionId"),
+        "use_cache": params.get("useCache", False),
+        "checkpoint": params.get("checkpoint"),
+        "resume": params.get("resume", False),
+        "strip_boilerplate": params.get("stripBoilerplate", False)
+    }
+
 def main():
     """
     Main entry point - reads JSON from stdin and returns JSON to stdout
+    
+    With "streamPages": true, each deep-crawled page is printed as its own
+    {"type": "page", ...} line as soon as it is extracted, followed by a
+    final {"type": "result", ...} line without the page contents.
     """
     try:
         # Read input from stdin
@@ -338,17 +470,12 @@ def main():
         params = json.loads(input_data)
         
         # Extract parameters
-        url = params.get("url")
-        extraction_type = params.get("extractionType", "markdown")
-        js_code = params.get("jsCode")
-        css_selector = params.get("cssSelector")
-        llm_prompt = params.get("llmPrompt")
-        headless = params.get("headless", True)
-        deep_crawl = params.get("deepCrawl", False)
-        crawl_strategy = params.get("crawlStrategy", "bfs")
-        max_pages = params.get("maxPages", 10)
-        stream_progress = params.get("streamProgress", False)
-        session_id = params.get("sessionId")
+        kwargs = crawl_kwargs(params)
+        url = kwargs["url"]
+        deep_crawl = kwargs["deep_crawl"]
+        max_pages = kwargs["max_pages"]
+        session_id = kwargs["session_id"]
+        stream_pages = params.get("streamPages", False)
         
         # Validate URL
         if not url:
@@ -360,38 +487,29 @@ def main():
         
         # Write initial progress if session_id exists
         if session_id and deep_crawl:
-            progress_file = f"/tmp/crawl_progress_{session_id}.json"
-            actual_max = float('inf') if max_pages == 0 else max_pages
-            initial_progress = {
+            write_progress_file(session_id, {
                 "crawled": 0,
                 "total": "unlimited" if max_pages == 0 else max_pages,
                 "currentUrl": url,
                 "status": "initializing"
-            }
-            try:
-                with open(progress_file, 'w') as f:
-                    json.dump(initial_progress, f)
-            except:
-                pass
+            })
+        
+        # Keep a handle on the real stdout - crawl() redirects it while crawling
+        stdout = sys.stdout
+        
+        def print_page(page):
+            stdout.write(json.dumps({"type": "page", **page}) + "\n")
+            stdout.flush()
         
         # Run the crawl
         result = asyncio.run(crawl(
-            url=url,
-            extraction_type=extraction_type,
-            js_code=js_code,
-            css_selector=css_selector,
-            llm_prompt=llm_prompt,
-            headless=headless,
-            deep_crawl=deep_crawl,
-            crawl_strategy=crawl_strategy,
-            max_pages=max_pages,
-            stream_progress=stream_progress,
-            session_id=session_id
+            **kwargs,
+            on_page=print_page if stream_pages else None
         ))
         
         # Clean up progress file
         if session_id:
-            progress_file = f"/tmp/crawl_progress_{session_id}.json"
+            progress_file = progress_file_path(session_id)
             try:
                 if os.path.exists(progress_file):
                     os.remove(progress_file)
@@ -399,6 +517,8 @@ def main():
                 pass
         
         # Output result as JSON
+        if stream_pages:
+            result = {"type": "result", **result}
         print(json.dumps(result))
         sys.exit(0)
         
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Boilerplate stripping for crawled markdown
+Learns blocks that repeat across the pages of one crawl (nav sidebars,
+headers, footers, cookie banners) and removes them before pages are saved,
+so they are not chunked and embedded once per page.
+
+Pages are split into blank-line separated blocks. A block - or a link line
+inside a block, since nav lists often differ by one highlighted entry - is
+boilerplate when its hash appears on at least min_fraction of the pages seen
+so far. Fenced code blocks are never touched, and neither are headings or
+very short blocks: "## Parameters" or "Returns" repeat on every page of an API
+reference but carry the section context of the chunks around them.
+"""
+
+import hashlib
+import math
+import re
+from collections import Counter
+
+LINK_PATTERN = re.compile(r'\]\(')
+WHITESPACE = re.compile(r'\s+')
+HEADING = re.compile(r'^\s{0,3}#{1,6}\s')
+
+# Blocks of fewer words (without links) are kept even when they repeat
+MIN_BLOCK_WORDS = 4
+
+
+def _hash(kind: str, text: str) -> bytes:
+    normalized = WHITESPACE.sub(' ', text).strip()
+    return hashlib.blake2b(f"{kind}:{normalized}".encode('utf-8'), digest_size=8).digest()
+
+
+def split_segments(markdown: str):
+    """Split markdown into ("code" | "block", text) segments"""
+    segments = []
+    current = []
+    fence = None
+
+    for line in markdown.split('\n'):
+        stripped = line.strip()
+        if fence:
+            current.append(line)
+            if stripped.startswith(fence):
+                segments.append(("code", '\n'.join(current)))
+                current = []
+                fence = None
+            continue
+        if stripped.startswith('```') or stripped.startswith('~~~'):
+            if current:
+                segments.append(("block", '\n'.join(current)))
+            current = [line]
+            fence = stripped[:3]
+            continue
+        if not stripped:
+            if current:
+                segments.append(("block", '\n'.join(current)))
+                current = []
+            continue
+        current.append(line)
+
+    if current:
+        segments.append(("code" if fence else "block", '\n'.join(current)))
+    return segments
+
+
+def _is_link_line(line: str) -> bool:
+    return len(line.strip()) > 3 and bool(LINK_PATTERN.search(line))
+
+
+def _is_structural(text: str) -> bool:
+    """Headings and short label blocks: repeated, but part of the page's structure"""
+    lines = [line for line in text.split('\n') if line.strip()]
+    if all(HEADING.match(line) for line in lines):
+        return True
+    return len(text.split()) < MIN_BLOCK_WORDS and not LINK_PATTERN.search(text)
+
+
+class BoilerplateFilter:
+    def __init__(self, warmup_pages: int = 20, min_pages: int = 3, min_fraction: float = 0.5):
+        """
+        Args:
+            warmup_pages: Pages held back until block frequencies are meaningful
+            min_pages: A block must appear on at least this many pages
+            min_fraction: ... and on at least this fraction of the pages seen
+        """
+        self.warmup_pages = warmup_pages
+        self.min_pages = min_pages
+        self.min_fraction = min_fraction
+        self.counts = Counter()
+        self.pages_seen = 0
+        self.buffer = []
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.blocks_stripped = 0
+
+    def _page_hashes(self, content: str):
+        hashes = set()
+        for kind, text in split_segments(content or ""):
+            if kind == "code":
+                continue
+            if not _is_structural(text):
+                hashes.add(_hash("block", text))
+            for line in text.split('\n'):
+                if _is_link_line(line):
+                    hashes.add(_hash("line", line))
+        return hashes
+
+    def _is_boilerplate(self, digest: bytes) -> bool:
+        threshold = max(self.min_pages, math.ceil(self.min_fraction * self.pages_seen))
+        return self.counts[digest] >= threshold
+
+    def _strip(self, page: dict) -> dict:
+        content = page.get("content") or ""
+        kept = []
+        for kind, text in split_segments(content):
+            if kind == "code" or _is_structural(text):
+                kept.append(text)
+                continue
+            if self._is_boilerplate(_hash("block", text)):
+                self.blocks_stripped += 1
+                continue
+            lines = [line for line in text.split('\n')
+                     if not (_is_link_line(line) and self._is_boilerplate(_hash("line", line)))]
+            if len(lines) < len(text.split('\n')):
+                self.blocks_stripped += 1
+            if lines:
+                kept.append('\n'.join(lines))
+
+        stripped = '\n\n'.join(kept)
+        self.bytes_before += len(content.encode('utf-8'))
+        self.bytes_after += len(stripped.encode('utf-8'))
+        return {**page, "content": stripped, "wordCount": len(stripped.split()) if stripped else 0}
+
+    def add(self, page: dict):
+        """
+        Learn from a page and return the pages that are ready to be saved
+
+        The first warmup_pages pages are held back; after that each page is
+        returned (stripped) as soon as it is added.
+        """
+        self.counts.update(self._page_hashes(page.get("content")))
+        self.pages_seen += 1
+
+        if self.buffer is not None:
+            self.buffer.append(page)
+            if self.pages_seen < self.warmup_pages:
+                return []
+            return self.flush()
+        return [self._strip(page)]
+
+    def flush(self):
+        """Release any pages still held back by the warm-up"""
+        ready = [self._strip(page) for page in self.buffer or []]
+        self.buffer = None
+        return ready
+
+    def summary(self) -> dict:
+        return {
+            "blocksStripped": self.blocks_stripped,
+            "bytesBefore": self.bytes_before,
+            "bytesAfter": self.bytes_after
+        }
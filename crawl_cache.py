@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Persistent crawl cache
+Stores HTTP validators and extracted markdown per URL so re-crawls can
+revalidate pages with conditional requests instead of re-rendering them
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path(__file__).parent / "mcp-docs-server" / "data" / "crawl_cache.sqlite"
+
+REVALIDATE_USER_AGENT = "Mozilla/5.0 (compatible; crawl4ai-revalidator/1.0)"
+
+
+class CachedPage:
+    """Lightweight stand-in for a CrawlResult rebuilt from a cache entry"""
+
+    def __init__(self, url, markdown, title, links):
+        self.url = url
+        self.markdown = markdown
+        self.metadata = {"title": title} if title else {}
+        self.links = {"internal": [{"href": href} for href in links]}
+        self.success = True
+        self.from_cache = True
+
+
+def _header(headers, name):
+    """Case-insensitive header lookup on a plain dict"""
+    if not headers:
+        return None
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _hash_body(response):
+    digest = hashlib.sha256()
+    for block in iter(lambda: response.read(65536), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+class CrawlCache:
+    def __init__(self, path=None):
+        """
+        Open (or create) the crawl cache
+
+        Args:
+            path: SQLite file to use (default: CRAWL_CACHE_PATH or data/crawl_cache.sqlite)
+        """
+        self.path = Path(path or os.getenv("CRAWL_CACHE_PATH") or DEFAULT_CACHE_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                markdown TEXT,
+                title TEXT,
+                links TEXT,
+                fetched_at TEXT
+            )
+        """)
+        self.conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url: str):
+        """Return the cache entry for a URL, or None"""
+        row = self.conn.execute(
+            "SELECT etag, last_modified, content_hash, markdown, title, links FROM pages WHERE url = ?",
+            (url,)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            "url": url,
+            "etag": row[0],
+            "last_modified": row[1],
+            "content_hash": row[2],
+            "markdown": row[3] or "",
+            "title": row[4] or "",
+            "links": json.loads(row[5]) if row[5] else []
+        }
+
+    def body_hash(self, url: str, timeout: int = 15):
+        """
+        SHA-256 of a page's raw response body - what revalidate() compares (blocking - run in a thread)
+
+        Used when a page is first stored without an ETag or Last-Modified, so the
+        next crawl can already recognise it as unchanged. Returns None on error.
+        """
+        request = urllib.request.Request(url, headers={"User-Agent": REVALIDATE_USER_AGENT})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return _hash_body(response)
+        except Exception:
+            return None
+
+    def revalidate(self, entry: dict, timeout: int = 15):
+        """
+        Send a conditional GET for a cached page (blocking - run in a thread)
+
+        Returns:
+            (status, validators) where status is "not_modified", "unchanged",
+            "changed" or "error", and validators holds the fresh etag,
+            last_modified and content_hash reported by the server
+        """
+        request = urllib.request.Request(entry["url"], headers={"User-Agent": REVALIDATE_USER_AGENT})
+        if entry.get("etag"):
+            request.add_header("If-None-Match", entry["etag"])
+        if entry.get("last_modified"):
+            request.add_header("If-Modified-Since", entry["last_modified"])
+
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                validators = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "content_hash": _hash_body(response)
+                }
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return "not_modified", {
+                    "etag": e.headers.get("ETag") or entry.get("etag"),
+                    "last_modified": e.headers.get("Last-Modified") or entry.get("last_modified"),
+                    "content_hash": entry.get("content_hash")
+                }
+            return "error", {}
+        except Exception:
+            return "error", {}
+
+        if entry.get("content_hash") and validators["content_hash"] == entry["content_hash"]:
+            return "unchanged", validators
+        return "changed", validators
+
+    def touch(self, url: str, validators: dict):
+        """Refresh the validators of an entry whose content was reused"""
+        self.hits += 1
+        self.conn.execute(
+            """UPDATE pages SET etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified),
+               content_hash = COALESCE(?, content_hash), fetched_at = ? WHERE url = ?""",
+            (validators.get("etag"), validators.get("last_modified"), validators.get("content_hash"),
+             datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'), url)
+        )
+        self.conn.commit()
+
+    def store(self, url: str, result, content_hash: str = None):
+        """Store a freshly rendered CrawlResult"""
+        self.misses += 1
+        headers = getattr(result, 'response_headers', None) or {}
+        title = ""
+        if getattr(result, 'metadata', None):
+            title = result.metadata.get('title', '') or ""
+        links = []
+        if getattr(result, 'links', None):
+            links = [l.get('href', '') for l in result.links.get('internal', []) if l.get('href')]
+
+        self.conn.execute(
+            """INSERT OR REPLACE INTO pages (url, etag, last_modified, content_hash, markdown, title, links, fetched_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (url, _header(headers, "etag"), _header(headers, "last-modified"), content_hash,
+             str(result.markdown or ""), title, json.dumps(links),
+             datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'))
+        )
+        self.conn.commit()
+
+    def to_page(self, entry: dict) -> CachedPage:
+        """Rebuild a page object from a cache entry"""
+        return CachedPage(entry["url"], entry["markdown"], entry["title"], entry["links"])
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Crawl Service Client
+Submits crawl jobs to a running crawl_service.py. Standard library only, so
+callers don't pay for importing crawl4ai when a warm service is available.
+"""
+
+import asyncio
+import json
+import os
+
+DEFAULT_SERVICE_ADDR = "127.0.0.1:8790"
+
+# Crawl results can carry whole pages on a single line
+STREAM_LIMIT = 64 * 1024 * 1024
+
+
+def service_address(address=None):
+    """Resolve "host:port" from the argument or CRAWL_SERVICE_ADDR"""
+    address = address or os.getenv("CRAWL_SERVICE_ADDR") or DEFAULT_SERVICE_ADDR
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+async def _send(writer, message):
+    writer.write((json.dumps(message) + "\n").encode("utf-8"))
+    await writer.drain()
+
+
+async def _receive(reader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Crawl service closed the connection")
+    return json.loads(line)
+
+
+async def request(op, address=None, **fields):
+    """Send one request and return the service's reply"""
+    host, port = service_address(address)
+    reader, writer = await asyncio.open_connection(host, port, limit=STREAM_LIMIT)
+    try:
+        await _send(writer, {"op": op, **fields})
+        return await _receive(reader)
+    finally:
+        writer.close()
+
+
+async def run_crawl(params, on_progress=None, on_page=None, address=None):
+    """
+    Submit a crawl job and follow it until it finishes
+
+    Args:
+        params: Crawl request in crawl_backend's JSON format (url, deepCrawl, ...)
+        on_progress: Optional callback receiving progress dicts
+        on_page: Optional callback receiving page records as they are extracted.
+                 When given, pages are streamed instead of returned in the result.
+        address: "host:port" of the service (default: CRAWL_SERVICE_ADDR)
+
+    Returns:
+        The crawl result dict, as crawl() would have returned it
+
+    Raises:
+        OSError if the service is not reachable
+    """
+    host, port = service_address(address)
+    reader, writer = await asyncio.open_connection(host, port, limit=STREAM_LIMIT)
+    try:
+        await _send(writer, {
+            "op": "submit",
+            "subscribe": True,
+            "params": {**params, "streamPages": on_page is not None}
+        })
+        reply = await _receive(reader)
+        if not reply.get("ok"):
+            return {"success": False, "error": reply.get("error", "Crawl service rejected the job")}
+
+        while True:
+            event = await _receive(reader)
+            kind = event.get("event")
+            if kind == "progress" and on_progress:
+                on_progress(event["progress"])
+            elif kind == "page" and on_page:
+                on_page(event["page"])
+            elif kind == "done":
+                return event.get("result") or {
+                    "success": False,
+                    "error": event.get("job", {}).get("error") or f"Crawl job {event.get('job', {}).get('status')}"
+                }
+    finally:
+        writer.close()
+
+
+async def cancel_job(job_id, address=None):
+    """Cancel a queued or running job"""
+    return await request("cancel", address=address, jobId=job_id)
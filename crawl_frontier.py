@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Crash-safe crawl frontier
+Checkpoints a deep crawl's queue, visited set and completed pages to SQLite
+after every page so an interrupted crawl can resume where it stopped.
+"""
+
+import hashlib
+import json
+import sqlite3
+from collections import deque
+from pathlib import Path
+
+DEFAULT_CHECKPOINT_DIR = Path(__file__).parent / "mcp-docs-server" / "data" / "checkpoints"
+
+
+def default_checkpoint_path(url: str) -> Path:
+    """Checkpoint file used when a crawl is resumed without an explicit path"""
+    return DEFAULT_CHECKPOINT_DIR / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]}.sqlite"
+
+
+class CrawlFrontier:
+    def __init__(self, path, url: str, strategy: str = "bfs", resume: bool = False):
+        """
+        Open a crawl checkpoint
+
+        Args:
+            path: SQLite checkpoint file
+            url: Start URL of the crawl (checked against the checkpoint on resume)
+            strategy: bfs or dfs
+            resume: Continue from an existing checkpoint instead of starting over
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not resume:
+            self._remove_files()
+
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            # Queue rows mirror the in-memory deque: lowest seq is the left end
+            self.conn.execute("CREATE TABLE IF NOT EXISTS queue (seq INTEGER PRIMARY KEY, url TEXT NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS visited (url TEXT PRIMARY KEY)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    record TEXT NOT NULL
+                )
+            """)
+
+        meta = dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+        if meta and meta.get("url") != url:
+            raise ValueError(f"Checkpoint {self.path} belongs to a crawl of {meta.get('url')}, not {url}")
+        if meta and meta.get("strategy") != strategy:
+            raise ValueError(f"Checkpoint {self.path} was written by a {meta.get('strategy')} crawl")
+
+        self.resumed = bool(meta)
+        if not self.resumed:
+            with self.conn:
+                self.conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                                      [("url", url), ("strategy", strategy)])
+                self.conn.execute("INSERT INTO queue (seq, url) VALUES (0, ?)", (url,))
+
+        self.min_seq, self.max_seq = self.conn.execute(
+            "SELECT COALESCE(MIN(seq), 0), COALESCE(MAX(seq), 0) FROM queue"
+        ).fetchone()
+
+    def _remove_files(self):
+        for suffix in ("", "-wal", "-shm"):
+            Path(str(self.path) + suffix).unlink(missing_ok=True)
+
+    def load_visited(self) -> set:
+        return {row[0] for row in self.conn.execute("SELECT url FROM visited")}
+
+    def load_queue(self) -> deque:
+        return deque(row[0] for row in self.conn.execute("SELECT url FROM queue ORDER BY seq"))
+
+    def replay_pages(self):
+        """Yield the page records completed before the crawl was interrupted"""
+        for (record,) in self.conn.execute("SELECT record FROM pages ORDER BY seq"):
+            yield json.loads(record)
+
+    def checkpoint(self, popped: int, url: str, page: dict = None, pushed=(), front: bool = False):
+        """
+        Persist one step of the crawl loop atomically
+
+        Args:
+            popped: URLs taken off the left end of the queue since the last checkpoint
+            url: URL that was just visited
+            page: Its page record, or None if the page failed
+            pushed: New URLs added to the queue, in the order they were added
+            front: Whether they were added to the left end (DFS) rather than the right (BFS)
+        """
+        with self.conn:
+            if popped:
+                self.conn.execute(
+                    "DELETE FROM queue WHERE seq IN (SELECT seq FROM queue ORDER BY seq LIMIT ?)",
+                    (popped,)
+                )
+            self.conn.execute("INSERT OR IGNORE INTO visited (url) VALUES (?)", (url,))
+            if page is not None:
+                self.conn.execute("INSERT INTO pages (url, record) VALUES (?, ?)",
+                                  (url, json.dumps(page, ensure_ascii=False)))
+
+            rows = []
+            for link in pushed:
+                if front:
+                    self.min_seq -= 1
+                    rows.append((self.min_seq, link))
+                else:
+                    self.max_seq += 1
+                    rows.append((self.max_seq, link))
+            self.conn.executemany("INSERT INTO queue (seq, url) VALUES (?, ?)", rows)
+
+    def close(self, completed: bool = False):
+        """Close the checkpoint, deleting it once the crawl has finished"""
+        self.conn.close()
+        if completed:
+            self._remove_files()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Crawl progress reporting
+Rate-limits progress updates, adds throughput and ETA, and fans them out to
+the configured sinks: a callback (crawl service subscribers / SSE), PROGRESS:
+lines on stderr, and the polling file (written with an atomic rename).
+"""
+
+import json
+import os
+import sys
+import time
+from collections import deque
+
+# Statuses that are always delivered, regardless of the rate limit
+MILESTONE_STATUSES = {"initializing", "starting", "processing", "completed", "failed"}
+
+# Throughput is measured over this many seconds of recent progress
+RATE_WINDOW_SECONDS = 30
+
+
+def progress_file_path(session_id: str) -> str:
+    return f"/tmp/crawl_progress_{session_id}.json"
+
+
+def write_progress_file(session_id: str, progress_data: dict):
+    """Replace the progress file atomically so pollers never read a partial write"""
+    progress_file = progress_file_path(session_id)
+    tmp_file = f"{progress_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'w') as f:
+            json.dump(progress_data, f)
+        os.replace(tmp_file, progress_file)
+    except Exception:
+        # Don't fail crawl if progress writing fails
+        try:
+            os.unlink(tmp_file)
+        except OSError:
+            pass
+
+
+class ProgressReporter:
+    def __init__(self, session_id=None, stream=False, on_progress=None, max_rate=None):
+        """
+        Args:
+            session_id: Write progress to /tmp/crawl_progress_{session_id}.json
+            stream: Print PROGRESS:{json} lines to stderr
+            on_progress: Callback receiving each delivered progress dict
+            max_rate: Maximum updates per second (CRAWL_PROGRESS_RATE, default 4)
+        """
+        self.session_id = session_id
+        self.stream = stream
+        self.on_progress = on_progress
+        self.min_interval = 1.0 / float(max_rate or os.getenv("CRAWL_PROGRESS_RATE", 4))
+        self.started_at = time.monotonic()
+        self.samples = deque()
+        self.last_sent_at = 0.0
+        self.last_status = None
+        self.pending = None
+
+    @property
+    def enabled(self):
+        return bool(self.session_id or self.stream or self.on_progress)
+
+    def _throughput(self, crawled, now):
+        """Pages per second over the recent window"""
+        self.samples.append((now, crawled))
+        while len(self.samples) > 2 and now - self.samples[0][0] > RATE_WINDOW_SECONDS:
+            self.samples.popleft()
+        first_at, first_crawled = self.samples[0]
+        if now - first_at <= 0:
+            return 0.0
+        return (crawled - first_crawled) / (now - first_at)
+
+    def update(self, crawled, total, current_url="", status="crawling", memory=None):
+        """Record a progress update, delivering it unless the rate limit says to wait"""
+        if not self.enabled:
+            return
+
+        now = time.monotonic()
+        pages_per_second = self._throughput(crawled, now)
+        progress_data = {
+            "crawled": crawled,
+            "total": total if total != float('inf') else "unlimited",
+            "currentUrl": current_url,
+            "status": status,
+            "pagesPerSecond": round(pages_per_second, 3),
+            "elapsedSeconds": round(now - self.started_at, 1),
+            "etaSeconds": None
+        }
+        if total != float('inf') and pages_per_second > 0:
+            progress_data["etaSeconds"] = round(max(0, total - crawled) / pages_per_second, 1)
+        if memory:
+            progress_data["memory"] = memory
+
+        due = now - self.last_sent_at >= self.min_interval
+        if due or status != self.last_status or status in MILESTONE_STATUSES:
+            self._send(progress_data, now)
+        else:
+            self.pending = progress_data
+
+    def flush(self):
+        """Deliver the last update held back by the rate limit"""
+        if self.pending:
+            self._send(self.pending, time.monotonic())
+
+    def _send(self, progress_data, now):
+        self.pending = None
+        self.last_sent_at = now
+        self.last_status = progress_data["status"]
+
+        if self.on_progress:
+            self.on_progress(progress_data)
+        if self.stream:
+            print(f"PROGRESS:{json.dumps(progress_data)}", file=sys.stderr, flush=True)
+        if self.session_id:
+            write_progress_file(self.session_id, progress_data)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Per-host crawl scheduler
+Rate-limits requests per host with token buckets, honours robots.txt
+Crawl-delay, adapts concurrency to observed latency and 429/503 responses,
+and retries transient failures with jittered exponential backoff.
+"""
+
+import asyncio
+import os
+import random
+import time
+import urllib.request
+import urllib.robotparser
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+# Statuses worth retrying - everything else >= 400 fails the page immediately
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+BACKPRESSURE_STATUS = {429, 503}
+
+ROBOTS_USER_AGENT = "Mozilla/5.0 (compatible; crawl4ai-scheduler/1.0)"
+
+
+class CrawlFailed(Exception):
+    """A page that could not be fetched after all retries"""
+
+    def __init__(self, url, status=None, reason=""):
+        self.url = url
+        self.status = status
+        super().__init__(f"HTTP {status}: {reason}" if status else reason or "fetch failed")
+
+
+class HostState:
+    def __init__(self, rate, limit, max_rate, max_limit):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.limit = limit
+        self.max_limit = max_limit
+        self.tokens = 1.0
+        self.refilled_at = time.monotonic()
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.latency = None
+        self.best_latency = None
+        self.successes = 0
+        self.crawl_delay = None
+        self.robots_lock = asyncio.Lock()
+        self.robots_loaded = False
+
+
+class CrawlScheduler:
+    def __init__(self, rate=None, max_concurrency=None, max_retries=None,
+                 base_backoff=1.0, max_backoff=60.0, respect_robots=True):
+        """
+        Args:
+            rate: Starting requests per second per host (CRAWL_HOST_RATE, default 2)
+            max_concurrency: Upper bound on parallel requests per host (CRAWL_MAX_CONCURRENCY, default 4)
+            max_retries: Retries for transient failures (CRAWL_MAX_RETRIES, default 3)
+            base_backoff: First retry delay in seconds (doubled per attempt, full jitter)
+            max_backoff: Cap on a single retry delay
+            respect_robots: Read robots.txt Crawl-delay / Request-rate per host
+        """
+        self.rate = float(rate or os.getenv("CRAWL_HOST_RATE", 2.0))
+        self.max_concurrency = int(max_concurrency or os.getenv("CRAWL_MAX_CONCURRENCY", 4))
+        self.max_retries = int(max_retries if max_retries is not None else os.getenv("CRAWL_MAX_RETRIES", 3))
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.respect_robots = respect_robots
+        self.hosts = {}
+
+    def _host(self, url) -> HostState:
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            # Start conservatively and let record() open up concurrency
+            self.hosts[host] = HostState(self.rate, 1, self.rate * 4, self.max_concurrency)
+        return self.hosts[host]
+
+    def concurrency(self, url) -> int:
+        """Current number of parallel requests allowed for a URL's host"""
+        return self._host(url).limit
+
+    async def _load_robots(self, url, state: HostState):
+        async with state.robots_lock:
+            if state.robots_loaded:
+                return
+            parsed = urlparse(url)
+            robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+
+            def fetch():
+                request = urllib.request.Request(robots_url, headers={"User-Agent": ROBOTS_USER_AGENT})
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    return response.read().decode("utf-8", errors="replace").splitlines()
+
+            try:
+                parser = urllib.robotparser.RobotFileParser()
+                parser.parse(await asyncio.to_thread(fetch))
+                delay = parser.crawl_delay("*")
+                request_rate = parser.request_rate("*")
+                if request_rate and request_rate.requests:
+                    delay = max(delay or 0, request_rate.seconds / request_rate.requests)
+                if delay:
+                    state.crawl_delay = float(delay)
+                    state.rate = state.max_rate = 1.0 / state.crawl_delay
+                    state.limit = state.max_limit = 1
+            except Exception:
+                # No robots.txt (or unreachable) - keep the defaults
+                pass
+            state.robots_loaded = True
+
+    @asynccontextmanager
+    async def slot(self, url):
+        """Wait for a concurrency slot and a rate token for the URL's host"""
+        state = self._host(url)
+        if self.respect_robots and not state.robots_loaded:
+            await self._load_robots(url, state)
+
+        while True:
+            now = time.monotonic()
+            state.tokens = min(1.0, state.tokens + (now - state.refilled_at) * state.rate)
+            state.refilled_at = now
+
+            if now < state.blocked_until:
+                wait = state.blocked_until - now
+            elif state.in_flight >= state.limit:
+                wait = 0.05
+            elif state.tokens < 1.0:
+                wait = (1.0 - state.tokens) / state.rate
+            else:
+                state.tokens -= 1.0
+                state.in_flight += 1
+                break
+            await asyncio.sleep(wait)
+
+        try:
+            yield
+        finally:
+            state.in_flight -= 1
+
+    def record(self, url, latency, status=None, error=False, retry_after=None):
+        """Adapt a host's rate and concurrency to one finished request (AIMD)"""
+        state = self._host(url)
+
+        if status in BACKPRESSURE_STATUS:
+            # Server is pushing back - halve everything and pause the host
+            state.limit = max(1, state.limit // 2)
+            state.rate = max(0.1, state.rate / 2)
+            state.successes = 0
+            state.blocked_until = time.monotonic() + (retry_after or self.base_backoff)
+            return
+        if error or (status and status >= 500):
+            state.successes = 0
+            return
+
+        state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+        if state.best_latency is None or state.latency < state.best_latency:
+            state.best_latency = state.latency
+
+        if state.latency > 2 * state.best_latency and state.limit > 1:
+            # Responses are slowing down - back off before the server starts refusing
+            state.limit -= 1
+            state.successes = 0
+            return
+
+        state.successes += 1
+        if state.successes >= 2 * state.limit:
+            state.successes = 0
+            state.limit = min(state.max_limit, state.limit + 1)
+            state.rate = min(state.max_rate, state.rate * 1.25)
+
+    def backoff(self, attempt, retry_after=None) -> float:
+        """Full-jitter exponential backoff, never shorter than Retry-After"""
+        delay = random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+        return max(delay, retry_after or 0)
+
+    async def fetch(self, url, fetch_fn):
+        """
+        Fetch a URL through the scheduler, retrying transient failures
+
+        Args:
+            url: Page URL
+            fetch_fn: Coroutine function taking the URL and returning a CrawlResult-like object
+
+        Raises:
+            CrawlFailed when the page fails permanently or runs out of retries
+        """
+        for attempt in range(self.max_retries + 1):
+            error = None
+            result = None
+            async with self.slot(url):
+                started = time.monotonic()
+                try:
+                    result = await fetch_fn(url)
+                except Exception as e:
+                    error = e
+                latency = time.monotonic() - started
+
+            status = getattr(result, 'status_code', None) if result is not None else None
+            retry_after = _retry_after(result)
+            self.record(url, latency, status, error=error is not None or not getattr(result, 'success', True),
+                        retry_after=retry_after)
+
+            if error is None and getattr(result, 'success', True) and not (status and status >= 400):
+                return result
+
+            # Failures without a status are network/browser errors and worth retrying
+            transient = error is not None or status is None or status in TRANSIENT_STATUS
+            if not transient or attempt == self.max_retries:
+                reason = str(error) if error else getattr(result, 'error_message', '') or ''
+                raise CrawlFailed(url, status, reason)
+
+            await asyncio.sleep(self.backoff(attempt, retry_after))
+
+
+def _retry_after(result):
+    """Retry-After header in seconds (delta-seconds form only)"""
+    headers = getattr(result, 'response_headers', None) or {}
+    for key, value in headers.items():
+        if key.lower() == "retry-after":
+            try:
+                return min(float(value), 300.0)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+_default_scheduler = None
+
+
+def default_scheduler() -> CrawlScheduler:
+    """Process-wide scheduler, so concurrent crawls share per-host limits"""
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = CrawlScheduler()
+    return _default_scheduler
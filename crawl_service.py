@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Crawl Service
+Resident crawl worker that keeps a pool of warm browsers and accepts crawl
+jobs over a local socket, so Python startup, the crawl4ai import and browser
+launch are paid once instead of once per crawl.
+
+Protocol: newline-delimited JSON over TCP (CRAWL_SERVICE_ADDR, default 127.0.0.1:8790)
+    {"op": "submit", "params": {...}, "subscribe": true}  -> {"ok": true, "jobId": ...} + events
+    {"op": "subscribe", "jobId": ...}                      -> events until the job finishes
+    {"op": "status", "jobId": ...}                         -> {"ok": true, "job": {...}}
+    {"op": "cancel", "jobId": ...}                         -> {"ok": true, "job": {...}}
+    {"op": "list"}                                         -> {"ok": true, "jobs": [...]}
+    {"op": "ping"}                                         -> {"ok": true, ...}
+
+The same port serves job events to browsers as server-sent events:
+    GET /jobs/<id>/events                                  -> text/event-stream
+
+Events are {"event": "progress" | "page" | "done", ...}. Progress events are
+rate-limited (CRAWL_PROGRESS_RATE per second) and carry pagesPerSecond and
+etaSeconds. Page events are only
+sent for jobs submitted with "streamPages": true and are not replayed to
+late subscribers. A subscribing submit cancels its job if the client
+disconnects before it finishes, unless "detach": true is given.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+# Suppress Crawl4AI logging output
+os.environ['CRAWL4AI_QUIET'] = '1'
+
+from crawl4ai import AsyncWebCrawler, BrowserConfig
+
+from crawl_backend import crawl, crawl_kwargs
+from crawl_client import STREAM_LIMIT, service_address
+
+logger = logging.getLogger("crawl_service")
+
+# Finished jobs kept around for status queries
+FINISHED_JOBS_KEPT = 100
+
+
+class BrowserPool:
+    """Fixed-size pool of started AsyncWebCrawler instances"""
+
+    def __init__(self, size=2, headless=True):
+        self.size = size
+        self.browser_config = BrowserConfig(headless=headless, verbose=False)
+        self.idle = asyncio.Queue()
+        self.crawlers = []
+
+    async def start(self):
+        for _ in range(self.size):
+            crawler = AsyncWebCrawler(config=self.browser_config)
+            await crawler.start()
+            self.crawlers.append(crawler)
+            self.idle.put_nowait(crawler)
+
+    async def close(self):
+        for crawler in self.crawlers:
+            try:
+                await crawler.close()
+            except Exception as e:
+                logger.warning(f"Failed to close browser: {e}")
+        self.crawlers = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a warm crawler, waiting for one to become free"""
+        crawler = await self.idle.get()
+        try:
+            yield crawler
+        finally:
+            self.idle.put_nowait(crawler)
+
+
+class CrawlJob:
+    def __init__(self, params):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params
+        self.status = "queued"
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.subscribers = set()
+        self.task = None
+
+    @property
+    def finished(self):
+        return self.status in ("completed", "failed", "cancelled")
+
+    def publish(self, event):
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+    def summary(self):
+        return {
+            "jobId": self.id,
+            "url": self.params.get("url"),
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at
+        }
+
+
+class CrawlService:
+    def __init__(self, pool, max_queued=16):
+        """
+        Args:
+            pool: Started BrowserPool - its size bounds the number of concurrent jobs
+            max_queued: Jobs allowed to wait for a free browser before submits are rejected
+        """
+        self.pool = pool
+        self.max_queued = max_queued
+        self.jobs = OrderedDict()
+
+    def submit(self, params):
+        if not params.get("url"):
+            raise ValueError("URL is required")
+        queued = sum(1 for job in self.jobs.values() if job.status == "queued")
+        if queued >= self.max_queued:
+            raise ValueError(f"Too many queued jobs ({queued}), try again later")
+
+        job = CrawlJob(params)
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job))
+        self._prune()
+        return job
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job and not job.finished:
+            job.task.cancel()
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del self.jobs[job_id]
+
+    async def _run(self, job):
+        def on_progress(progress):
+            job.progress = progress
+            job.publish({"event": "progress", "jobId": job.id, "progress": progress})
+
+        def on_page(page):
+            job.publish({"event": "page", "jobId": job.id, "page": page})
+
+        kwargs = crawl_kwargs(job.params)
+        # Progress goes to subscribers; the browser settings belong to the pool
+        kwargs.pop("headless")
+        kwargs["stream_progress"] = False
+
+        try:
+            async with self.pool.acquire() as crawler:
+                job.status = "running"
+                job.started_at = time.time()
+                job.result = await crawl(
+                    **kwargs,
+                    crawler=crawler,
+                    on_progress=on_progress,
+                    on_page=on_page if job.params.get("streamPages") else None
+                )
+            job.status = "completed" if job.result.get("success") else "failed"
+            job.error = job.result.get("error")
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.exception(f"Job {job.id} failed")
+        finally:
+            job.finished_at = time.time()
+            job.publish({"event": "done", "jobId": job.id, "job": job.summary(), "result": job.result})
+
+    async def _follow(self, job, writer, send=None):
+        """Stream a job's events to a client until the job finishes"""
+        send = send or self._send
+        queue = asyncio.Queue()
+        job.subscribers.add(queue)
+        try:
+            if job.finished:
+                queue.put_nowait({"event": "done", "jobId": job.id, "job": job.summary(), "result": job.result})
+            elif job.progress:
+                queue.put_nowait({"event": "progress", "jobId": job.id, "progress": job.progress})
+            while True:
+                event = await queue.get()
+                await send(writer, event)
+                if event["event"] == "done":
+                    return
+        finally:
+            job.subscribers.discard(queue)
+
+    async def _send(self, writer, message):
+        writer.write((json.dumps(message) + "\n").encode("utf-8"))
+        await writer.drain()
+
+    async def _send_sse(self, writer, event):
+        writer.write(f"event: {event['event']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+        await writer.drain()
+
+    async def _serve_sse(self, request_line, reader, writer):
+        """GET /jobs/<id>/events - server-sent events for browsers and the Next.js API"""
+        # Skip the request headers
+        while (await reader.readline()).strip():
+            pass
+
+        parts = request_line.decode("latin-1").split()
+        path = parts[1] if len(parts) > 1 else ""
+        segments = [p for p in path.split("?")[0].split("/") if p]
+        job = None
+        if len(segments) == 3 and segments[0] == "jobs" and segments[2] == "events":
+            job = self.jobs.get(segments[1])
+
+        if not job:
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            return
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Access-Control-Allow-Origin: *\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        await writer.drain()
+        await self._follow(job, writer, send=self._send_sse)
+
+    async def handle_client(self, reader, writer):
+        try:
+            line = await reader.readline()
+            if line.startswith(b"GET "):
+                await self._serve_sse(line, reader, writer)
+                return
+            while line:
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    await self._send(writer, {"ok": False, "error": "Invalid JSON"})
+                else:
+                    await self._dispatch(message, writer)
+                line = await reader.readline()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, message, writer):
+        op = message.get("op")
+        job = self.jobs.get(message.get("jobId"))
+
+        if op == "ping":
+            await self._send(writer, {
+                "ok": True,
+                "browsers": self.pool.size,
+                "idleBrowsers": self.pool.idle.qsize(),
+                "jobs": len(self.jobs)
+            })
+        elif op == "submit":
+            try:
+                job = self.submit(message.get("params") or {})
+            except ValueError as e:
+                await self._send(writer, {"ok": False, "error": str(e)})
+                return
+            await self._send(writer, {"ok": True, "jobId": job.id})
+            if message.get("subscribe"):
+                try:
+                    await self._follow(job, writer)
+                except (ConnectionError, asyncio.CancelledError):
+                    if not message.get("detach"):
+                        self.cancel(job.id)
+                    raise
+        elif op == "list":
+            await self._send(writer, {"ok": True, "jobs": [j.summary() for j in self.jobs.values()]})
+        elif op in ("subscribe", "status", "cancel"):
+            if not job:
+                await self._send(writer, {"ok": False, "error": f"Unknown job: {message.get('jobId')}"})
+            elif op == "subscribe":
+                await self._follow(job, writer)
+            else:
+                if op == "cancel":
+                    self.cancel(job.id)
+                await self._send(writer, {"ok": True, "job": job.summary()})
+        else:
+            await self._send(writer, {"ok": False, "error": f"Unknown op: {op}"})
+
+
+async def serve(address=None, browsers=2, headless=True, max_queued=16):
+    host, port = service_address(address)
+
+    pool = BrowserPool(size=browsers, headless=headless)
+    await pool.start()
+    service = CrawlService(pool, max_queued=max_queued)
+
+    server = await asyncio.start_server(service.handle_client, host, port, limit=STREAM_LIMIT)
+    print(f"Crawl service listening on {host}:{port} ({browsers} warm browsers)", file=sys.stderr, flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await pool.close()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Resident crawl service with warm browsers')
+    parser.add_argument('--address', default=None,
+                       help='host:port to listen on (default: CRAWL_SERVICE_ADDR or 127.0.0.1:8790)')
+    parser.add_argument('-b', '--browsers', type=int, default=2,
+                       help='Warm browsers in the pool = maximum concurrent jobs (default: 2)')
+    parser.add_argument('-q', '--max-queued', type=int, default=16,
+                       help='Jobs allowed to wait for a browser before submits are rejected')
+    parser.add_argument('--headful', action='store_true',
+                       help='Run browsers with a window (can help bypass bot protection)')
+
+    args = parser.parse_args()
+
+    logger.setLevel(logging.INFO)
+    try:
+        asyncio.run(serve(args.address, args.browsers, not args.headful, args.max_queued))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
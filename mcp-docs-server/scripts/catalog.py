@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+Source catalog
+Transactional store (SQLite, WAL) for the indexed sources, their running
+totals and the index settings. Replaces read-modify-write of metadata.json:
+writers update it in short transactions, totals are adjusted incrementally,
+and readers keep an in-process snapshot that is only rebuilt when the
+catalog's version counter moves. metadata.json is still exported (atomically)
+after every change for the Next.js API routes.
+
+The catalog also holds the pointer to the live index generation: a full
+rebuild allocates a new generation, fills it, and swaps it in together with
+the new source list in one transaction.
+
+Deleting a source only records a tombstone: the source leaves the catalog at
+once, searches filter its source_id out, and purge_tombstones.py removes the
+chunks in the background.
+
+A Catalog can be shared by threads (the shard server's request handlers):
+each thread gets its own SQLite connection.
+"""
+import fcntl
+import json
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_CATALOG_PATH = Path(__file__).parent.parent / "data" / "catalog.sqlite"
+METADATA_EXPORT_PATH = Path(__file__).parent.parent / "data" / "chunks" / "metadata.json"
+
+# Stored in PRAGMA user_version once the tables and migrations below are in place;
+# bump it when _create() gains a migration
+SCHEMA_VERSION = 1
+
+DEFAULT_SETTINGS = {
+    "embedding_model": "text-embedding-3-small",
+    "chunk_size": 800,
+    "chunk_overlap": 100,
+    # HNSW parameters for new collections, and per-source ones (see storage.py, tune_hnsw.py)
+    "hnsw": {},
+    "hnsw_overrides": {}
+}
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def source_id(name: str) -> str:
+    """
+    Normalized key stored on every chunk as "source_id"
+
+    Case-folded with runs of punctuation and whitespace collapsed to '-', so
+    "Moca Network", "moca network" and "Moca-Network" all filter the same source.
+    Different names can fold to the same id ("C++" and "C"); Catalog.source_key()
+    hands out the unique key a source is actually stored under.
+    """
+    return re.sub(r'[\W_]+', '-', name.casefold()).strip('-') or name
+
+
+def source_counts(info: Dict) -> Dict[str, int]:
+    """
+    Per-source figures that feed the catalog totals (docs and repositories name them differently)
+
+    Repositories count lines, not words, so they add nothing to total_words.
+    """
+    return {
+        "chunks": info.get("chunks", 0) or info.get("total_chunks", 0) or 0,
+        "words": info.get("words", 0) or 0,
+        "pages": info.get("pages", 0) or 0
+    }
+
+
+class Catalog:
+    def __init__(self, path=None, export_path=None):
+        """
+        Args:
+            path: SQLite file (default data/catalog.sqlite)
+            export_path: metadata.json written after every change, and imported
+                         once when the catalog is first created
+        """
+        self.path = Path(path or DEFAULT_CATALOG_PATH)
+        self.export_path = Path(export_path or METADATA_EXPORT_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        # (version, value) pairs, replaced as a whole so threads never see a mismatched pair
+        self._cache = None
+        self._tombstones = None
+        self._create()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """This thread's connection (sqlite3 connections must not be shared between threads)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Transactions are managed explicitly (BEGIN IMMEDIATE for writers);
+            # check_same_thread is off only so close() can run from any thread
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _create(self):
+        """Create or upgrade the schema (read-only opens of a current catalog take no write lock)"""
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        self._begin()
+        try:
+            if self.conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                # Upgraded by another process while we waited for the lock
+                self.conn.execute("COMMIT")
+                return
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS sources (
+                    name TEXT PRIMARY KEY,
+                    type TEXT,
+                    url TEXT,
+                    chunks INTEGER NOT NULL DEFAULT 0,
+                    words INTEGER NOT NULL DEFAULT 0,
+                    pages INTEGER NOT NULL DEFAULT 0,
+                    position INTEGER NOT NULL,
+                    info TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS tombstones (
+                    source_id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    deleted_at TEXT NOT NULL,
+                    info TEXT NOT NULL
+                )
+            """)
+            created = self.conn.execute(
+                "INSERT OR IGNORE INTO state VALUES ('version', 0)"
+            ).rowcount
+            if created:
+                for key in ("total_chunks", "total_words", "total_pages", "total_sources"):
+                    self.conn.execute("INSERT INTO state VALUES (?, 0)", (key,))
+                self.conn.execute("INSERT INTO state VALUES ('last_updated', NULL)")
+                self._import_metadata_file()
+            # Live generation and the last one handed out (catalogs from before blue/green rebuilds start at 0)
+            self.conn.execute("INSERT OR IGNORE INTO state VALUES ('generation', 0)")
+            self.conn.execute("INSERT OR IGNORE INTO state VALUES ('last_generation', 0)")
+            # Repository line counts were once added to total_words
+            if self.conn.execute("UPDATE sources SET words = 0 WHERE words != 0 AND "
+                                 "json_extract(info, '$.words') IS NULL").rowcount:
+                self.conn.execute("UPDATE state SET value = (SELECT COALESCE(SUM(words), 0) FROM sources) "
+                                  "WHERE key = 'total_words'")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _import_metadata_file(self):
+        """One-off migration of an existing metadata.json into a new catalog"""
+        if not self.export_path.exists():
+            return
+        try:
+            with open(self.export_path) as f:
+                metadata = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+
+        sources = metadata.get("sources")
+        if sources is None and metadata.get("source"):
+            # Single-source file written by indexer.py
+            url = metadata["source"]
+            sources = [{
+                "name": url.replace("https://", "").replace("http://", "").split("/")[0],
+                "url": url,
+                "type": "documentation",
+                "pages": metadata.get("total_pages", 0),
+                "chunks": metadata.get("total_chunks", 0),
+                "words": metadata.get("total_words", 0),
+                "indexed_at": metadata.get("indexed_at")
+            }]
+        for info in sources or []:
+            if info.get("name"):
+                self._put_source(info)
+        self._put_settings({key: metadata[key] for key in DEFAULT_SETTINGS if key in metadata})
+        self.conn.execute("UPDATE state SET value = ? WHERE key = 'last_updated'",
+                          (metadata.get("last_updated") or metadata.get("indexed_at"),))
+
+    # -- writes ---------------------------------------------------------------
+
+    def _begin(self):
+        # Take the write lock up front so concurrent indexers queue instead of failing mid-transaction
+        self.conn.execute("BEGIN IMMEDIATE")
+
+    def _adjust_totals(self, counts: Dict[str, int], sign: int, sources: int):
+        for field, value in counts.items():
+            self.conn.execute("UPDATE state SET value = value + ? WHERE key = ?", (sign * value, f"total_{field}"))
+        self.conn.execute("UPDATE state SET value = value + ? WHERE key = 'total_sources'", (sources,))
+
+    def _key_owners(self) -> Dict[str, str]:
+        """source_id -> name of every catalogued or deleted (not yet purged) source"""
+        owners = {}
+        for name, key in self.conn.execute("SELECT name, json_extract(info, '$.source_id') FROM sources"):
+            owners[key or source_id(name)] = name
+        for key, name in self.conn.execute("SELECT source_id, name FROM tombstones"):
+            owners.setdefault(key, name)
+        return owners
+
+    def source_key(self, name: str) -> str:
+        """
+        The source_id chunks of this source are stored under, unique across the catalog
+
+        A known source (or a deleted one awaiting its purge) keeps its key; a new
+        name gets source_id(name), with a numeric suffix when a different source
+        already has that key ("C" -> "c", then "C++" -> "c-2"). Indexers call this
+        before writing any chunks.
+        """
+        owners = self._key_owners()
+        for key, owner in owners.items():
+            if owner == name:
+                return key
+        base = key = source_id(name)
+        suffix = 2
+        while key in owners:
+            key = f"{base}-{suffix}"
+            suffix += 1
+        return key
+
+    def source_ids_for(self, names: List[str]) -> List[str]:
+        """
+        Keys of the sources a search filter names
+
+        Exact names win, then case-insensitive ones, then names that fold to the
+        same source_id ("moca network" finds "Moca-Network").
+        """
+        sources = [(source["name"], source.get("source_id") or source_id(source["name"]))
+                   for source in self.sources()]
+        keys = []
+        for name in names:
+            keys.extend([key for other, key in sources if other == name]
+                        or [key for other, key in sources if other.casefold() == name.casefold()]
+                        or [key for other, key in sources if source_id(other) == source_id(name)]
+                        or [source_id(name)])
+        return list(dict.fromkeys(keys))
+
+    def _put_source(self, info: Dict) -> Optional[Dict]:
+        # Keep the key the indexer wrote the chunks under, unless another source owns it
+        key = info.get("source_id")
+        if not key or self._key_owners().get(key, info["name"]) != info["name"]:
+            key = self.source_key(info["name"])
+        info = {**info, "source_id": key}
+        old = self._delete_source(info["name"])
+        counts = source_counts(info)
+        position = old["position"] if old else self.conn.execute(
+            "SELECT COALESCE(MAX(position), -1) + 1 FROM sources").fetchone()[0]
+        self.conn.execute(
+            "INSERT INTO sources VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (info["name"], info.get("type"), info.get("url"), counts["chunks"], counts["words"],
+             counts["pages"], position, json.dumps(info))
+        )
+        self._adjust_totals(counts, +1, 1)
+        return old["info"] if old else None
+
+    def _delete_source(self, name: str) -> Optional[Dict]:
+        row = self.conn.execute(
+            "SELECT chunks, words, pages, position, info FROM sources WHERE name = ?", (name,)
+        ).fetchone()
+        if not row:
+            return None
+        self.conn.execute("DELETE FROM sources WHERE name = ?", (name,))
+        self._adjust_totals({"chunks": row[0], "words": row[1], "pages": row[2]}, -1, -1)
+        return {"position": row[3], "info": json.loads(row[4])}
+
+    def _put_settings(self, settings: Dict):
+        for key, value in settings.items():
+            self.conn.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _commit(self):
+        """Bump the version, refresh metadata.json and commit (the export happens under the write lock)"""
+        self.conn.execute("UPDATE state SET value = value + 1 WHERE key = 'version'")
+        self.conn.execute("UPDATE state SET value = ? WHERE key = 'last_updated'", (utc_now(),))
+        self._cache = None
+        self._export(self._read_snapshot())
+        self.conn.execute("COMMIT")
+
+    def _write(self, operation):
+        self._begin()
+        try:
+            result = operation()
+            self._commit()
+            return result
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def upsert_source(self, info: Dict, settings: Dict = None, replaces: str = None) -> Optional[Dict]:
+        """
+        Add or replace a source (matched by name), keeping its place in the list
+
+        Args:
+            info: Source info as shown in metadata.json; needs "name"
+            settings: Index settings to record in the same transaction
+            replaces: Name of an older entry for the same source to drop (e.g. renamed on re-index)
+
+        Returns:
+            The replaced source info, or None if the source is new
+        """
+        def operation():
+            if replaces and replaces != info["name"]:
+                self._delete_source(replaces)
+            old = self._put_source(info)
+            if settings:
+                self._put_settings(settings)
+            return old
+        return self._write(operation)
+
+    def remove_source(self, name: str) -> Optional[Dict]:
+        """Remove a source; returns its info, or None if it was not in the catalog"""
+        def operation():
+            old = self._delete_source(name)
+            return old["info"] if old else None
+        return self._write(operation)
+
+    def tombstone_source(self, name: str) -> Optional[Dict]:
+        """
+        Delete a source logically: drop it from the catalog and record a tombstone
+
+        Searches stop returning its chunks as soon as this commits; the chunks
+        themselves are removed later by purge_tombstones.py. Returns the source
+        info, or None if it was not in the catalog.
+        """
+        def operation():
+            old = self._delete_source(name)
+            if not old:
+                return None
+            self.conn.execute("INSERT OR REPLACE INTO tombstones VALUES (?, ?, ?, ?)",
+                              (old["info"].get("source_id") or source_id(name), name, utc_now(),
+                               json.dumps(old["info"])))
+            return old["info"]
+        return self._write(operation)
+
+    @contextmanager
+    def tombstone_lease(self):
+        """
+        Exclusive, cross-process lease on tombstone transitions
+
+        The purge holds it while it re-checks a tombstone and runs one destructive
+        step; indexers hold it while they take a deleted source back, and swaps
+        while they clear all tombstones. A purge therefore never deletes data
+        written after its tombstone was cleared.
+        """
+        with open(self.path.with_name("tombstones.lock"), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def clear_tombstone(self, key: str):
+        """Forget a tombstone once its chunks are gone (or the source is being re-indexed)"""
+        self._write(lambda: self.conn.execute("DELETE FROM tombstones WHERE source_id = ?", (key,)))
+
+    def replace_all(self, sources: List[Dict], settings: Dict = None, generation: int = None):
+        """
+        Swap the whole catalog for these sources in one transaction (index rebuilt from scratch)
+
+        Args:
+            sources: The new source list
+            settings: Index settings to record
+            generation: Rebuilt generation to make live in the same transaction
+        """
+        def operation():
+            if generation is not None:
+                if generation < self._state("generation"):
+                    raise RuntimeError(f"Generation {generation} is older than the live generation; "
+                                       "a newer rebuild has already been swapped in")
+                self.conn.execute("UPDATE state SET value = ? WHERE key = 'generation'", (generation,))
+                # Deleted sources went with the retired generation
+                self.conn.execute("DELETE FROM tombstones")
+            self.conn.execute("DELETE FROM sources")
+            self.conn.execute(
+                "UPDATE state SET value = 0 WHERE key IN "
+                "('total_chunks', 'total_words', 'total_pages', 'total_sources')"
+            )
+            for info in sources:
+                self._put_source(info)
+            if settings:
+                self._put_settings(settings)
+        if generation is None:
+            self._write(operation)
+            return
+        # The swap clears every tombstone: a purge must not be mid-step on one
+        with self.tombstone_lease():
+            self._write(operation)
+
+    def clear(self):
+        """Remove every source"""
+        self.replace_all([])
+
+    def set_settings(self, settings: Dict):
+        self._write(lambda: self._put_settings(settings))
+
+    def allocate_generation(self) -> int:
+        """Hand out a new generation number for a rebuild to stage into"""
+        def operation():
+            self.conn.execute("UPDATE state SET value = value + 1 WHERE key = 'last_generation'")
+            return self._state("last_generation")
+        return self._write(operation)
+
+    # -- reads ----------------------------------------------------------------
+
+    def _state(self, key: str):
+        return self.conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()[0]
+
+    def version(self) -> int:
+        return self._state("version")
+
+    def generation(self) -> int:
+        """Live index generation (searches read only its collections)"""
+        return self._state("generation")
+
+    def _read_snapshot(self) -> Dict:
+        state = dict(self.conn.execute("SELECT key, value FROM state"))
+        settings = {**DEFAULT_SETTINGS, **{key: json.loads(value) for key, value in
+                                           self.conn.execute("SELECT key, value FROM settings")}}
+        sources = [json.loads(info) for (info,) in
+                   self.conn.execute("SELECT info FROM sources ORDER BY position")]
+        return {
+            "sources": sources,
+            "total_sources": state["total_sources"],
+            "total_chunks": state["total_chunks"],
+            "total_words": state["total_words"],
+            "total_pages": state["total_pages"],
+            **settings,
+            "generation": state["generation"],
+            "last_updated": state["last_updated"]
+        }
+
+    def snapshot(self) -> Dict:
+        """
+        The whole catalog in the metadata.json shape
+
+        Served from the in-process cache unless another writer has bumped the version
+        since it was built. Treat the result as read-only.
+        """
+        version = self.version()
+        cache = self._cache
+        if cache is None or cache[0] != version:
+            cache = self._cache = (version, self._read_snapshot())
+        return cache[1]
+
+    def sources(self) -> List[Dict]:
+        return self.snapshot()["sources"]
+
+    def tombstones(self) -> List[Dict]:
+        """Deleted sources whose chunks still await the purge, oldest first"""
+        return [{"source_id": key, "name": name, "deleted_at": deleted_at, "info": json.loads(info)}
+                for key, name, deleted_at, info in
+                self.conn.execute("SELECT * FROM tombstones ORDER BY deleted_at")]
+
+    def tombstoned_ids(self) -> frozenset:
+        """source_ids searches must skip (cached like snapshot())"""
+        version = self.version()
+        tombstones = self._tombstones
+        if tombstones is None or tombstones[0] != version:
+            tombstones = self._tombstones = (
+                version, frozenset(key for (key,) in self.conn.execute("SELECT source_id FROM tombstones")))
+        return tombstones[1]
+
+    def get_source(self, name: str) -> Optional[Dict]:
+        for source in self.sources():
+            if source.get("name") == name:
+                return source
+        return None
+
+    def settings(self) -> Dict:
+        snapshot = self.snapshot()
+        return {key: snapshot[key] for key in DEFAULT_SETTINGS}
+
+    def _export(self, snapshot: Dict):
+        """Write metadata.json atomically (readers never see a half-written file)"""
+        self.export_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.export_path.with_name(f".{self.export_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(tmp_path, self.export_path)
+
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
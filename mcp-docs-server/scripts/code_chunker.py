@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Syntax-aware code chunking
+Splits source files at top-level definition boundaries (Python via ast, other
+languages via a line-based fallback) and packs consecutive small definitions
+together up to the token budget, so chunks hold whole functions and classes
+instead of arbitrary token windows.
+"""
+import ast
+import re
+from typing import Dict, List, Optional
+
+PYTHON_EXTENSIONS = {'.py', '.pyi'}
+
+# Languages handled by the line-based fallback
+FALLBACK_EXTENSIONS = {
+    '.js', '.jsx', '.mjs', '.cjs', '.ts', '.tsx', '.go', '.rs', '.java', '.kt', '.kts', '.scala',
+    '.swift', '.rb', '.php', '.c', '.h', '.cc', '.cpp', '.cxx', '.hpp', '.cs', '.dart', '.lua',
+    '.ex', '.exs', '.sh'
+}
+
+# A definition starting at column 0: optional modifiers, a definition keyword, then its name
+DEFINITION_LINE = re.compile(
+    r'^(?:(?:export|default|public|private|protected|internal|static|final|abstract|sealed|open|'
+    r'async|unsafe|extern|inline|override|data|pub(?:\([^)]*\))?|declare)\s+)*'
+    r'(?P<kind>function\*?|class|interface|type|enum|struct|trait|impl|mod|module|namespace|object|'
+    r'fn|func|fun|def|object)\b\s*'
+    r'(?:<[^>]*>\s*)?(?:\([^)]*\)\s*)?(?P<name>[A-Za-z_$][\w$]*(?:(?:\.|::)[A-Za-z_$][\w$]*)*)'
+)
+
+# A top-level const/let/var only counts when it binds a function or a class
+# (const handler = async (req) => ..., let Store = class ...), not plain values
+VARIABLE_DEFINITION = re.compile(
+    r'^(?:(?:export|declare)\s+)*(?:const|let|var)\s+(?P<name>[A-Za-z_$][\w$]*)\s*(?::[^=]+)?=\s*'
+    r'(?P<value>\(|async\b|function\b|class\b|[A-Za-z_$][\w$]*\s*=>)'
+)
+
+# Lines that belong to the definition below them (comments, decorators, attributes)
+LEADING_LINE = re.compile(r'^\s*(#|//|/\*|\*|@|\[)')
+
+MIN_FILE_TOKENS = 50
+
+
+def is_code_file(extension: str) -> bool:
+    return extension in PYTHON_EXTENSIONS or extension in FALLBACK_EXTENSIONS
+
+
+def _attach_leading_lines(lines: List[str], start: int, floor: int) -> int:
+    """Move a definition's first line (1-based) up over the comments and decorators above it"""
+    while start - 1 > floor and LEADING_LINE.match(lines[start - 2]):
+        start -= 1
+    return start
+
+
+def _python_definitions(text: str, lines: List[str]) -> Optional[List[Dict]]:
+    """Top-level definitions of a Python file, or None if it does not parse"""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return None
+
+    definitions = []
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        floor = definitions[-1]["end_line"] if definitions else 0
+        methods = []
+        if isinstance(node, ast.ClassDef):
+            for child in node.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    child_start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                    methods.append({
+                        "symbol": f"{node.name}.{child.name}",
+                        "kind": "method",
+                        "start_line": child_start,
+                        "end_line": child.end_lineno
+                    })
+        definitions.append({
+            "symbol": node.name,
+            "kind": "class" if isinstance(node, ast.ClassDef) else "function",
+            "start_line": _attach_leading_lines(lines, start, floor),
+            "end_line": node.end_lineno,
+            "methods": methods
+        })
+    return definitions
+
+
+def _fallback_definitions(lines: List[str]) -> List[Dict]:
+    """Definitions found by matching unindented definition lines"""
+    definitions = []
+    for number, line in enumerate(lines, 1):
+        match = DEFINITION_LINE.match(line)
+        if match:
+            kind = match.group("kind").rstrip('*')
+        else:
+            match = VARIABLE_DEFINITION.match(line)
+            if not match:
+                continue
+            kind = "class" if match.group("value") == "class" else "function"
+        floor = definitions[-1]["start_line"] if definitions else 0
+        definitions.append({
+            "symbol": match.group("name"),
+            "kind": {"fn": "function", "func": "function", "fun": "function", "def": "function"}.get(kind, kind),
+            "start_line": _attach_leading_lines(lines, number, floor),
+            "end_line": None,
+            "methods": []
+        })
+    # Each definition runs until the next one starts
+    for current, following in zip(definitions, definitions[1:]):
+        current["end_line"] = following["start_line"] - 1
+    if definitions:
+        definitions[-1]["end_line"] = len(lines)
+    return definitions
+
+
+class CodeChunker:
+    def __init__(self, tokenizer, chunk_size: int = 800, chunk_overlap: int = 100):
+        """
+        Args:
+            tokenizer: tiktoken encoding used to measure chunks
+            chunk_size: Token budget per chunk
+            chunk_overlap: Overlap used only when a single definition has to be split
+        """
+        self.tokenizer = tokenizer
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def _segments(self, text: str, extension: str) -> List[Dict]:
+        """Split a file into consecutive segments covering every line"""
+        lines = text.split('\n')
+        definitions = None
+        if extension in PYTHON_EXTENSIONS:
+            definitions = _python_definitions(text, lines)
+        if definitions is None:
+            definitions = _fallback_definitions(lines)
+
+        segments = []
+        next_line = 1
+        for i, definition in enumerate(definitions):
+            start = max(definition["start_line"], next_line)
+            if start > next_line:
+                # Imports, constants and other module-level code between definitions
+                segments.append({"symbol": None, "start_line": next_line, "end_line": start - 1})
+            # Trailing module-level code goes with the next gap, not this definition
+            end = definition["end_line"]
+            if i + 1 < len(definitions):
+                end = min(end, max(start, definitions[i + 1]["start_line"] - 1))
+            segments.append({**definition, "start_line": start, "end_line": end})
+            next_line = end + 1
+        if next_line <= len(lines):
+            segments.append({"symbol": None, "start_line": next_line, "end_line": len(lines)})
+
+        for segment in segments:
+            segment["text"] = '\n'.join(lines[segment["start_line"] - 1:segment["end_line"]])
+            segment["tokens"] = len(self.tokenizer.encode(segment["text"]))
+        return [s for s in segments if s["text"].strip()]
+
+    def _split_large(self, segment: Dict, lines: List[str]) -> List[Dict]:
+        """Split a definition over the token budget: classes by method, others by token window"""
+        methods = segment.get("methods") or []
+        if methods:
+            parts = []
+            next_line = segment["start_line"]
+            for method in methods:
+                start = max(_attach_leading_lines(lines, method["start_line"], next_line - 1), next_line)
+                if start > next_line:
+                    parts.append({"symbol": segment["symbol"], "kind": segment["kind"],
+                                  "start_line": next_line, "end_line": start - 1})
+                parts.append({**method, "start_line": start})
+                next_line = method["end_line"] + 1
+            if next_line <= segment["end_line"]:
+                parts.append({"symbol": segment["symbol"], "kind": segment["kind"],
+                              "start_line": next_line, "end_line": segment["end_line"]})
+            pieces = []
+            for part in parts:
+                part["text"] = '\n'.join(lines[part["start_line"] - 1:part["end_line"]])
+                part["tokens"] = len(self.tokenizer.encode(part["text"]))
+                if part["text"].strip():
+                    pieces.extend(self._split_large(part, lines) if part["tokens"] > self.chunk_size else [part])
+            return pieces
+
+        # No finer structure - fall back to overlapping token windows inside the definition
+        tokens = self.tokenizer.encode(segment["text"])
+        pieces = []
+        step = max(1, self.chunk_size - self.chunk_overlap)
+        # Newlines before the current window, counted as the windows advance
+        start_line, counted = segment["start_line"], 0
+        for i in range(0, len(tokens), step):
+            window = tokens[i:i + self.chunk_size]
+            text = self.tokenizer.decode(window)
+            # Line range of the window (approximate at the overlap)
+            start_line += self.tokenizer.decode(tokens[counted:i]).count('\n')
+            counted = i
+            pieces.append({
+                "symbol": segment["symbol"],
+                "kind": segment.get("kind"),
+                "start_line": start_line,
+                "end_line": min(segment["end_line"], start_line + text.count('\n')),
+                "text": text,
+                "tokens": len(window)
+            })
+            if i + self.chunk_size >= len(tokens):
+                break
+        return pieces
+
+    def chunk(self, text: str, extension: str) -> Optional[List[Dict]]:
+        """
+        Chunk a source file
+
+        Returns:
+            [{"text", "symbol", "start_line", "end_line", "tokens", "definitions"}], or None
+            for extensions without a code chunker. "symbol" lists the definitions in the chunk
+            (comma-separated, "" for module-level code); "definitions" holds each one's
+            symbol, kind and line range.
+        """
+        if not is_code_file(extension):
+            return None
+
+        lines = text.split('\n')
+        segments = self._segments(text, extension)
+        if sum(s["tokens"] for s in segments) < MIN_FILE_TOKENS:
+            return []
+
+        pieces = []
+        for segment in segments:
+            if segment["tokens"] > self.chunk_size:
+                pieces.extend(self._split_large(segment, lines))
+            else:
+                pieces.append(segment)
+
+        # Pack consecutive pieces up to the token budget
+        chunks = []
+        current = []
+        current_tokens = 0
+        for piece in pieces:
+            if current and current_tokens + piece["tokens"] > self.chunk_size:
+                chunks.append(self._merge(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece["tokens"]
+        if current:
+            chunks.append(self._merge(current))
+        return chunks
+
+    def _merge(self, pieces: List[Dict]) -> Dict:
+        text = '\n'.join(piece["text"] for piece in pieces)
+        symbols = []
+        definitions = []
+        for piece in pieces:
+            if not piece.get("symbol"):
+                continue
+            if piece["symbol"] not in symbols:
+                symbols.append(piece["symbol"])
+                definitions.append({
+                    "symbol": piece["symbol"],
+                    "kind": piece.get("kind"),
+                    "start_line": piece["start_line"],
+                    "end_line": piece["end_line"]
+                })
+            # Methods of a class that fits in the chunk whole
+            definitions.extend(dict(method) for method in piece.get("methods") or [])
+        return {
+            "text": text,
+            "symbol": ", ".join(symbols),
+            "start_line": pieces[0]["start_line"],
+            "end_line": pieces[-1]["end_line"],
+            "tokens": len(self.tokenizer.encode(text)),
+            "definitions": definitions
+        }
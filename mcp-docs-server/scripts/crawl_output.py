@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Crawl output files
+Streams crawled pages to data/raw/ as they are extracted and reads them back
+for indexing. The format is chosen from the file name:
+
+    docs.json           single JSON document (written incrementally)
+    docs.ndjson         one JSON record per line, append-only
+    docs.ndjson.gz      gzip-compressed NDJSON (also .jsonl / .json.gz)
+"""
+import gzip
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator
+
+PREVIEW_PAGES = 5
+
+
+def is_ndjson(path: Path) -> bool:
+    """Whether a crawl file uses the line-delimited format"""
+    suffixes = [s for s in Path(path).suffixes if s != ".gz"]
+    return bool(suffixes) and suffixes[-1] in (".ndjson", ".jsonl")
+
+
+def _open_text(path: Path, mode: str):
+    if Path(path).suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class CrawlWriter:
+    """Writes pages to a crawl file as soon as they arrive"""
+
+    def __init__(self, path: Path, source: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ndjson = is_ndjson(self.path)
+        self.source = source
+        self.crawled_at = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+        self.total_pages = 0
+        self.total_words = 0
+        self.preview = []
+        self.closed = False
+
+        self.file = _open_text(self.path, "w")
+        if self.ndjson:
+            self._write_line({"type": "crawl", "source": source, "crawled_at": self.crawled_at})
+        else:
+            self.file.write("{\n")
+            self.file.write(f'  "source": {json.dumps(source)},\n')
+            self.file.write(f'  "crawled_at": {json.dumps(self.crawled_at)},\n')
+            self.file.write('  "pages": [')
+
+    def _write_line(self, record: dict):
+        self.file.write(json.dumps(record, ensure_ascii=False))
+        self.file.write("\n")
+        self.file.flush()
+
+    def write_page(self, page: Dict):
+        """Append one page record ({url, content, wordCount, title})"""
+        if self.ndjson:
+            self._write_line({"type": "page", **page})
+        else:
+            self.file.write("\n    " if self.total_pages == 0 else ",\n    ")
+            self.file.write(json.dumps(page, ensure_ascii=False))
+            self.file.flush()
+
+        self.total_pages += 1
+        self.total_words += page.get("wordCount", 0)
+        if len(self.preview) < PREVIEW_PAGES:
+            self.preview.append({"title": page.get("title", "Untitled"), "wordCount": page.get("wordCount", 0)})
+
+    def close(self) -> Dict:
+        """Write the totals and close the file. Returns the crawl summary."""
+        if not self.closed:
+            if self.ndjson:
+                self._write_line({"type": "summary", "total_pages": self.total_pages,
+                                  "total_words": self.total_words})
+            else:
+                self.file.write("\n  ],\n" if self.total_pages else "],\n")
+                self.file.write(f'  "total_pages": {self.total_pages},\n')
+                self.file.write(f'  "total_words": {self.total_words}\n')
+                self.file.write("}\n")
+            self.file.close()
+            self.closed = True
+
+        return {
+            "source": self.source,
+            "crawled_at": self.crawled_at,
+            "total_pages": self.total_pages,
+            "total_words": self.total_words,
+            "preview": self.preview
+        }
+
+
+def iter_crawl_pages(path: Path) -> Iterator[Dict]:
+    """Yield pages from a crawl file without loading the whole file (NDJSON only)"""
+    if not is_ndjson(path):
+        yield from load_crawl_file(path).get("pages", [])
+        return
+
+    with _open_text(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Truncated last line from an interrupted crawl
+                break
+            if record.pop("type", None) == "page":
+                yield record
+
+
+def load_crawl_file(path: Path) -> Dict:
+    """
+    Load a crawl file in any supported format
+
+    Returns:
+        Dict with source, crawled_at, total_pages, total_words and pages
+    """
+    path = Path(path)
+    if not is_ndjson(path):
+        with _open_text(path, "r") as f:
+            return json.load(f)
+
+    data = {"source": None, "crawled_at": None, "pages": []}
+    with _open_text(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            record_type = record.pop("type", None)
+            if record_type == "page":
+                data["pages"].append(record)
+            elif record_type == "crawl":
+                data.update(record)
+
+    # Totals are recomputed so files from interrupted crawls still load
+    data["total_pages"] = len(data["pages"])
+    data["total_words"] = sum(p.get("wordCount", 0) for p in data["pages"])
+    return data
@@ -2,26 +2,33 @@
 """
 Automated documentation crawler using Crawl4AI backend
 """
-import json
+import os
 import sys
 import asyncio
 from pathlib import Path
-from datetime import datetime, timezone
 
 # Add parent directory to path to import crawl_backend
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from crawl_backend import crawl
+from crawl_client import run_crawl
+from crawl_output import CrawlWriter
 
-async def crawl_docs(url: str, max_pages: int = 0, output_file: str = "docs.json", headless: bool = False):
+async def crawl_docs(url: str, max_pages: int = 0, output_file: str = "docs.json", headless: bool = False,
+                     use_cache: bool = True, service: str = None, resume: bool = False,
+                     strip_boilerplate: bool = True):
     """
-    Crawl documentation and save to JSON
+    Crawl documentation and stream pages to data/raw/ as they are extracted
     
     Args:
         url: Documentation URL to crawl
         max_pages: Maximum pages to crawl (0 = unlimited)
-        output_file: Output filename in data/raw/
+        output_file: Output filename in data/raw/ (.json, .ndjson or .ndjson.gz)
         headless: Run browser in headless mode (False helps bypass bot detection)
+        use_cache: Revalidate against the crawl cache and only re-render changed pages
+        service: "host:port" of a running crawl_service.py to run the job on warm
+                 browsers (falls back to a local crawl if it is not reachable)
+        resume: Continue an interrupted crawl of the same URL and output file
+        strip_boilerplate: Drop nav/header/footer blocks repeated across pages before saving
     """
     
     print(f"🚀 Starting crawl of: {url}")
@@ -29,6 +36,12 @@ async def crawl_docs(url: str, max_pages: int = 0, output_file: str = "docs.json
     print(f"   Strategy: BFS (breadth-first)")
     print(f"   Extraction: Markdown")
     print(f"   Headless: {headless}")
+    print(f"   Cache: {'revalidate' if use_cache else 'disabled'}")
+    print(f"   Boilerplate: {'stripped' if strip_boilerplate else 'kept'}")
+    if service:
+        print(f"   Service: {service}")
+    if resume:
+        print(f"   Resume: continuing from checkpoint")
     print(f"   Note: Non-headless mode may help bypass bot protection")
     print()
     
@@ -39,46 +52,85 @@ async def crawl_docs(url: str, max_pages: int = 0, output_file: str = "docs.json
         await new Promise(resolve => setTimeout(resolve, 3000));
         """
         
-        # Run the crawler with settings to bypass bot detection
-        result = await crawl(
-            url=url,
-            extraction_type="markdown",
-            js_code=wait_js,  # Wait 3 seconds for Netlify verification
-            headless=headless,  # Non-headless can help bypass Netlify protection
-            deep_crawl=True,
-            crawl_strategy="bfs",
-            max_pages=max_pages,
-            stream_progress=False
-        )
-        
-        # Add metadata
-        crawl_result = {
-            "source": url,
-            "crawled_at": datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
-            "total_pages": len(result.get("pages", [])),
-            "total_words": sum(page.get("wordCount", 0) for page in result.get("pages", [])),
-            "pages": result.get("pages", [])
-        }
-        
-        # Save to file
         output_path = Path(__file__).parent.parent / "data" / "raw" / output_file
-        output_path.parent.mkdir(parents=True, exist_ok=True)
+        # Frontier checkpoint - removed once the crawl completes
+        checkpoint_path = Path(__file__).parent.parent / "data" / "checkpoints" / f"{output_file}.sqlite"
+        writer = CrawlWriter(output_path, source=url)
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(crawl_result, f, indent=2, ensure_ascii=False)
+        # Run the crawler with settings to bypass bot detection
+        try:
+            ran_on_service = False
+            result = {}
+            if service:
+                try:
+                    result = await run_crawl({
+                        "url": url,
+                        "extractionType": "markdown",
+                        "jsCode": wait_js,
+                        "deepCrawl": True,
+                        "crawlStrategy": "bfs",
+                        "maxPages": max_pages,
+                        "useCache": use_cache,
+                        "checkpoint": str(checkpoint_path),
+                        "resume": resume,
+                        "stripBoilerplate": strip_boilerplate
+                    }, on_page=writer.write_page, address=service)
+                    # A rejected or failed job ("Too many queued jobs") is not a finished crawl
+                    if result.get("success") is False and not writer.total_pages:
+                        print(f"⚠️  Crawl service at {service} failed ({result.get('error')}), crawling locally")
+                    else:
+                        ran_on_service = True
+                except OSError as e:
+                    if writer.total_pages:
+                        raise
+                    print(f"⚠️  Crawl service at {service} unavailable ({e}), crawling locally")
+            
+            if not ran_on_service:
+                # Imported lazily - crawl4ai is slow to import and not needed with a service
+                from crawl_backend import crawl
+                
+                result = await crawl(
+                    url=url,
+                    extraction_type="markdown",
+                    js_code=wait_js,  # Wait 3 seconds for Netlify verification
+                    headless=headless,  # Non-headless can help bypass Netlify protection
+                    deep_crawl=True,
+                    crawl_strategy="bfs",
+                    max_pages=max_pages,
+                    stream_progress=False,
+                    use_cache=use_cache,
+                    on_page=writer.write_page,
+                    checkpoint=checkpoint_path,
+                    resume=resume,
+                    strip_boilerplate=strip_boilerplate
+                )
+            if result.get("success") is False and not writer.total_pages:
+                raise RuntimeError(result.get("error") or "Crawl failed")
+        finally:
+            # Always finish the file so interrupted crawls keep their pages
+            crawl_result = writer.close()
         
         print(f"✅ Crawled {crawl_result['total_pages']} pages")
         print(f"✅ Total words: {crawl_result['total_words']:,}")
         print(f"✅ Saved to: {output_path}")
+        boilerplate = result.get("boilerplate")
+        if boilerplate and boilerplate["bytesBefore"]:
+            saved = 1 - boilerplate["bytesAfter"] / boilerplate["bytesBefore"]
+            print(f"🧹 Stripped {boilerplate['blocksStripped']:,} repeated blocks ({saved:.0%} of page text)")
+        failed_pages = result.get("failedPages") or []
+        if failed_pages:
+            print(f"⚠️  {len(failed_pages)} pages failed after retries:")
+            for failure in failed_pages[:5]:
+                print(f"   • {failure['url']} ({failure['error']})")
         print()
         
         # Show first few pages
         print("📄 Crawled pages:")
-        for i, page in enumerate(crawl_result['pages'][:5], 1):
+        for i, page in enumerate(crawl_result['preview'], 1):
             print(f"   {i}. {page.get('title', 'Untitled')} ({page.get('wordCount', 0)} words)")
         
-        if len(crawl_result['pages']) > 5:
-            print(f"   ... and {len(crawl_result['pages']) - 5} more pages")
+        if crawl_result['total_pages'] > len(crawl_result['preview']):
+            print(f"   ... and {crawl_result['total_pages'] - len(crawl_result['preview'])} more pages")
         
         return crawl_result
         
@@ -95,9 +147,18 @@ async def main():
     parser.add_argument('-m', '--max-pages', type=int, default=0, 
                        help='Maximum pages to crawl (0 = unlimited)')
     parser.add_argument('-o', '--output', default='docs.json',
-                       help='Output filename (saved in data/raw/)')
+                       help='Output filename (saved in data/raw/). Use .ndjson or .ndjson.gz for '
+                            'append-only, optionally compressed output')
     parser.add_argument('--headless', action='store_true',
                        help='Run browser in headless mode (default: False for better bot bypass)')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Ignore the crawl cache and re-render every page')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue an interrupted crawl from its checkpoint')
+    parser.add_argument('--keep-boilerplate', action='store_true',
+                       help='Keep nav/header/footer blocks that repeat across pages')
+    parser.add_argument('--service', default=os.getenv("CRAWL_SERVICE_ADDR"),
+                       help='host:port of a running crawl_service.py (default: CRAWL_SERVICE_ADDR)')
     
     args = parser.parse_args()
     
@@ -105,7 +166,11 @@ async def main():
         url=args.url,
         max_pages=args.max_pages,
         output_file=args.output,
-        headless=args.headless
+        headless=args.headless,
+        use_cache=not args.no_cache,
+        service=args.service,
+        resume=args.resume,
+        strip_boilerplate=not args.keep_boilerplate
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate page detection
+Finds pages of a crawl that carry (almost) the same content under different
+URLs - versioned paths, print views, locale redirects - using MinHash
+signatures over word shingles and LSH banding, so only one copy is indexed.
+"""
+import hashlib
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 64
+# 16 bands x 4 rows: pairs above ~0.5 similarity become candidates, which are
+# then checked against the real threshold using the full signatures
+LSH_BANDS = 16
+DEFAULT_THRESHOLD = 0.9
+# Shingles hashed per NumPy block (bounds memory on very long pages)
+SHINGLE_BLOCK = 4096
+
+# Permutations (a * h + b) mod p with p = 2^31 - 1: for 32-bit shingle hashes the
+# products stay below 2^63, so the arithmetic is exact in uint64
+_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.default_rng(1)
+_A = _rng.integers(1, int(_PRIME), NUM_PERMUTATIONS, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, int(_PRIME), NUM_PERMUTATIONS, dtype=np.uint64)[:, None]
+
+
+def _shingles(text: str) -> np.ndarray:
+    """32-bit hashes of the distinct overlapping SHINGLE_WORDS-word windows of a text"""
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < SHINGLE_WORDS:
+        windows = [' '.join(words)] if words else []
+    else:
+        windows = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.fromiter((int.from_bytes(hashlib.blake2b(w.encode('utf-8'), digest_size=4).digest(), 'big')
+                        for w in windows), dtype=np.uint64)
+
+
+def minhash(text: str) -> Tuple[int, ...]:
+    """MinHash signature of a text (empty tuple for texts without words)"""
+    shingles = _shingles(text)
+    if not len(shingles):
+        return ()
+    signature = np.full(NUM_PERMUTATIONS, _PRIME, dtype=np.uint64)
+    for start in range(0, len(shingles), SHINGLE_BLOCK):
+        block = shingles[start:start + SHINGLE_BLOCK]
+        np.minimum(signature, ((_A * block + _B) % _PRIME).min(axis=1), out=signature)
+    return tuple(signature.tolist())
+
+
+def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    if not sig_a or not sig_b:
+        return 0.0
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def find_clusters(texts: List[str], threshold: float = DEFAULT_THRESHOLD) -> List[List[int]]:
+    """
+    Group near-duplicate texts
+
+    Returns:
+        Lists of indexes into texts, one per cluster of two or more near-duplicates
+    """
+    signatures = [minhash(text) for text in texts]
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+
+    parent = list(range(len(texts)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    buckets: Dict[Tuple, List[int]] = {}
+    for i, signature in enumerate(signatures):
+        if not signature:
+            continue
+        for band in range(LSH_BANDS):
+            key = (band, signature[band * rows:(band + 1) * rows])
+            for j in buckets.setdefault(key, []):
+                if find(i) != find(j) and similarity(signature, signatures[j]) >= threshold:
+                    parent[find(i)] = find(j)
+            buckets[key].append(i)
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(texts)):
+        clusters.setdefault(find(i), []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def dedupe_pages(pages: List[dict], threshold: float = DEFAULT_THRESHOLD):
+    """
+    Keep one canonical page per cluster of near-duplicates
+
+    The canonical page is the one with the shortest URL (the first one crawled
+    on a tie); the URLs of the others are recorded on it as "aliases".
+
+    Returns:
+        (unique pages in crawl order, [{"url": ..., "canonical": ...} for each skipped page])
+    """
+    canonical_of = {}
+    for members in find_clusters([page.get('content') or '' for page in pages], threshold):
+        canonical = min(members, key=lambda i: (len(pages[i]['url']), i))
+        for i in members:
+            if i != canonical:
+                canonical_of[i] = canonical
+
+    aliases: Dict[int, List[str]] = {}
+    skipped = []
+    for i, canonical in sorted(canonical_of.items()):
+        aliases.setdefault(canonical, []).append(pages[i]['url'])
+        skipped.append({"url": pages[i]['url'], "canonical": pages[canonical]['url']})
+
+    unique = []
+    for i, page in enumerate(pages):
+        if i in canonical_of:
+            continue
+        unique.append({**page, "aliases": aliases[i]} if i in aliases else page)
+    return unique, skipped
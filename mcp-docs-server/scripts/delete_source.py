@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 """
 Delete a documentation source from the index
+The source is tombstoned - gone from the catalog and from search results as
+soon as this returns - and its chunks are purged in the background by
+purge_tombstones.py.
 """
 import os
+import subprocess
 import sys
 import json
 from pathlib import Path
@@ -11,12 +15,23 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from dotenv import load_dotenv
-import chromadb
-from chromadb.config import Settings
+
+from catalog import Catalog, source_counts
+from purge_tombstones import PURGE_LOG_PATH
 
 # Load environment
 load_dotenv()
 
+def start_purge():
+    """Run purge_tombstones.py detached, so the caller does not wait for the chunks to go"""
+    PURGE_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(PURGE_LOG_PATH, 'a') as log:
+        subprocess.Popen(
+            [sys.executable, str(Path(__file__).parent / "purge_tombstones.py")],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+            cwd=str(Path(__file__).parent), start_new_session=True
+        )
+
 def delete_source(source_name: str):
     """
     Delete a documentation source from ChromaDB and metadata
@@ -28,27 +43,9 @@ def delete_source(source_name: str):
         JSON string with deletion results
     """
     try:
-        # Initialize ChromaDB
-        db_path = Path(__file__).parent.parent / "data" / "chroma_db"
-        chroma_client = chromadb.PersistentClient(
-            path=str(db_path),
-            settings=Settings(anonymized_telemetry=False)
-        )
-        
-        # Get collection
-        collection = chroma_client.get_collection(name="documentation")
-        
-        # Load metadata
-        metadata_path = Path(__file__).parent.parent / "data" / "chunks" / "metadata.json"
-        with open(metadata_path, 'r') as f:
-            metadata = json.load(f)
-        
-        # Find the source in metadata
-        source_to_delete = None
-        for source in metadata.get('sources', []):
-            if source['name'] == source_name:
-                source_to_delete = source
-                break
+        # Find the source in the catalog
+        catalog = Catalog()
+        source_to_delete = catalog.get_source(source_name)
         
         if not source_to_delete:
             return json.dumps({
@@ -56,48 +53,13 @@ def delete_source(source_name: str):
                 'error': f'Source "{source_name}" not found in metadata'
             })
         
-        # Delete all documents from ChromaDB
-        # Try both "source" (repositories) and "source_name" (documentation)
-        deleted_count = 0
-        
-        # Try deleting with "source" field (for repositories)
-        try:
-            results = collection.get(where={"source": source_name})
-            if len(results['ids']) > 0:
-                collection.delete(where={"source": source_name})
-                deleted_count += len(results['ids'])
-        except:
-            pass
-        
-        # Try deleting with "source_name" field (for documentation)
-        try:
-            results = collection.get(where={"source_name": source_name})
-            if len(results['ids']) > 0:
-                collection.delete(where={"source_name": source_name})
-                deleted_count += len(results['ids'])
-        except:
-            pass
-        
-        # Update metadata
-        metadata['sources'] = [s for s in metadata['sources'] if s['name'] != source_name]
-        
-        # Recalculate totals (handle both docs and repos)
-        total_chunks = sum(
-            s.get('chunks', 0) or s.get('total_chunks', 0) 
-            for s in metadata['sources']
-        )
-        total_words = sum(
-            s.get('words', 0) or s.get('total_lines', 0) 
-            for s in metadata['sources']
-        )
-        
-        metadata['total_chunks'] = total_chunks
-        metadata['total_words'] = total_words
-        metadata['total_sources'] = len(metadata['sources'])
-        
-        # Save updated metadata
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        # Tombstone it: removed from the catalog (totals adjusted in the same transaction)
+        # and filtered out of every search from now on
+        catalog.tombstone_source(source_name)
+        metadata = catalog.snapshot()
+        total_chunks = metadata['total_chunks']
+        total_words = metadata['total_words']
+        catalog.close()
         
         # Optionally delete the raw data file (only for documentation sources)
         raw_filename = source_to_delete.get('file')
@@ -106,10 +68,14 @@ def delete_source(source_name: str):
             if raw_file.exists() and raw_file.is_file():
                 raw_file.unlink()
         
+        # Chunks, keyword and symbol entries are removed in the background
+        start_purge()
+        
         output = {
             'success': True,
             'message': f'Successfully deleted source "{source_name}"',
-            'chunks_removed': deleted_count,
+            'chunks_removed': source_counts(source_to_delete)['chunks'],
+            'purge': 'background',
             'remaining_sources': len(metadata['sources']),
             'updated_metadata': {
                 'total_chunks': total_chunks,
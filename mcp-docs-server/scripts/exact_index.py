@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Exact vector search over memory-mapped NumPy matrices
+With SEARCH_BACKEND=numpy, search.py and the MCP server answer vector queries
+from a copy of each source's embeddings kept under data/exact/ instead of
+Chroma's HNSW index: a float32 matrix (memory-mapped, so nothing is loaded up
+front) with its row norms precomputed. A query is one matrix-vector product
+per searched source plus an argpartition top-k, so results are exact. Source
+filters and deleted (tombstoned) sources are applied as a boolean mask over
+the sources before any arithmetic.
+
+Chroma stays the store of record: the indexers refresh a source's matrix after
+writing it when the backend is enabled, rebuilds and snapshot imports refresh
+all of them, and `python scripts/exact_index.py build` creates them for an
+existing index.
+
+data/exact/
+    manifest.json                    source_id -> directory, chunk count, dimensions
+    <source_id>-<version>/
+        vectors.npy                  float32 [chunks x dimensions]
+        norms.npy                    float32 [chunks]
+        chunks.sqlite                row -> chunk id, document, metadata
+"""
+import fcntl
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from catalog import Catalog
+
+EXACT_INDEX_PATH = Path(__file__).parent.parent / "data" / "exact"
+SEARCH_BACKENDS = ("chroma", "numpy")
+
+
+def exact_enabled() -> bool:
+    """Whether searches use this backend (and writers must keep it current)"""
+    backend = os.getenv("SEARCH_BACKEND", "chroma")
+    if backend not in SEARCH_BACKENDS:
+        raise ValueError(f"Unknown SEARCH_BACKEND: {backend} (expected one of {', '.join(SEARCH_BACKENDS)})")
+    return backend == "numpy"
+
+
+class ExactIndex:
+    """Writer side: per-source matrices, swapped in through manifest.json"""
+
+    def __init__(self, path=None):
+        self.path = Path(path or EXACT_INDEX_PATH)
+        self.manifest_path = self.path / "manifest.json"
+
+    def manifest(self) -> Dict:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"sources": {}}
+
+    def _update_manifest(self, change):
+        """Apply change(sources) under a lock and replace manifest.json atomically; returns retired dirs"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / ".lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            manifest = self.manifest()
+            before = {key: entry["dir"] for key, entry in manifest["sources"].items()}
+            change(manifest["sources"])
+            tmp_path = self.manifest_path.with_name(f".manifest.{os.getpid()}.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+        after = {entry["dir"] for entry in manifest["sources"].values()}
+        # Readers that still map an old directory keep working (the files are only unlinked)
+        for directory in set(before.values()) - after:
+            shutil.rmtree(self.path / directory, ignore_errors=True)
+
+    def write_source(self, source_id: str, ids: List[str], documents: List[str],
+                     metadatas: List[Dict], embeddings) -> int:
+        """Store one source's chunks as a new matrix and make it live"""
+        if not ids:
+            self.remove_source(source_id)
+            return 0
+        directory = f"{source_id}-{time.time_ns()}"
+        target = self.path / directory
+        target.mkdir(parents=True)
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        np.save(target / "vectors.npy", vectors)
+        np.save(target / "norms.npy", np.linalg.norm(vectors, axis=1).astype(np.float32))
+        conn = sqlite3.connect(str(target / "chunks.sqlite"))
+        try:
+            with conn:
+                conn.execute("CREATE TABLE chunks (row INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL, "
+                             "document TEXT, metadata TEXT)")
+                conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                                 [(row, chunk_id, document, json.dumps(metadata)) for row, (chunk_id, document, metadata)
+                                  in enumerate(zip(ids, documents, metadatas))])
+                conn.execute("CREATE INDEX chunks_by_id ON chunks (chunk_id)")
+        finally:
+            conn.close()
+
+        def change(sources):
+            sources[source_id] = {"dir": directory, "chunks": len(ids), "dimensions": int(vectors.shape[1])}
+        self._update_manifest(change)
+        return len(ids)
+
+    def remove_source(self, source_id: str):
+        self._update_manifest(lambda sources: sources.pop(source_id, None))
+
+    def sync_source(self, storage, source_id: str) -> int:
+        """Copy a source's chunks from the live Chroma generation"""
+        chunks = storage.source_chunks(source_id, include=["documents", "metadatas", "embeddings"])
+        return self.write_source(source_id, chunks["ids"], chunks["documents"], chunks["metadatas"],
+                                 chunks["embeddings"])
+
+    def sync_all(self, storage) -> int:
+        """Rebuild every source from the live Chroma generation (after a full rebuild or import)"""
+        catalog = Catalog()
+        try:
+            keys = [source["source_id"] for source in catalog.sources()]
+        finally:
+            catalog.close()
+        total = sum(self.sync_source(storage, key) for key in keys)
+        live = set(keys)
+
+        def change(sources):
+            for key in list(sources):
+                if key not in live:
+                    sources.pop(key)
+        self._update_manifest(change)
+        return total
+
+
+class ExactSource:
+    """Reader side of one source: memory-mapped matrix, norms and chunk store"""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.vectors = np.load(directory / "vectors.npy", mmap_mode='r')
+        self.norms = np.load(directory / "norms.npy", mmap_mode='r')
+        self.conn = sqlite3.connect(str(directory / "chunks.sqlite"), check_same_thread=False)
+
+    def top_k(self, query: np.ndarray, query_norm: float, k: int):
+        """(distances, rows) of the k nearest chunks by cosine distance, best first"""
+        similarity = self.vectors @ query
+        similarity /= np.maximum(self.norms * query_norm, 1e-12)
+        if k < len(similarity):
+            rows = np.argpartition(-similarity, k)[:k]
+        else:
+            rows = np.arange(len(similarity))
+        rows = rows[np.argsort(-similarity[rows])]
+        return 1.0 - similarity[rows], rows
+
+    def rows(self, rows: List[int]) -> Dict[int, tuple]:
+        placeholders = ', '.join('?' for _ in rows)
+        return {row: (chunk_id, document, json.loads(metadata)) for row, chunk_id, document, metadata in
+                self.conn.execute(f"SELECT * FROM chunks WHERE row IN ({placeholders})", rows)}
+
+    def by_ids(self, ids: List[str]) -> List[tuple]:
+        placeholders = ', '.join('?' for _ in ids)
+        return [(chunk_id, document, json.loads(metadata)) for chunk_id, document, metadata in
+                self.conn.execute(f"SELECT chunk_id, document, metadata FROM chunks "
+                                  f"WHERE chunk_id IN ({placeholders})", ids)]
+
+    def close(self):
+        """Close the chunk store and release the memory maps"""
+        self.conn.close()
+        self.vectors = self.norms = None
+
+
+class ExactRouter:
+    """Drop-in replacement for storage.QueryRouter backed by the exact index"""
+
+    def __init__(self, path=None):
+        self.index = ExactIndex(path)
+        self.catalog = Catalog()
+        self.sources = {}
+        self.keys = np.array([], dtype=object)
+        self._manifest_mtime = None
+
+    def _refresh(self):
+        """Pick up sources re-written since the last query (cheap when nothing changed)"""
+        try:
+            mtime = self.index.manifest_path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._manifest_mtime:
+            return
+        self._manifest_mtime = mtime
+        entries = self.index.manifest()["sources"]
+        sources = {}
+        for key, entry in entries.items():
+            current = self.sources.get(key)
+            if current is not None and current.directory.name == entry["dir"]:
+                sources[key] = current
+            else:
+                sources[key] = ExactSource(self.index.path / entry["dir"])
+        # Replaced and removed sources hold an open connection and memory maps
+        for key, source in self.sources.items():
+            if sources.get(key) is not source:
+                source.close()
+        self.sources = sources
+        self.keys = np.array(sorted(sources), dtype=object)
+
+    def tombstoned_sources(self) -> frozenset:
+        return self.catalog.tombstoned_ids()
+
+    def targets(self, source_ids: List[str] = None) -> List[str]:
+        """source_ids to search: a boolean mask over the loaded sources"""
+        self._refresh()
+        mask = np.ones(len(self.keys), dtype=bool)
+        if source_ids:
+            mask &= np.isin(self.keys, list(source_ids))
+        tombstoned = self.tombstoned_sources()
+        if tombstoned:
+            mask &= ~np.isin(self.keys, list(tombstoned))
+        return list(self.keys[mask])
+
+    def take_failures(self) -> List[Dict]:
+        return []
+
+    def query(self, query_embedding: List[float], n_results: int, source_ids: List[str] = None) -> Dict:
+        """Exact nearest chunks (same shape as QueryRouter.query)"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        hits = []
+        for key in self.targets(source_ids):
+            source = self.sources[key]
+            distances, rows = source.top_k(query, query_norm, n_results)
+            hits.extend((float(distance), key, int(row)) for distance, row in zip(distances, rows))
+        hits.sort(key=lambda hit: hit[0])
+        hits = hits[:n_results]
+
+        chunks = {}
+        for key in {key for _, key, _ in hits}:
+            rows = self.sources[key].rows([row for _, hit_key, row in hits if hit_key == key])
+            chunks.update({(key, row): chunk for row, chunk in rows.items()})
+        return {
+            "ids": [chunks[(key, row)][0] for _, key, row in hits],
+            "documents": [chunks[(key, row)][1] for _, key, row in hits],
+            "metadatas": [chunks[(key, row)][2] for _, key, row in hits],
+            "distances": [distance for distance, _, _ in hits]
+        }
+
+    def get(self, ids: List[str], include: List[str] = ("documents", "metadatas"),
+            source_ids: List[str] = None) -> Dict:
+        """Chunks by id (same shape as QueryRouter.get)"""
+        found = {"ids": [], "documents": [], "metadatas": []}
+        for key in self.targets(source_ids):
+            for chunk_id, document, metadata in self.sources[key].by_ids(ids):
+                found["ids"].append(chunk_id)
+                found["documents"].append(document)
+                found["metadatas"].append(metadata)
+        return found
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from storage import Storage
+
+    parser = argparse.ArgumentParser(description="Build the exact (NumPy) search index from the live collections")
+    parser.add_argument("command", choices=["build"], help="build: copy every source's embeddings from Chroma")
+    args = parser.parse_args()
+
+    storage = Storage()
+    index = ExactIndex()
+    print(f"🧮 Building exact index in {index.path}...")
+    total = index.sync_all(storage)
+    print(f"✅ {total} chunks from {len(index.manifest()['sources'])} sources")
+    sys.exit(0)
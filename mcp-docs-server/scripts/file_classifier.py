@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Repository file classifier
+Recognises files that are large but useless to search - lockfiles, minified
+bundles, generated code, test snapshots and encoded blobs - so the repo
+indexer can skip them instead of paying to embed them.
+"""
+import fnmatch
+import math
+import re
+from collections import Counter
+from typing import Iterable, Optional
+
+from code_chunker import is_code_file
+
+CATEGORIES = ("lockfile", "minified", "generated", "snapshot", "high-entropy")
+
+LOCKFILE_NAMES = {
+    'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml', 'bun.lock',
+    'Cargo.lock', 'poetry.lock', 'Pipfile.lock', 'uv.lock', 'pdm.lock', 'composer.lock',
+    'Gemfile.lock', 'go.sum', 'mix.lock', 'flake.lock', 'packages.lock.json', 'Podfile.lock',
+    'pubspec.lock', 'gradle.lockfile'
+}
+
+MINIFIED_PATTERNS = ('*.min.js', '*.min.css', '*.min.mjs', '*.bundle.js', '*.js.map', '*.css.map', '*.map')
+
+GENERATED_PATTERNS = (
+    '*_pb2.py', '*_pb2_grpc.py', '*_pb2.pyi', '*.pb.go', '*.pb.cc', '*.pb.h', '*_pb.js', '*_pb.d.ts',
+    '*_grpc_pb.js', '*.pb.swift', '*_generated.*', '*.generated.*', '*.g.dart', '*.freezed.dart',
+    '*.designer.cs', '*.g.cs'
+)
+
+# Signatures code generators put in a comment at the top of their output. Only
+# checked in the first HEAD_LINES lines of code files: prose ("* Auto-generated
+# TypeScript clients" in a README) and hand-written notes ("# do not edit below")
+# must not match
+GENERATED_MARKERS = re.compile(
+    r'^\s*(#|//|/\*|\*|--|;|\(\*)[^\n]*'
+    r'(@generated|code generated \S.* do not edit|generated by the protocol buffer compiler|<auto-generated'
+    r'|(auto-?generated|automatically generated|generated by)\b[^\n]*\bdo not (edit|modify))',
+    re.IGNORECASE | re.MULTILINE
+)
+HEAD_LINES = 10
+
+SNAPSHOT_PATTERNS = ('*.snap', '*.snap.*', '__snapshots__/*', '*/__snapshots__/*')
+SNAPSHOT_MARKERS = re.compile(r'^// (Jest|Vitest) Snapshot v\d', re.MULTILINE)
+
+# Only the head of a file is inspected for markers, line lengths and entropy
+HEAD_CHARS = 2048
+SAMPLE_CHARS = 65536
+
+
+def _matches(path: str, patterns: Iterable[str]) -> bool:
+    name = path.rsplit('/', 1)[-1]
+    return any(fnmatch.fnmatchcase(name, p) or fnmatch.fnmatchcase(path, p) for p in patterns)
+
+
+def entropy(text: str) -> float:
+    """Shannon entropy in bits per character"""
+    if not text:
+        return 0.0
+    counts = Counter(text)
+    total = len(text)
+    return -sum(n / total * math.log2(n / total) for n in counts.values())
+
+
+def classify_path(path: str) -> Optional[str]:
+    """Category decided by the file path alone (checked before the file is read)"""
+    if path.rsplit('/', 1)[-1] in LOCKFILE_NAMES:
+        return "lockfile"
+    if _matches(path, SNAPSHOT_PATTERNS):
+        return "snapshot"
+    if _matches(path, MINIFIED_PATTERNS):
+        return "minified"
+    if _matches(path, GENERATED_PATTERNS):
+        return "generated"
+    return None
+
+
+def classify_content(content: str, path: str = "") -> Optional[str]:
+    """Category decided by the file content (generator markers only count in code files)"""
+    head = content[:HEAD_CHARS]
+    name = path.rsplit('/', 1)[-1]
+    extension = name[name.rindex('.'):].lower() if '.' in name else ''
+    if is_code_file(extension) and GENERATED_MARKERS.search('\n'.join(head.split('\n')[:HEAD_LINES])):
+        return "generated"
+    if SNAPSHOT_MARKERS.search(head):
+        return "snapshot"
+
+    sample = content[:SAMPLE_CHARS]
+    if len(sample) < 1024:
+        return None
+
+    # Encoded blobs (base64, embedded keys and fonts): dense and near-random. Checked
+    # before minified code, which is also dense but has a lower entropy (~5 bits/char)
+    whitespace = sum(1 for c in sample if c.isspace())
+    if whitespace < 0.03 * len(sample) and entropy(sample) > 5.5:
+        return "high-entropy"
+
+    # Minified: most of the text sits on very long lines
+    long_line_chars = sum(len(line) for line in sample.split('\n') if len(line) > 500)
+    if long_line_chars > 0.5 * len(sample):
+        return "minified"
+    return None
+
+
+class FileClassifier:
+    def __init__(self, keep: Iterable[str] = ()):
+        """
+        Args:
+            keep: Overrides - category names (e.g. "generated") or path globs
+                  (e.g. "proto/*_pb2.py") of files to index anyway
+        """
+        keep = list(keep or [])
+        self.keep_categories = {k for k in keep if k in CATEGORIES}
+        self.keep_patterns = [k for k in keep if k not in CATEGORIES]
+
+    def _kept(self, path: str, category: Optional[str]) -> Optional[str]:
+        if category is None or category in self.keep_categories:
+            return None
+        if self.keep_patterns and _matches(path, self.keep_patterns):
+            return None
+        return category
+
+    def classify_path(self, path: str) -> Optional[str]:
+        """Skip category for a path, or None to read the file"""
+        return self._kept(path, classify_path(path))
+
+    def classify(self, path: str, content: str) -> Optional[str]:
+        """Skip category for a file that has been read, or None to index it"""
+        return self._kept(path, classify_path(path) or classify_content(content, path))
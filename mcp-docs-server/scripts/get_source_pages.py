@@ -12,8 +12,8 @@ from collections import defaultdict
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from dotenv import load_dotenv
-import chromadb
-from chromadb.config import Settings
+
+from storage import Storage
 
 # Load environment
 load_dotenv()
@@ -29,21 +29,12 @@ def get_source_pages(source_name: str):
         JSON string with page information
     """
     try:
-        # Initialize ChromaDB
-        db_path = Path(__file__).parent.parent / "data" / "chroma_db"
-        chroma_client = chromadb.PersistentClient(
-            path=str(db_path),
-            settings=Settings(anonymized_telemetry=False)
-        )
-        
-        # Get collection
-        collection = chroma_client.get_collection(name="documentation")
+        # Chunk collections (shared and/or one per source)
+        storage = Storage()
         
-        # Get all documents for this source (try both field names)
-        results = collection.get(
-            where={"source": source_name},
-            include=["metadatas", "documents"]
-        )
+        # Get all documents for this source
+        key = storage.catalog.source_ids_for([source_name])[0]
+        results = storage.source_chunks(key, include=["metadatas", "documents"])
         
         if not results['ids']:
             return json.dumps({
@@ -2,19 +2,22 @@
 """
 Documentation indexer with OpenAI embeddings and ChromaDB
 """
-import json
 import os
 import sys
 from pathlib import Path
 from typing import List, Dict
 import re
 
-import chromadb
-from chromadb.config import Settings
 from openai import OpenAI
 from dotenv import load_dotenv
 import tiktoken
 
+from crawl_output import load_crawl_file
+from lexical_index import LexicalIndex
+from catalog import Catalog, source_id
+from exact_index import ExactIndex, exact_enabled
+from storage import Storage
+
 # Load environment variables
 load_dotenv()
 
@@ -25,21 +28,6 @@ class DocIndexer:
         self.chunk_size = int(os.getenv("CHUNK_SIZE", 800))
         self.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", 100))
         
-        # Initialize ChromaDB
-        db_path = Path(__file__).parent.parent / "data" / "chroma_db"
-        db_path.mkdir(parents=True, exist_ok=True)
-        
-        self.chroma_client = chromadb.PersistentClient(
-            path=str(db_path),
-            settings=Settings(anonymized_telemetry=False)
-        )
-        
-        # Create or get collection
-        self.collection = self.chroma_client.get_or_create_collection(
-            name="documentation",
-            metadata={"hnsw:space": "cosine"}
-        )
-        
         # Tokenizer for chunking
         self.tokenizer = tiktoken.encoding_for_model("gpt-3.5-turbo")
     
@@ -88,11 +76,12 @@ class DocIndexer:
         
         # Load documents
         docs_path = Path(__file__).parent.parent / "data" / "raw" / docs_file
-        with open(docs_path) as f:
-            data = json.load(f)
+        data = load_crawl_file(docs_path)
         
         pages = data.get("pages", [])
         total_pages = len(pages)
+        source_url = data.get("source") or "unknown"
+        source_name = source_url.replace("https://", "").replace("http://", "").split("/")[0]
         
         print(f"📄 Indexing {total_pages} pages...")
         print(f"📊 Total words: {data.get('total_words', 0):,}")
@@ -115,6 +104,8 @@ class DocIndexer:
                     "title": page['title'],
                     "page_index": page_idx,
                     "source": data.get("source", "unknown"),
+                    "source_name": source_name,
+                    "source_id": source_id(source_name),
                     "word_count": page.get('wordCount', 0)
                 }
             )
@@ -138,51 +129,70 @@ class DocIndexer:
         # Store in ChromaDB
         print(f"\n💾 Storing {len(all_chunks)} chunks in ChromaDB...")
         
-        # Clear existing collection
-        try:
-            self.chroma_client.delete_collection("documentation")
-            print("  🗑️  Cleared existing collection")
-        except:
-            pass
-        
-        self.collection = self.chroma_client.create_collection(
-            name="documentation",
-            metadata={"hnsw:space": "cosine"}
-        )
+        # Build a new generation next to the live one, which keeps serving searches
+        catalog = Catalog()
+        generation = catalog.allocate_generation()
+        staging = Storage(generation=generation)
+        print(f"  🟦 Building generation {generation}")
+        
+        collection = staging.write_collection(source_id(source_name))
         
         # Add in batches (ChromaDB has limits)
         batch_size = 100
-        for i in range(0, len(all_chunks), batch_size):
-            end_idx = min(i + batch_size, len(all_chunks))
-            
-            self.collection.add(
-                documents=all_chunks[i:end_idx],
-                embeddings=all_embeddings[i:end_idx],
-                metadatas=all_metadatas[i:end_idx],
-                ids=all_ids[i:end_idx]
-            )
-            
-            print(f"  ✓ Stored batch {i//batch_size + 1}/{(len(all_chunks) + batch_size - 1)//batch_size}")
+        try:
+            for i in range(0, len(all_chunks), batch_size):
+                end_idx = min(i + batch_size, len(all_chunks))
+                
+                collection.add(
+                    documents=all_chunks[i:end_idx],
+                    embeddings=all_embeddings[i:end_idx],
+                    metadatas=all_metadatas[i:end_idx],
+                    ids=all_ids[i:end_idx]
+                )
+                
+                print(f"  ✓ Stored batch {i//batch_size + 1}/{(len(all_chunks) + batch_size - 1)//batch_size}")
+        except BaseException:
+            staging.drop_generation(generation)
+            catalog.close()
+            raise
         
         print(f"\n✅ Successfully indexed {len(all_chunks)} chunks from {total_pages} pages!")
         
-        # Save metadata
-        metadata_file = Path(__file__).parent.parent / "data" / "chunks" / "metadata.json"
-        metadata_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(metadata_file, 'w') as f:
-            json.dump({
-                "total_pages": total_pages,
-                "total_chunks": len(all_chunks),
-                "total_words": data.get('total_words', 0),
-                "source": data.get("source"),
-                "indexed_at": data.get("crawled_at"),
-                "embedding_model": self.embedding_model,
-                "chunk_size": self.chunk_size,
-                "chunk_overlap": self.chunk_overlap
-            }, f, indent=2)
-        
-        print(f"📊 Metadata saved to {metadata_file}")
+        # Swap: the catalog now holds just this source, and its generation goes live in the same transaction
+        try:
+            catalog.replace_all(
+                [{
+                    "name": source_name,
+                    "url": source_url,
+                    "type": "documentation",
+                    "source_id": source_id(source_name),
+                    "collection": staging.write_collection_name(source_id(source_name)),
+                    "pages": total_pages,
+                    "chunks": len(all_chunks),
+                    "words": data.get('total_words', 0),
+                    "indexed_at": data.get("crawled_at"),
+                    "file": docs_file
+                }],
+                settings={
+                    "embedding_model": self.embedding_model,
+                    "chunk_size": self.chunk_size,
+                    "chunk_overlap": self.chunk_overlap
+                },
+                generation=generation
+            )
+        finally:
+            catalog.close()
+        
+        lexical_index = LexicalIndex()
+        lexical_index.replace_all(all_ids, all_chunks, all_metadatas)
+        lexical_index.close()
+        retired = staging.drop_generations_before(generation)
+        print(f"🔀 Swapped in generation {generation} ({retired} retired collections removed)")
+        if exact_enabled():
+            ExactIndex().sync_all(staging)
+            print("🧮 Exact search matrices rebuilt")
+        
+        print(f"📊 Metadata saved to {catalog.path}")
         
         # Show cost estimate
         total_tokens = sum(m['chunk_tokens'] for m in all_metadatas)
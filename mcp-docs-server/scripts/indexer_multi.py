@@ -3,97 +3,62 @@
 Multi-source documentation indexer with OpenAI embeddings and ChromaDB
 Supports indexing multiple documentation sources into a single searchable collection
 """
-import json
 import os
 import sys
 from pathlib import Path
 from typing import List, Dict
 import re
-from datetime import datetime, timezone
 
-import chromadb
-from chromadb.config import Settings
 from openai import OpenAI
 from dotenv import load_dotenv
 import tiktoken
 
+from crawl_output import load_crawl_file
+from dedup import dedupe_pages
+from lexical_index import LexicalIndex
+from catalog import Catalog, source_id, utc_now
+from exact_index import ExactIndex, exact_enabled
+from storage import Storage
+
 # Load environment variables
 load_dotenv()
 
 class MultiDocIndexer:
-    def __init__(self, append_mode: bool = True):
+    def __init__(self, append_mode: bool = True, skip_duplicates: bool = True):
         """
         Initialize the multi-source indexer
         
         Args:
             append_mode: If True, adds to existing docs. If False, replaces all.
+            skip_duplicates: Index one canonical copy of near-duplicate pages
         """
         self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
         self.chunk_size = int(os.getenv("CHUNK_SIZE", 800))
         self.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", 100))
         self.append_mode = append_mode
+        self.skip_duplicates = skip_duplicates
+        self.duplicate_threshold = float(os.getenv("DUPLICATE_THRESHOLD", 0.9))
         
-        # Initialize ChromaDB
-        db_path = Path(__file__).parent.parent / "data" / "chroma_db"
-        db_path.mkdir(parents=True, exist_ok=True)
+        # Chunk collections (shared, or one per source with COLLECTION_LAYOUT=per-source)
+        self.storage = Storage()
         
-        self.chroma_client = chromadb.PersistentClient(
-            path=str(db_path),
-            settings=Settings(anonymized_telemetry=False)
-        )
+        # Source catalog (also exports data/chunks/metadata.json)
+        self.catalog = Catalog()
         
-        # Load or create metadata
-        self.metadata_file = Path(__file__).parent.parent / "data" / "chunks" / "metadata.json"
-        self.metadata_file.parent.mkdir(parents=True, exist_ok=True)
-        self.metadata = self.load_metadata()
+        # Keyword index kept alongside the collection
+        self.lexical_index = LexicalIndex()
         
-        # Create or get collection
-        if append_mode:
-            self.collection = self.chroma_client.get_or_create_collection(
-                name="documentation",
-                metadata={"hnsw:space": "cosine"}
-            )
-        else:
-            # Clear and recreate
-            try:
-                self.chroma_client.delete_collection("documentation")
-                print("  🗑️  Cleared existing collection")
-            except:
-                pass
-            self.collection = self.chroma_client.create_collection(
-                name="documentation",
-                metadata={"hnsw:space": "cosine"}
-            )
-            self.metadata = {"sources": [], "total_chunks": 0, "total_words": 0}
+        # Replace mode rebuilds into a fresh generation; searches keep using the live one until the swap
+        self.staging_generation = None
+        if not append_mode:
+            self.staging_generation = self.catalog.allocate_generation()
+            self.storage = Storage(generation=self.staging_generation)
+            print(f"  🟦 Building generation {self.staging_generation} (the live index stays searchable)")
         
         # Tokenizer for chunking
         self.tokenizer = tiktoken.encoding_for_model("gpt-3.5-turbo")
     
-    def load_metadata(self) -> dict:
-        """Load existing metadata"""
-        if self.metadata_file.exists():
-            with open(self.metadata_file) as f:
-                return json.load(f)
-        return {
-            "sources": [],
-            "total_chunks": 0,
-            "total_words": 0,
-            "embedding_model": self.embedding_model,
-            "chunk_size": self.chunk_size,
-            "chunk_overlap": self.chunk_overlap
-        }
-    
-    def save_metadata(self):
-        """Save metadata to file"""
-        self.metadata["embedding_model"] = self.embedding_model
-        self.metadata["chunk_size"] = self.chunk_size
-        self.metadata["chunk_overlap"] = self.chunk_overlap
-        self.metadata["last_updated"] = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
-        
-        with open(self.metadata_file, 'w') as f:
-            json.dump(self.metadata, f, indent=2)
-    
     def chunk_text(self, text: str, metadata: dict) -> List[Dict]:
         """Split text into overlapping chunks"""
         chunks = []
@@ -142,6 +107,20 @@ class MultiDocIndexer:
         )
         return [item.embedding for item in response.data]
     
+    def swap_in(self, sources: List[Dict], settings: Dict, ids: List[str], texts: List[str], metadatas: List[Dict]):
+        """Make the staged generation live, then drop the one it replaced"""
+        # Sources and the generation pointer flip in one catalog transaction
+        self.catalog.replace_all(sources, settings=settings, generation=self.staging_generation)
+        self.lexical_index.replace_all(ids, texts, metadatas)
+        retired = self.storage.drop_generations_before(self.staging_generation)
+        print(f"🔀 Swapped in generation {self.staging_generation} ({retired} retired collections removed)")
+    
+    def discard_staging(self):
+        """Drop a rebuild that failed before its swap (the live index is untouched)"""
+        if self.staging_generation is not None:
+            self.storage.drop_generation(self.staging_generation)
+            print(f"🗑️  Discarded staged generation {self.staging_generation}")
+    
     def index_documents(self, docs_file: str, source_name: str = None):
         """
         Index documentation from JSON file
@@ -153,8 +132,7 @@ class MultiDocIndexer:
         
         # Load documents
         docs_path = Path(__file__).parent.parent / "data" / "raw" / docs_file
-        with open(docs_path) as f:
-            data = json.load(f)
+        data = load_crawl_file(docs_path)
         
         pages = data.get("pages", [])
         total_pages = len(pages)
@@ -171,23 +149,50 @@ class MultiDocIndexer:
         print(f"🔄 Mode: {'APPEND' if self.append_mode else 'REPLACE'}")
         print()
         
+        # Index one copy of pages served under several URLs
+        duplicates = []
+        if self.skip_duplicates:
+            pages, duplicates = dedupe_pages(pages, self.duplicate_threshold)
+            total_pages = len(pages)
+            if duplicates:
+                print(f"🔁 Skipping {len(duplicates)} near-duplicate pages:")
+                for duplicate in duplicates[:5]:
+                    print(f"   • {duplicate['url']} → {duplicate['canonical']}")
+                if len(duplicates) > 5:
+                    print(f"   ... and {len(duplicates) - 5} more")
+                print()
+        
         # Check if this source already exists
         existing_source = None
-        for src in self.metadata.get("sources", []):
+        for src in self.catalog.sources():
             if src.get("url") == source_url or src.get("name") == source_name:
                 existing_source = src
                 break
+        # Key the chunks are stored under (unique even when names fold alike, e.g. "C++" and "C")
+        if existing_source and existing_source.get("source_id"):
+            key = existing_source["source_id"]
+        else:
+            key = self.catalog.source_key(source_name)
         
         if existing_source and self.append_mode:
             print(f"⚠️  Source '{source_name}' already indexed. Removing old version...")
             # Remove old chunks from this source
             try:
-                results = self.collection.get(where={"source": source_url})
-                if results['ids']:
-                    self.collection.delete(ids=results['ids'])
-                    print(f"  ✓ Removed {len(results['ids'])} old chunks")
+                old_key = existing_source.get("source_id") or source_id(existing_source["name"])
+                removed = self.storage.remove_source(old_key)
+                if removed:
+                    print(f"  ✓ Removed {removed} old chunks")
+                self.lexical_index.delete_source(old_key)
             except Exception as e:
                 print(f"  ⚠️  Could not remove old chunks: {e}")
+        elif self.append_mode and key in self.catalog.tombstoned_ids():
+            # Deleted earlier and not purged yet: finish the purge before writing the new chunks
+            # Under the tombstone lease, so a running purge stops before its next step
+            with self.catalog.tombstone_lease():
+                removed = self.storage.remove_source(key)
+                self.lexical_index.delete_source(key)
+                self.catalog.clear_tombstone(key)
+            print(f"  ✓ Purged {removed} chunks left from a deleted version")
         
         all_chunks = []
         all_metadatas = []
@@ -202,18 +207,21 @@ class MultiDocIndexer:
             if page_idx % 10 == 0:
                 print(f"  Processing page {page_idx + 1}/{total_pages}...")
             
+            chunk_metadata = {
+                "url": page['url'],
+                "title": page['title'],
+                "page_index": page_idx,
+                "source": source_url,
+                "source_name": source_name,
+                "source_id": key,
+                "word_count": page.get('wordCount', 0)
+            }
+            if page.get('aliases'):
+                # Other URLs serving the same content (space-separated)
+                chunk_metadata["aliases"] = " ".join(page['aliases'])
+            
             # Create chunks for this page
-            chunks = self.chunk_text(
-                text=page['content'],
-                metadata={
-                    "url": page['url'],
-                    "title": page['title'],
-                    "page_index": page_idx,
-                    "source": source_url,
-                    "source_name": source_name,
-                    "word_count": page.get('wordCount', 0)
-                }
-            )
+            chunks = self.chunk_text(text=page['content'], metadata=chunk_metadata)
             
             # Collect chunks
             for chunk_idx, chunk in enumerate(chunks):
@@ -244,16 +252,19 @@ class MultiDocIndexer:
         print(f"\n💾 Storing {len(all_chunks)} chunks in ChromaDB...")
         
         # Add in batches
+        collection = self.storage.write_collection(key)
         batch_size = 100
         for i in range(0, len(all_chunks), batch_size):
             end_idx = min(i + batch_size, len(all_chunks))
             
-            self.collection.add(
+            collection.add(
                 documents=all_chunks[i:end_idx],
                 embeddings=all_embeddings[i:end_idx],
                 metadatas=all_metadatas[i:end_idx],
                 ids=all_ids[i:end_idx]
             )
+            if self.append_mode:
+                self.lexical_index.add(all_ids[i:end_idx], all_chunks[i:end_idx], all_metadatas[i:end_idx])
             
             print(f"  ✓ Stored batch {i//batch_size + 1}/{(len(all_chunks) + batch_size - 1)//batch_size}")
         
@@ -265,27 +276,39 @@ class MultiDocIndexer:
             "url": source_url,
             "type": "documentation",
             "pages": total_pages,
+            "duplicates_skipped": len(duplicates),
             "chunks": len(all_chunks),
             "words": data.get('total_words', 0),
-            "indexed_at": datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+            "indexed_at": utc_now(),
+            "source_id": key,
+            "collection": self.storage.write_collection_name(key),
             "file": docs_file
         }
         
-        # Remove old source info if exists
-        if existing_source:
-            self.metadata["sources"] = [s for s in self.metadata.get("sources", []) 
-                                        if s.get("url") != source_url and s.get("name") != source_name]
-        
-        # Add new source info
-        self.metadata.setdefault("sources", []).append(new_source_info)
-        
-        # Update totals
-        self.metadata["total_chunks"] = sum(s.get("chunks", s.get("total_chunks", 0)) for s in self.metadata["sources"])
-        self.metadata["total_words"] = sum(s.get("words", 0) for s in self.metadata["sources"])
-        self.metadata["total_sources"] = len(self.metadata["sources"])
-        
-        self.save_metadata()
-        print(f"📊 Metadata saved to {self.metadata_file}")
+        settings = {
+            "embedding_model": self.embedding_model,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap
+        }
+        if self.append_mode:
+            # Replace the old source entry; totals are adjusted in the same transaction
+            self.catalog.upsert_source(
+                new_source_info,
+                settings=settings,
+                replaces=existing_source["name"] if existing_source else None
+            )
+        else:
+            self.swap_in([new_source_info], settings, all_ids, all_chunks, all_metadatas)
+        print(f"📊 Metadata saved to {self.catalog.path}")
+        
+        if exact_enabled():
+            # SEARCH_BACKEND=numpy answers from its own copy of the embeddings
+            exact_index = ExactIndex()
+            if self.append_mode:
+                exact_index.write_source(key, all_ids, all_chunks, all_metadatas, all_embeddings)
+            else:
+                exact_index.sync_all(self.storage)
+            print("🧮 Exact search matrix updated")
         
         # Show cost estimate
         total_tokens = sum(m['chunk_tokens'] for m in all_metadatas)
@@ -293,12 +316,13 @@ class MultiDocIndexer:
         print(f"\n💰 Estimated cost for this source: ${cost_estimate:.4f}")
         
         # Show total stats
+        catalog = self.catalog.snapshot()
         print(f"\n📚 Total Documentation Stats:")
-        print(f"   Sources: {self.metadata['total_sources']}")
-        print(f"   Total Chunks: {self.metadata['total_chunks']}")
-        print(f"   Total Words: {self.metadata['total_words']:,}")
+        print(f"   Sources: {catalog['total_sources']}")
+        print(f"   Total Chunks: {catalog['total_chunks']}")
+        print(f"   Total Words: {catalog['total_words']:,}")
         print(f"\n   Indexed sources:")
-        for src in self.metadata["sources"]:
+        for src in catalog["sources"]:
             # Handle both documentation and repository sources
             pages = src.get('pages', src.get('total_files', 0))
             chunks = src.get('chunks', src.get('total_chunks', 0))
@@ -313,9 +337,15 @@ if __name__ == "__main__":
     parser.add_argument('-n', '--name', help='Custom name for this documentation source')
     parser.add_argument('-r', '--replace', action='store_true', 
                        help='Replace all existing documentation (default: append)')
+    parser.add_argument('--keep-duplicates', action='store_true',
+                       help='Index near-duplicate pages too (default: one copy per cluster)')
     
     args = parser.parse_args()
     
-    indexer = MultiDocIndexer(append_mode=not args.replace)
-    indexer.index_documents(args.docs_file, source_name=args.name)
+    indexer = MultiDocIndexer(append_mode=not args.replace, skip_duplicates=not args.keep_duplicates)
+    try:
+        indexer.index_documents(args.docs_file, source_name=args.name)
+    except BaseException:
+        indexer.discard_staging()
+        raise
 
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Lexical index
+On-disk inverted index (SQLite FTS5, ranked with BM25) over the text of every
+chunk in Chroma, kept in step by the indexers. Catches the keyword-heavy
+queries dense search misses - error messages, config keys, API names - and
+answers keyword-only searches without an embedding call.
+
+FTS5 can only look rows up by rowid or MATCH, so chunk_rows maps each chunk
+id to its FTS rowid (and source) with ordinary B-tree indexes; replacing or
+deleting chunks goes through it instead of scanning the whole FTS table.
+"""
+import re
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+DEFAULT_LEXICAL_INDEX_PATH = Path(__file__).parent.parent / "data" / "lexical.sqlite"
+
+# Terms of a query: words, keeping snake_case and dotted names together
+QUERY_TERM = re.compile(r'[\w.]+')
+
+
+
+def match_expression(query: str) -> str:
+    """FTS5 MATCH expression for free text: any of its terms, each quoted as a phrase"""
+    terms = []
+    for term in QUERY_TERM.findall(query):
+        # Dotted names are indexed as separate tokens - search them as a phrase
+        term = term.strip('.')
+        if term and term not in terms:
+            terms.append(term)
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+class LexicalIndex:
+    def __init__(self, path=None):
+        self.path = Path(path or DEFAULT_LEXICAL_INDEX_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(chunks)")]
+            if columns and "source_id" not in columns:
+                # Written before chunks carried source_id - migrate_source_ids.py rebuilds it
+                self.conn.execute("DROP TABLE chunks")
+            # '_' is part of a token so snake_case identifiers stay whole
+            self.conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+                    text,
+                    chunk_id UNINDEXED,
+                    source_id UNINDEXED,
+                    tokenize = "unicode61 remove_diacritics 2 tokenchars '_'"
+                )
+            """)
+            has_rows = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunk_rows'").fetchone()
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_rows (
+                    row INTEGER PRIMARY KEY,
+                    chunk_id TEXT NOT NULL UNIQUE,
+                    source_id TEXT
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS chunk_rows_by_source ON chunk_rows (source_id)")
+            if not has_rows:
+                # Index written before chunk_rows existed
+                self.conn.execute("INSERT OR IGNORE INTO chunk_rows (row, chunk_id, source_id) "
+                                  "SELECT rowid, chunk_id, source_id FROM chunks")
+
+    def _insert(self, ids: List[str], texts: List[str], metadatas: List[Dict]):
+        self.conn.executemany("INSERT INTO chunk_rows (chunk_id, source_id) VALUES (?, ?)",
+                              [(chunk_id, meta.get("source_id")) for chunk_id, meta in zip(ids, metadatas)])
+        self.conn.executemany(
+            "INSERT INTO chunks (rowid, text, chunk_id, source_id) "
+            "SELECT row, ?, chunk_id, source_id FROM chunk_rows WHERE chunk_id = ?",
+            [(text, chunk_id) for chunk_id, text in zip(ids, texts)]
+        )
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict], fresh: bool = False):
+        """
+        Index a batch of chunks (replacing any existing rows with the same ids)
+
+        Args:
+            fresh: The ids cannot be indexed yet (their source was just cleared), so
+                   skip looking for rows to replace
+        """
+        with self.conn:
+            if not fresh:
+                params = [(chunk_id,) for chunk_id in ids]
+                self.conn.executemany(
+                    "DELETE FROM chunks WHERE rowid = (SELECT row FROM chunk_rows WHERE chunk_id = ?)", params)
+                self.conn.executemany("DELETE FROM chunk_rows WHERE chunk_id = ?", params)
+            self._insert(ids, texts, metadatas)
+
+    def replace_all(self, ids: List[str], texts: List[str], metadatas: List[Dict]):
+        """Swap the whole index for these chunks in one transaction (readers see old or new, never empty)"""
+        with self.conn:
+            self.conn.execute("DELETE FROM chunks")
+            self.conn.execute("DELETE FROM chunk_rows")
+            self._insert(ids, texts, metadatas)
+
+    def delete_source(self, source_id: str) -> int:
+        """Remove a source's chunks"""
+        with self.conn:
+            self.conn.execute("DELETE FROM chunks WHERE rowid IN (SELECT row FROM chunk_rows WHERE source_id = ?)",
+                              (source_id,))
+            return self.conn.execute("DELETE FROM chunk_rows WHERE source_id = ?", (source_id,)).rowcount
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM chunks")
+            self.conn.execute("DELETE FROM chunk_rows")
+
+    def search(self, query: str, limit: int = 10, where: Dict = None) -> List[Tuple[str, float]]:
+        """
+        BM25-ranked chunk ids for a free-text query
+
+        Args:
+            query: Free text (terms are OR-ed; chunks matching more and rarer terms rank first)
+            limit: Maximum number of hits
+            where: Optional {"source_id": id} or {"source_id": {"$in" | "$nin": [ids]}} filter
+
+        Returns:
+            [(chunk_id, score)] best first (higher score is better)
+        """
+        expression = match_expression(query)
+        if not expression:
+            return []
+
+        sql = "SELECT chunk_id, bm25(chunks) AS rank FROM chunks WHERE chunks MATCH ?"
+        params = [expression]
+        for field, value in (where or {}).items():
+            if field != "source_id":
+                raise ValueError(f"Unsupported lexical filter field: {field}")
+            if isinstance(value, dict):
+                operator, values = next(iter(value.items()))
+                if operator not in ("$in", "$nin"):
+                    raise ValueError(f"Unsupported lexical filter operator: {operator}")
+                negate = "NOT " if operator == "$nin" else ""
+                sql += f" AND source_id {negate}IN ({', '.join('?' for _ in values)})"
+                params.extend(values)
+            else:
+                sql += " AND source_id = ?"
+                params.append(value)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+
+        try:
+            rows = self.conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            # Malformed MATCH expression - treat as no lexical hits
+            return []
+        # bm25() is lower-is-better; flip it so callers can treat it as a score
+        return [(chunk_id, -rank) for chunk_id, rank in rows]
+
+    def close(self):
+        self.conn.close()
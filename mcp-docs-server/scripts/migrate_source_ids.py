@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+One-time migration: tag every chunk with a normalized source_id
+
+Chunks indexed before source_id existed name their source in "source_name"
+(documentation) or "source" (repositories). This adds source_id to their
+metadata, records it in the catalog, re-keys the symbol index and rebuilds
+the keyword index from the collection. Safe to run more than once.
+"""
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+import chromadb
+from chromadb.config import Settings
+
+from catalog import Catalog, source_id
+from lexical_index import LexicalIndex
+from symbol_index import DEFAULT_SYMBOL_INDEX_PATH, SymbolIndex
+
+# Load environment
+load_dotenv()
+
+BATCH_SIZE = 500
+
+
+def chunk_source_name(metadata: dict) -> str:
+    """Source name of a chunk indexed before source_id existed"""
+    if metadata.get("source_type") == "repository":
+        return metadata.get("source", "")
+    if metadata.get("source_name"):
+        return metadata["source_name"]
+    # Single-source indexes (indexer.py) only stored the URL
+    return metadata.get("source", "").replace("https://", "").replace("http://", "").split("/")[0]
+
+
+def migrate():
+    db_path = Path(__file__).parent.parent / "data" / "chroma_db"
+    chroma_client = chromadb.PersistentClient(
+        path=str(db_path),
+        settings=Settings(anonymized_telemetry=False)
+    )
+    collection = chroma_client.get_collection(name="documentation")
+
+    lexical_index = LexicalIndex()
+    lexical_index.clear()
+
+    print("🔑 Tagging chunks with source_id...")
+    tagged = 0
+    seen = 0
+    offset = 0
+    while True:
+        batch = collection.get(include=["documents", "metadatas"], limit=BATCH_SIZE, offset=offset)
+        if not batch['ids']:
+            break
+        offset += len(batch['ids'])
+
+        update_ids, update_metadatas = [], []
+        metadatas = []
+        for chunk_id, metadata in zip(batch['ids'], batch['metadatas']):
+            if not metadata.get("source_id"):
+                metadata = {**metadata, "source_id": source_id(chunk_source_name(metadata))}
+                update_ids.append(chunk_id)
+                update_metadatas.append(metadata)
+            metadatas.append(metadata)
+        if update_ids:
+            collection.update(ids=update_ids, metadatas=update_metadatas)
+        lexical_index.add(batch['ids'], batch['documents'], metadatas, fresh=True)
+
+        tagged += len(update_ids)
+        seen += len(batch['ids'])
+        print(f"  ✓ {seen} chunks checked, {tagged} tagged")
+    lexical_index.close()
+    print(f"🔎 Rebuilt keyword index ({seen} chunks)")
+
+    # Catalog entries pick up their source_id when rewritten
+    catalog = Catalog()
+    try:
+        for source in list(catalog.sources()):
+            if not source.get("source_id"):
+                catalog.upsert_source(source)
+    finally:
+        catalog.close()
+
+    # Symbols were keyed by the raw repository name
+    renamed = 0
+    if DEFAULT_SYMBOL_INDEX_PATH.exists():
+        symbol_index = SymbolIndex()
+        try:
+            with symbol_index.conn:
+                for (name,) in symbol_index.conn.execute("SELECT DISTINCT source FROM symbols").fetchall():
+                    if name != source_id(name):
+                        symbol_index.conn.execute("UPDATE symbols SET source = ? WHERE source = ?",
+                                                  (source_id(name), name))
+                        renamed += 1
+        finally:
+            symbol_index.close()
+    print(f"🔣 Re-keyed symbols of {renamed} repositories")
+
+    print(f"\n✅ Migration complete: {tagged} of {seen} chunks tagged with source_id")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(migrate())
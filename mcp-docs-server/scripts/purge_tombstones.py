@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Purge deleted sources
+delete_source.py only tombstones a source - it disappears from the catalog and
+from search results at once. This removes the tombstoned sources' chunks from
+the collections, the keyword index and the symbol index in small batches with
+a pause in between, so Chroma's write lock is never held for long against
+searches, and clears each tombstone when its source is gone.
+
+Every destructive step runs under the catalog's tombstone lease and re-checks
+the tombstone first: a source re-indexed mid-purge (the indexers clear its
+tombstone under the same lease) keeps its new chunks and index entries.
+
+Started in the background by delete_source.py; safe to run by hand or from
+cron. Only one purge runs at a time.
+"""
+import argparse
+import fcntl
+import os
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from catalog import Catalog
+from exact_index import EXACT_INDEX_PATH, ExactIndex
+from lexical_index import DEFAULT_LEXICAL_INDEX_PATH, LexicalIndex
+from symbol_index import DEFAULT_SYMBOL_INDEX_PATH, SymbolIndex
+from storage import Storage
+
+# Load environment
+load_dotenv()
+
+PURGE_LOCK_PATH = Path(__file__).parent.parent / "data" / "purge.lock"
+PURGE_LOG_PATH = Path(__file__).parent.parent / "data" / "purge.log"
+
+
+class Reindexed(Exception):
+    """The source was re-indexed during the purge - its data is live again"""
+
+
+def while_tombstoned(catalog: Catalog, key: str, step):
+    """Run one destructive step under the tombstone lease, only if the source is still deleted"""
+    with catalog.tombstone_lease():
+        if key not in catalog.tombstoned_ids():
+            raise Reindexed(key)
+        return step()
+
+
+def delete_lexical(key: str):
+    lexical_index = LexicalIndex()
+    try:
+        lexical_index.delete_source(key)
+    finally:
+        lexical_index.close()
+
+
+def delete_symbols(key: str):
+    symbol_index = SymbolIndex()
+    try:
+        symbol_index.delete_source(key)
+    finally:
+        symbol_index.close()
+
+
+def purge_source(storage: Storage, catalog: Catalog, key: str, batch_size: int, pause: float) -> int:
+    """Remove one tombstoned source's chunks; returns how many were removed"""
+    removed = 0
+    try:
+        while True:
+            count = while_tombstoned(catalog, key, lambda: storage.remove_source_batch(key, batch_size))
+            if not count:
+                break
+            removed += count
+            print(f"  ✓ {key}: {removed} chunks removed")
+            time.sleep(pause)
+
+        if DEFAULT_LEXICAL_INDEX_PATH.exists():
+            while_tombstoned(catalog, key, lambda: delete_lexical(key))
+        if DEFAULT_SYMBOL_INDEX_PATH.exists():
+            while_tombstoned(catalog, key, lambda: delete_symbols(key))
+        if EXACT_INDEX_PATH.exists():
+            while_tombstoned(catalog, key, lambda: ExactIndex().remove_source(key))
+        while_tombstoned(catalog, key, lambda: catalog.clear_tombstone(key))
+    except Reindexed:
+        print(f"  ↩️  {key} was re-indexed, stopping")
+    return removed
+
+
+def purge(batch_size: int, pause: float) -> int:
+    PURGE_LOCK_PATH.parent.mkdir(parents=True, exist_ok=True)
+    catalog = Catalog()
+    storage = Storage()
+    try:
+        while catalog.tombstones():
+            with open(PURGE_LOCK_PATH, 'w') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # The running purge re-reads the tombstones before it exits
+                    print("⏳ Another purge is running")
+                    return 0
+                # Tombstones added while this loop runs are picked up by the next pass
+                for tombstone in catalog.tombstones():
+                    print(f"🧹 Purging {tombstone['name']} (deleted {tombstone['deleted_at']})")
+                    removed = purge_source(storage, catalog, tombstone["source_id"], batch_size, pause)
+                    print(f"✅ Purged {tombstone['name']}: {removed} chunks")
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    finally:
+        catalog.close()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove the chunks of deleted (tombstoned) sources")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("PURGE_BATCH_SIZE", 200)),
+                        help="Chunks deleted per batch (default: PURGE_BATCH_SIZE or 200)")
+    parser.add_argument("--pause-ms", type=int, default=int(os.getenv("PURGE_PAUSE_MS", 50)),
+                        help="Pause between batches so searches get the lock (default: PURGE_PAUSE_MS or 50)")
+    args = parser.parse_args()
+    sys.exit(purge(args.batch_size, args.pause_ms / 1000))
@@ -2,19 +2,27 @@
 """
 Repository indexer - Index local code files with OpenAI embeddings and ChromaDB
 """
-import json
 import os
 import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict
 import re
 
-import chromadb
-from chromadb.config import Settings
 from openai import OpenAI
 from dotenv import load_dotenv
 import tiktoken
 
+from repo_scanner import RepoScanner
+from file_classifier import FileClassifier
+from code_chunker import CodeChunker
+from symbol_index import SymbolIndex
+from lexical_index import LexicalIndex
+from catalog import Catalog, source_id, utc_now
+from exact_index import ExactIndex, exact_enabled
+from storage import Storage
+
 # Force unbuffered output
 sys.stdout.reconfigure(line_buffering=True)
 sys.stderr.reconfigure(line_buffering=True)
@@ -23,60 +31,36 @@ sys.stderr.reconfigure(line_buffering=True)
 load_dotenv()
 
 class RepoIndexer:
-    def __init__(self):
-        """Initialize the repository indexer"""
+    def __init__(self, max_file_bytes: int = None, workers: int = None, keep: List[str] = None):
+        """
+        Initialize the repository indexer
+        
+        Args:
+            max_file_bytes: Skip files larger than this (REPO_MAX_FILE_BYTES, default 1 MB)
+            workers: Threads reading and chunking files (REPO_INDEX_WORKERS, default: CPU count, max 8)
+            keep: Categories or path globs to index even though the classifier would skip
+                  them (lockfile, minified, generated, snapshot, high-entropy)
+        """
         self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
         self.chunk_size = int(os.getenv("CHUNK_SIZE", 800))
         self.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", 100))
+        self.max_file_bytes = max_file_bytes
+        self.workers = int(workers or os.getenv("REPO_INDEX_WORKERS", min(8, os.cpu_count() or 1)))
+        self.classifier = FileClassifier(keep or [])
         
-        # Initialize ChromaDB
-        db_path = Path(__file__).parent.parent / "data" / "chroma_db"
-        db_path.mkdir(parents=True, exist_ok=True)
-        
-        self.chroma_client = chromadb.PersistentClient(
-            path=str(db_path),
-            settings=Settings(anonymized_telemetry=False)
-        )
+        # Chunk collections (shared, or one per source with COLLECTION_LAYOUT=per-source)
+        self.storage = Storage()
         
-        # Get or create collection
-        self.collection = self.chroma_client.get_or_create_collection(
-            name="documentation",
-            metadata={"hnsw:space": "cosine"}
-        )
+        # Keyword index kept alongside the collection
+        self.lexical_index = LexicalIndex()
         
         # Tokenizer for chunking
         self.tokenizer = tiktoken.encoding_for_model("gpt-3.5-turbo")
+        self.code_chunker = CodeChunker(self.tokenizer, self.chunk_size, self.chunk_overlap)
     
-    def read_file_safely(self, file_path: Path) -> str:
-        """Read file content, skipping binary files"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return content
-        except (UnicodeDecodeError, PermissionError):
-            # Skip binary files or files without read permission
-            return None
-    
-    def should_ignore_path(self, path: Path, repo_root: Path) -> bool:
-        """Check if path should be ignored"""
-        # Common directories to ignore
-        ignore_dirs = {
-            'node_modules', '.git', '__pycache__', 'venv', 'env',
-            'dist', 'build', '.next', '.vscode', '.idea', 'coverage',
-            '.pytest_cache', '.mypy_cache', 'vendor', 'target'
-        }
-        
-        # Check if any parent directory is in ignore list
-        rel_path = path.relative_to(repo_root)
-        for part in rel_path.parts:
-            if part in ignore_dirs or part.startswith('.'):
-                return True
-        
-        return False
-    
-    def collect_files(self, repo_path: str, file_extensions: List[str] = None) -> List[Dict]:
-        """Collect all text files from repository"""
+    def scan_files(self, repo_path: str, file_extensions: List[str] = None):
+        """List candidate files without reading them (returns the scanner and the file list)"""
         repo_root = Path(repo_path).resolve()
         
         if not repo_root.exists():
@@ -92,49 +76,72 @@ class RepoIndexer:
             print(f"🔍 Indexing all text files (binary files will be skipped)")
         print()
         
-        files_data = []
+        # List candidate files without descending into ignored directories
+        scanner = RepoScanner(repo_root, file_extensions, self.max_file_bytes)
+        return scanner, list(scanner.files())
+    
+    def read_and_chunk(self, scanner: RepoScanner, file_info: Dict, source_name: str, key: str):
+        """
+        Read, decode and chunk one file (runs on the worker pool)
+        
+        Returns:
+            {"lines", "chunks"}, {"skipped": category} for lockfiles, minified, generated,
+            snapshot and high-entropy files, or None for binary, unreadable and empty files
+        """
+        # Lockfiles, snapshots etc. can often be recognised without reading them
+        category = self.classifier.classify_path(file_info['path'])
+        if category:
+            return {"skipped": category}
+        
+        # Binary files are skipped by sniffing the first bytes
+        content = scanner.read_text(file_info)
+        if content is None or not content.strip():
+            return None
         
-        # Walk through all files
-        for file_path in repo_root.rglob('*'):
-            # Skip if it's a directory
-            if file_path.is_dir():
-                continue
-            
-            # Skip if path should be ignored
-            if self.should_ignore_path(file_path, repo_root):
-                continue
-            
-            # Check if file extension matches (if extensions specified)
-            if file_extensions and file_path.suffix not in file_extensions:
-                continue
-            
-            # Read file content (will skip binary files automatically)
-            content = self.read_file_safely(file_path)
-            if content is None:
-                continue
-            
-            # Skip empty files
-            if not content.strip():
-                continue
-            
-            # Get relative path from repo root
-            rel_path = file_path.relative_to(repo_root)
-            
-            # Count lines
-            lines = content.count('\n') + 1
-            
-            files_data.append({
-                'path': str(rel_path),
-                'full_path': str(file_path),
-                'content': content,
-                'lines': lines,
-                'extension': file_path.suffix
-            })
+        category = self.classifier.classify(file_info['path'], content)
+        if category:
+            return {"skipped": category}
+        
+        lines = content.count('\n') + 1
+        chunks = self.chunk_file(
+            text=content,
+            extension=file_info['extension'],
+            metadata={
+                "file_path": file_info['path'],
+                "full_path": file_info['full_path'],
+                "file_extension": file_info['extension'],
+                "source": source_name,
+                "source_id": key,
+                "source_type": "repository",
+                "lines": lines
+            }
+        )
+        return {"lines": lines, "chunks": chunks}
+    
+    def ingest_files(self, scanner: RepoScanner, files: List[Dict], source_name: str, key: str):
+        """
+        Read and chunk files on a thread pool, yielding (file_info, result) in file order
+        
+        At most workers * 4 files are in flight, so only a bounded slice of the
+        repository is held in memory while the embedding stage catches up.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = deque()
+            remaining = iter(files)
+            for file_info in remaining:
+                in_flight.append((file_info, pool.submit(self.read_and_chunk, scanner, file_info, source_name, key)))
+                if len(in_flight) >= self.workers * 4:
+                    break
             
-            print(f"  ✓ {rel_path} ({lines} lines)")
-        
-        print(f"\n📊 Found {len(files_data)} text files")
-        return files_data
+            while in_flight:
+                file_info, future = in_flight.popleft()
+                next_file = next(remaining, None)
+                if next_file is not None:
+                    in_flight.append((next_file, pool.submit(self.read_and_chunk, scanner, next_file, source_name, key)))
+                
+                result = future.result()
+                if result is not None:
+                    yield file_info, result
     
     def chunk_text(self, text: str, metadata: dict) -> List[Dict]:
         """Split text into overlapping chunks"""
@@ -168,6 +175,31 @@ class RepoIndexer:
         
         return chunks
     
+    def chunk_file(self, text: str, extension: str, metadata: dict) -> List[Dict]:
+        """Split source files at definition boundaries, anything else into token windows"""
+        code_chunks = self.code_chunker.chunk(text, extension)
+        if code_chunks is None:
+            return self.chunk_text(text, metadata)
+        
+        chunks = []
+        for code_chunk in code_chunks:
+            chunk_metadata = {
+                **metadata,
+                "chunk_index": len(chunks),
+                "total_chunks": len(code_chunks),
+                "chunk_tokens": code_chunk["tokens"],
+                "start_line": code_chunk["start_line"],
+                "end_line": code_chunk["end_line"]
+            }
+            if code_chunk["symbol"]:
+                chunk_metadata["symbol"] = code_chunk["symbol"]
+            chunks.append({
+                "text": code_chunk["text"],
+                "metadata": chunk_metadata,
+                "definitions": code_chunk["definitions"]
+            })
+        return chunks
+    
     def create_embedding(self, text: str) -> List[float]:
         """Create embedding using OpenAI API"""
         response = self.openai_client.embeddings.create(
@@ -184,159 +216,184 @@ class RepoIndexer:
         )
         return [item.embedding for item in response.data]
     
+    def remove_source_chunks(self, key: str) -> int:
+        """Delete the chunks of a previous index of this source"""
+        # Under the tombstone lease, so a running purge of a deleted version stops before its next step
+        with self.storage.catalog.tombstone_lease():
+            removed = self.storage.remove_source(key)
+            self.lexical_index.delete_source(key)
+            if key in self.storage.catalog.tombstoned_ids():
+                # Deleted earlier and not purged yet - nothing is left to purge now
+                self.storage.catalog.clear_tombstone(key)
+        return removed
+    
     def index_repository(self, repo_path: str, source_name: str, file_extensions: List[str] = None):
         """Index repository files"""
         
-        # Collect files
-        files = self.collect_files(repo_path, file_extensions or [])
+        # List files (contents are read later, on the worker pool)
+        scanner, files = self.scan_files(repo_path, file_extensions or [])
         
         if not files:
             raise ValueError("No files found to index")
         
-        total_files = len(files)
-        total_lines = sum(f['lines'] for f in files)
+        # Key the chunks are stored under (unique even when names fold alike, e.g. "C++" and "C")
+        key = self.storage.catalog.source_key(source_name)
         
-        print(f"\n📄 Indexing {total_files} files...")
-        print(f"📊 Total lines: {total_lines:,}")
+        print(f"📄 Indexing up to {len(files)} files with {self.workers} workers...")
         print(f"⚙️  Chunk size: {self.chunk_size} tokens, overlap: {self.chunk_overlap}")
         print()
         
-        all_chunks = []
-        all_metadatas = []
-        all_ids = []
-        
-        # Get existing sources to generate unique IDs
-        existing_data = self.collection.get()
-        existing_sources = set()
-        if existing_data and existing_data['metadatas']:
-            existing_sources = {m.get('source') for m in existing_data['metadatas']}
-        
-        # Check if source already exists
-        if source_name in existing_sources:
-            print(f"⚠️  Source '{source_name}' already exists. Removing old data...")
-            # Delete old chunks for this source
-            old_ids = [
-                existing_data['ids'][i] 
-                for i, m in enumerate(existing_data['metadatas']) 
-                if m.get('source') == source_name
-            ]
-            if old_ids:
-                self.collection.delete(ids=old_ids)
-                print(f"🗑️  Removed {len(old_ids)} old chunks")
-        
-        # Process each file and collect all chunks first
-        for file_idx, file_data in enumerate(files):
-            print(f"Processing file {file_idx + 1}/{total_files}: {file_data['path']}...")
+        total_files = 0
+        total_lines = 0
+        total_chunks = 0
+        total_tokens = 0
+        old_removed = False
+        # category -> [files, bytes] skipped by the classifier
+        skipped = {}
+        # (file, symbol) -> definition, for the symbol index
+        symbols = {}
+        
+        # Chunks waiting for the next embedding batch
+        batch_texts = []
+        batch_metadatas = []
+        batch_ids = []
+        batch_size = 50  # OpenAI allows up to 2048, but 50 is safe and fast
+        
+        collection = None
+        
+        def flush_batch():
+            nonlocal old_removed, total_chunks, collection
+            if not batch_texts:
+                return
+            if not old_removed:
+                # Replace the previous index only once there is something to replace it with
+                removed = self.remove_source_chunks(key)
+                if removed:
+                    print(f"⚠️  Source '{source_name}' already existed. Removed {removed} old chunks")
+                old_removed = True
+                collection = self.storage.write_collection(key)
             
-            # Create chunks for this file
-            chunks = self.chunk_text(
-                text=file_data['content'],
-                metadata={
-                    "file_path": file_data['path'],
-                    "full_path": file_data['full_path'],
-                    "file_extension": file_data['extension'],
-                    "file_index": file_idx,
-                    "source": source_name,
-                    "source_type": "repository",
-                    "lines": file_data['lines']
-                }
+            embeddings = self.create_embeddings_batch(batch_texts)
+            collection.add(
+                documents=batch_texts,
+                embeddings=embeddings,
+                metadatas=batch_metadatas,
+                ids=batch_ids
             )
+            # remove_source_chunks() cleared this source before the first batch
+            self.lexical_index.add(batch_ids, batch_texts, batch_metadatas, fresh=True)
+            total_chunks += len(batch_texts)
+            print(f"  ✓ Embedded and stored {total_chunks} chunks ({total_files} files so far)")
+            batch_texts.clear()
+            batch_metadatas.clear()
+            batch_ids.clear()
+        
+        # Files are read and chunked in parallel; chunks stream into batched embedding
+        for file_info, result in self.ingest_files(scanner, files, source_name, key):
+            if "skipped" in result:
+                counts = skipped.setdefault(result["skipped"], [0, 0])
+                counts[0] += 1
+                counts[1] += file_info['size']
+                print(f"  ⏭️  {file_info['path']} ({result['skipped']}, {file_info['size']:,} bytes)")
+                continue
+            
+            lines, chunks = result["lines"], result["chunks"]
+            file_idx = total_files
+            total_files += 1
+            total_lines += lines
+            print(f"  ✓ {file_info['path']} ({lines} lines, {len(chunks)} chunks)")
             
-            # Add chunks to collection
             for chunk_idx, chunk in enumerate(chunks):
                 chunk_id = f"{source_name}_file_{file_idx}_chunk_{chunk_idx}"
+                chunk["metadata"]["file_index"] = file_idx
+                total_tokens += chunk["metadata"]["chunk_tokens"]
+                batch_texts.append(chunk["text"])
+                batch_metadatas.append(chunk["metadata"])
+                batch_ids.append(chunk_id)
                 
-                all_chunks.append(chunk["text"])
-                all_metadatas.append(chunk["metadata"])
-                all_ids.append(chunk_id)
-        
-        print(f"\n📊 Created {len(all_chunks)} total chunks")
-        print(f"🚀 Creating embeddings in batches (much faster!)...")
-        
-        # Create embeddings in batches
-        all_embeddings = []
-        batch_size = 50  # OpenAI allows up to 2048, but 50 is safe and fast
-        
-        for i in range(0, len(all_chunks), batch_size):
-            batch_texts = all_chunks[i:i + batch_size]
-            
-            # Create embeddings for this batch
-            batch_embeddings = self.create_embeddings_batch(batch_texts)
-            all_embeddings.extend(batch_embeddings)
-            
-            print(f"  ✓ Embedded {len(all_embeddings)}/{len(all_chunks)} chunks ({(len(all_embeddings)/len(all_chunks)*100):.1f}%)")
-        
-        # Store in ChromaDB
-        print(f"\n💾 Storing {len(all_chunks)} chunks in ChromaDB...")
-        
-        # Add in batches (ChromaDB has limits)
-        batch_size = 100
-        for i in range(0, len(all_chunks), batch_size):
-            end_idx = min(i + batch_size, len(all_chunks))
-            
-            self.collection.add(
-                documents=all_chunks[i:end_idx],
-                embeddings=all_embeddings[i:end_idx],
-                metadatas=all_metadatas[i:end_idx],
-                ids=all_ids[i:end_idx]
-            )
+                # A definition split across chunks maps to all of them
+                for definition in chunk.get("definitions", []):
+                    symbol = symbols.setdefault((file_info['path'], definition["symbol"]), {
+                        "name": definition["symbol"],
+                        "kind": definition["kind"],
+                        "file_path": file_info['path'],
+                        "full_path": file_info['full_path'],
+                        "start_line": definition["start_line"],
+                        "end_line": definition["end_line"],
+                        "chunk_ids": []
+                    })
+                    symbol["start_line"] = min(symbol["start_line"], definition["start_line"])
+                    symbol["end_line"] = max(symbol["end_line"], definition["end_line"])
+                    if chunk_id not in symbol["chunk_ids"]:
+                        symbol["chunk_ids"].append(chunk_id)
             
-            print(f"  ✓ Stored batch {i//batch_size + 1}/{(len(all_chunks) + batch_size - 1)//batch_size}")
+            if len(batch_texts) >= batch_size:
+                flush_batch()
+        flush_batch()
+        
+        stats = scanner.stats
+        print(f"\n📊 Found {total_files} text files")
+        print(f"   Scanned with {'git ls-files' if stats['method'] == 'git' else 'directory walk'}; "
+              f"skipped {stats['binary']} binary and {stats['too_large']} files over "
+              f"{scanner.max_file_bytes:,} bytes")
+        for category, (count, size) in sorted(skipped.items()):
+            print(f"   Skipped {count} {category} files ({size:,} bytes)")
+        if skipped:
+            print(f"   (use --keep CATEGORY or --keep GLOB to index them anyway)")
+        print(f"📊 Total lines: {total_lines:,}")
         
-        print(f"\n✅ Successfully indexed {len(all_chunks)} chunks from {total_files} files!")
+        if not total_files:
+            raise ValueError("No files found to index")
         
-        # Update metadata file
-        metadata_file = Path(__file__).parent.parent / "data" / "chunks" / "metadata.json"
-        metadata_file.parent.mkdir(parents=True, exist_ok=True)
+        print(f"\n✅ Successfully indexed {total_chunks} chunks from {total_files} files!")
         
-        # Load existing metadata or create new
-        if metadata_file.exists():
-            with open(metadata_file, 'r') as f:
-                all_metadata = json.load(f)
-        else:
-            all_metadata = {"sources": []}
+        # Exact-match lookups for identifier queries
+        symbol_index = SymbolIndex()
+        try:
+            symbol_count = symbol_index.replace_source(key, symbols.values())
+        finally:
+            symbol_index.close()
+        print(f"🔣 Indexed {symbol_count:,} symbols for exact lookups")
         
-        # Update or add this source
+        # Record the source in the catalog (replacing a previous index of it)
         source_meta = {
             "name": source_name,
             "type": "repository",
             "total_files": total_files,
-            "total_chunks": len(all_chunks),
+            "total_chunks": total_chunks,
             "total_lines": total_lines,
             "repo_path": repo_path,
             "file_extensions": file_extensions,
-            "indexed_at": None,  # Will be set by API
+            "skipped_files": {category: {"files": count, "bytes": size}
+                              for category, (count, size) in skipped.items()},
+            "indexed_at": utc_now(),
+            "source_id": key,
+            "collection": self.storage.write_collection_name(key),
             "embedding_model": self.embedding_model,
             "chunk_size": self.chunk_size,
             "chunk_overlap": self.chunk_overlap
         }
         
-        # Find and update or append
-        found = False
-        for i, src in enumerate(all_metadata.get("sources", [])):
-            if src.get("name") == source_name:
-                all_metadata["sources"][i] = source_meta
-                found = True
-                break
-        
-        if not found:
-            if "sources" not in all_metadata:
-                all_metadata["sources"] = []
-            all_metadata["sources"].append(source_meta)
+        catalog = Catalog()
+        try:
+            catalog.upsert_source(source_meta)
+        finally:
+            catalog.close()
         
-        with open(metadata_file, 'w') as f:
-            json.dump(all_metadata, f, indent=2)
+        print(f"📊 Metadata saved to {catalog.path}")
         
-        print(f"📊 Metadata saved to {metadata_file}")
+        if exact_enabled():
+            # SEARCH_BACKEND=numpy answers from its own copy of the embeddings
+            ExactIndex().sync_source(self.storage, key)
+            print("🧮 Exact search matrix updated")
         
         # Show cost estimate
-        total_tokens = sum(m['chunk_tokens'] for m in all_metadatas)
         cost_estimate = (total_tokens / 1000) * 0.00002  # $0.00002 per 1K tokens
         print(f"\n💰 Estimated cost: ${cost_estimate:.4f}")
         
         return {
             "totalFiles": total_files,
-            "chunksCreated": len(all_chunks),
+            "chunksCreated": total_chunks,
             "totalLines": total_lines,
             "estimatedCost": cost_estimate
         }
@@ -350,6 +407,13 @@ def main():
     parser.add_argument('source_name', help='Source name for this repository')
     parser.add_argument('-e', '--extensions', default=None,
                        help='Comma-separated file extensions (default: all text files)')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                       help='Threads reading and chunking files (default: REPO_INDEX_WORKERS or CPU count, max 8)')
+    parser.add_argument('-k', '--keep', action='append', default=[],
+                       help='Index files the classifier would skip: a category (lockfile, minified, '
+                            'generated, snapshot, high-entropy) or a path glob. Repeatable')
+    parser.add_argument('--max-file-bytes', type=int, default=None,
+                       help='Skip files larger than this many bytes (default: REPO_MAX_FILE_BYTES or 1000000)')
     
     args = parser.parse_args()
     
@@ -358,7 +422,7 @@ def main():
     if args.extensions:
         extensions = [ext.strip() for ext in args.extensions.split(',')]
     
-    indexer = RepoIndexer()
+    indexer = RepoIndexer(max_file_bytes=args.max_file_bytes, workers=args.workers, keep=args.keep)
     result = indexer.index_repository(
         repo_path=args.repo_path,
         source_name=args.source_name,
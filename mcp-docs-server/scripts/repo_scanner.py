@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Repository scanner
+Lists the files of a repository worth indexing without walking into ignored
+directories: uses `git ls-files` when the path is inside a git work tree and
+otherwise an os.scandir walk that prunes ignored directories and honours
+.gitignore files. Oversized files are skipped by size and binaries by
+sniffing their first bytes, so neither is read in full.
+"""
+import fnmatch
+import os
+import stat
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# Directories never indexed (in addition to any dot-directory)
+IGNORED_DIRS = {
+    'node_modules', '.git', '__pycache__', 'venv', 'env',
+    'dist', 'build', '.next', '.vscode', '.idea', 'coverage',
+    '.pytest_cache', '.mypy_cache', 'vendor', 'target'
+}
+
+SNIFF_BYTES = 8192
+DEFAULT_MAX_FILE_BYTES = 1_000_000
+
+
+def is_ignored_name(name: str) -> bool:
+    return name in IGNORED_DIRS or name.startswith('.')
+
+
+class GitIgnoreRules:
+    """The rules of the .gitignore files found on the way down a directory walk"""
+
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+
+    def extended(self, directory: Path, rel_dir: str) -> "GitIgnoreRules":
+        """Rules for a directory: the parent's plus those of its own .gitignore"""
+        gitignore = directory / '.gitignore'
+        if not gitignore.is_file():
+            return self
+        rules = list(self.rules)
+        try:
+            lines = gitignore.read_text(encoding='utf-8', errors='replace').splitlines()
+        except OSError:
+            return self
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            # A slash anywhere but the end anchors the pattern to this directory
+            anchored = '/' in line
+            line = line.lstrip('/')
+            if line.startswith('**/'):
+                line, anchored = line[3:], '/' in line[3:]
+            if line:
+                rules.append((rel_dir, line, negate, dir_only, anchored))
+        return GitIgnoreRules(rules)
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        """Whether a path relative to the repository root is ignored (last matching rule wins)"""
+        name = rel_path.rsplit('/', 1)[-1]
+        result = False
+        for base, pattern, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base and not rel_path.startswith(base + '/'):
+                continue
+            if anchored:
+                matched = fnmatch.fnmatchcase(rel_path[len(base) + 1:] if base else rel_path, pattern)
+            else:
+                matched = fnmatch.fnmatchcase(name, pattern)
+            if matched:
+                result = not negate
+        return result
+
+
+class RepoScanner:
+    def __init__(self, repo_root: Path, file_extensions: List[str] = None, max_file_bytes: int = None):
+        """
+        Args:
+            repo_root: Repository directory
+            file_extensions: Only list files with these suffixes (default: all)
+            max_file_bytes: Skip larger files (REPO_MAX_FILE_BYTES, default 1 MB)
+        """
+        self.repo_root = Path(repo_root).resolve()
+        self.file_extensions = set(file_extensions or [])
+        self.max_file_bytes = int(max_file_bytes or os.getenv("REPO_MAX_FILE_BYTES", DEFAULT_MAX_FILE_BYTES))
+        self.stats = {"method": None, "too_large": 0, "binary": 0, "unreadable": 0}
+
+    def _git_paths(self) -> Optional[List[str]]:
+        """Tracked and untracked-but-not-ignored files, or None outside a git work tree"""
+        try:
+            output = subprocess.run(
+                ['git', '-C', str(self.repo_root), 'ls-files', '-co', '--exclude-standard', '-z'],
+                capture_output=True, check=True, timeout=120
+            ).stdout
+        except (OSError, subprocess.SubprocessError):
+            return None
+        return sorted(p for p in output.decode('utf-8', errors='surrogateescape').split('\0') if p)
+
+    def _walk_paths(self) -> Iterator[str]:
+        """os.scandir walk that never descends into ignored directories"""
+        stack = [(self.repo_root, '', GitIgnoreRules().extended(self.repo_root, ''))]
+        while stack:
+            directory, rel_dir, rules = stack.pop()
+            try:
+                entries = sorted(os.scandir(directory), key=lambda e: e.name)
+            except OSError:
+                continue
+            for entry in entries:
+                if is_ignored_name(entry.name):
+                    continue
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                if rules.ignored(rel_path, is_dir):
+                    continue
+                if is_dir:
+                    if not entry.is_symlink():
+                        child = Path(entry.path)
+                        stack.append((child, rel_path, rules.extended(child, rel_path)))
+                else:
+                    yield rel_path
+
+    def files(self) -> Iterator[Dict]:
+        """Yield {path, full_path, size, extension} for every candidate file"""
+        paths = self._git_paths()
+        self.stats["method"] = "git" if paths is not None else "walk"
+        if paths is None:
+            paths = self._walk_paths()
+
+        for rel_path in paths:
+            parts = rel_path.split('/')
+            if any(is_ignored_name(part) for part in parts):
+                continue
+            suffix = os.path.splitext(parts[-1])[1]
+            if self.file_extensions and suffix not in self.file_extensions:
+                continue
+
+            full_path = self.repo_root / rel_path
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                # Deleted but still tracked, or a broken symlink
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            if st.st_size > self.max_file_bytes:
+                self.stats["too_large"] += 1
+                continue
+
+            yield {
+                "path": rel_path,
+                "full_path": str(full_path),
+                "size": st.st_size,
+                "extension": suffix
+            }
+
+    def read_text(self, file_info: Dict) -> Optional[str]:
+        """File content as text, or None for binary or unreadable files"""
+        try:
+            with open(file_info["full_path"], 'rb') as f:
+                head = f.read(SNIFF_BYTES)
+                if b'\0' in head:
+                    self.stats["binary"] += 1
+                    return None
+                data = head + f.read()
+        except OSError:
+            self.stats["unreadable"] += 1
+            return None
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError:
+            self.stats["binary"] += 1
+            return None
+        # Same newlines as reading in text mode
+        return text.replace('\r\n', '\n').replace('\r', '\n')
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Shared retrieval for search.py and the MCP server
+Answers identifier queries from the symbol index and everything else with a
+hybrid search - BM25 over the lexical index fused with vector search by
+reciprocal rank fusion - returning results in one shape for both callers.
+Chunks are read through a storage.QueryRouter, so searches only touch the
+collections of the requested sources and never return deleted (tombstoned) ones.
+"""
+import os
+from typing import Dict, List, Optional, Union
+
+from symbol_index import DEFAULT_SYMBOL_INDEX_PATH, SymbolIndex, extract_identifier
+from lexical_index import DEFAULT_LEXICAL_INDEX_PATH, LexicalIndex
+from catalog import Catalog
+
+SEARCH_MODES = ("hybrid", "vector", "keyword")
+
+# Reciprocal rank fusion constant (score = sum of 1 / (k + rank))
+RRF_K = int(os.getenv("RRF_K", 60))
+
+# Each side of a hybrid search contributes this many times max_results candidates
+HYBRID_CANDIDATES = 4
+
+
+_catalog = None
+
+
+def source_ids(source_filter: Union[str, List[str], None]) -> List[str]:
+    """Catalog keys (source_id) for a source name or list of names"""
+    global _catalog
+    if not source_filter:
+        return []
+    names = [source_filter] if isinstance(source_filter, str) else source_filter
+    if _catalog is None:
+        _catalog = Catalog()
+    return _catalog.source_ids_for([name for name in names if name])
+
+
+def source_where(ids: List[str]) -> Optional[Dict]:
+    """Where clause for a list of source_ids (every chunk carries source_id)"""
+    if not ids:
+        return None
+    if len(ids) == 1:
+        return {"source_id": ids[0]}
+    return {"source_id": {"$in": ids}}
+
+
+def symbol_search(router, query: str, max_results: int,
+                  source_filter: Union[str, List[str], None] = None) -> Optional[Dict]:
+    """
+    Exact definitions for identifier-like queries, or None to fall back to vector search
+
+    Returns:
+        {"documents", "metadatas"} for the chunks holding the matching definitions;
+        each metadata dict also carries matched_symbol, symbol_start_line and symbol_end_line
+    """
+    identifier = extract_identifier(query)
+    if not identifier or not DEFAULT_SYMBOL_INDEX_PATH.exists():
+        return None
+
+    index = SymbolIndex()
+    try:
+        hits = index.lookup(identifier, sources=source_ids(source_filter) or None, limit=max_results)
+    finally:
+        index.close()
+    if not hits:
+        return None
+
+    # One result per chunk, in the order of the best-ranked definition it holds
+    chunk_hits = {}
+    for hit in hits:
+        for chunk_id in hit["chunk_ids"]:
+            chunk_hits.setdefault(chunk_id, hit)
+    chunk_ids = list(chunk_hits)[:max_results]
+
+    found = router.get(chunk_ids, source_ids=source_ids(source_filter) or None)
+    by_id = {chunk_id: (doc, meta) for chunk_id, doc, meta in
+             zip(found["ids"], found["documents"], found["metadatas"])}
+
+    documents, metadatas = [], []
+    for chunk_id in chunk_ids:
+        if chunk_id not in by_id:
+            # Chunk removed since the symbol index was written
+            continue
+        doc, meta = by_id[chunk_id]
+        hit = chunk_hits[chunk_id]
+        documents.append(doc)
+        metadatas.append({
+            **meta,
+            "matched_symbol": hit["name"],
+            "symbol_start_line": hit["start_line"],
+            "symbol_end_line": hit["end_line"]
+        })
+    if not documents:
+        return None
+    return {"documents": documents, "metadatas": metadatas}
+
+
+def vector_search(router, openai_client, query: str, max_results: int,
+                  source_filter: Union[str, List[str], None] = None, embedding_model: str = None) -> Dict:
+    """Semantic search: embed the query and query the routed collections"""
+    response = openai_client.embeddings.create(
+        model=embedding_model or os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+        input=query
+    )
+    return router.query(response.data[0].embedding, max_results, source_ids(source_filter) or None)
+
+
+def lexical_ids(query: str, limit: int, source_filter: Union[str, List[str], None] = None,
+                excluded: frozenset = frozenset()) -> List[str]:
+    """Chunk ids ranked by BM25, skipping the excluded (tombstoned) source_ids"""
+    if not DEFAULT_LEXICAL_INDEX_PATH.exists():
+        return []
+    ids = source_ids(source_filter)
+    where = source_where(ids)
+    if excluded:
+        ids = [key for key in ids if key not in excluded]
+        if source_filter and not ids:
+            # Every requested source has been deleted
+            return []
+        where = source_where(ids) if ids else {"source_id": {"$nin": sorted(excluded)}}
+    index = LexicalIndex()
+    try:
+        return [chunk_id for chunk_id, _ in index.search(query, limit=limit, where=where)]
+    finally:
+        index.close()
+
+
+def keyword_search(router, query: str, max_results: int,
+                   source_filter: Union[str, List[str], None] = None) -> Dict:
+    """BM25 search over the lexical index - no embedding call"""
+    return fetch_chunks(router, lexical_ids(query, max_results, source_filter, router.tombstoned_sources()),
+                        source_filter)
+
+
+def fetch_chunks(router, chunk_ids: List[str], source_filter: Union[str, List[str], None] = None) -> Dict:
+    """Documents and metadatas of chunks by id, in the given order (missing ids dropped)"""
+    if not chunk_ids:
+        return {"ids": [], "documents": [], "metadatas": []}
+    found = router.get(chunk_ids, source_ids=source_ids(source_filter) or None)
+    by_id = {chunk_id: (doc, meta) for chunk_id, doc, meta in
+             zip(found["ids"], found["documents"], found["metadatas"])}
+    ids = [chunk_id for chunk_id in chunk_ids if chunk_id in by_id]
+    return {
+        "ids": ids,
+        "documents": [by_id[chunk_id][0] for chunk_id in ids],
+        "metadatas": [by_id[chunk_id][1] for chunk_id in ids]
+    }
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[str]:
+    """Merge ranked id lists: each id scores sum(1 / (k + rank)) over the lists it appears in"""
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda chunk_id: -scores[chunk_id])
+
+
+def hybrid_search(router, openai_client, query: str, max_results: int,
+                  source_filter: Union[str, List[str], None] = None, embedding_model: str = None) -> Dict:
+    """Vector and BM25 candidates fused by reciprocal rank"""
+    candidates = max_results * HYBRID_CANDIDATES
+    vector = vector_search(router, openai_client, query, candidates, source_filter, embedding_model)
+
+    keyword_ids = lexical_ids(query, candidates, source_filter, router.tombstoned_sources())
+    if not keyword_ids:
+        return {key: vector[key][:max_results] for key in ("documents", "metadatas")}
+
+    fused = reciprocal_rank_fusion([vector["ids"], keyword_ids])[:max_results]
+
+    # Chunks only the lexical side found still need their text and metadata
+    known = {chunk_id: (doc, meta) for chunk_id, doc, meta in
+             zip(vector["ids"], vector["documents"], vector["metadatas"])}
+    fetched = fetch_chunks(router, [chunk_id for chunk_id in fused if chunk_id not in known], source_filter)
+    known.update({chunk_id: (doc, meta) for chunk_id, doc, meta in
+                  zip(fetched["ids"], fetched["documents"], fetched["metadatas"])})
+
+    ids = [chunk_id for chunk_id in fused if chunk_id in known]
+    return {
+        "documents": [known[chunk_id][0] for chunk_id in ids],
+        "metadatas": [known[chunk_id][1] for chunk_id in ids]
+    }
+
+
+def search(router, openai_client, query: str, max_results: int = 5,
+           source_filter: Union[str, List[str], None] = None, embedding_model: str = None,
+           mode: str = None) -> Dict:
+    """
+    Search the index
+
+    Args:
+        router: storage.QueryRouter over the chunk collections
+        source_filter: A source name or a list of names to search within
+        mode: "hybrid" (BM25 + vector, the default), "vector", or "keyword" (BM25 only,
+              no embedding call). SEARCH_MODE sets the default.
+
+    Returns:
+        {"match": "symbol" | "hybrid" | "semantic" | "keyword", "documents": [...], "metadatas": [...]}
+    """
+    mode = mode or os.getenv("SEARCH_MODE", "hybrid")
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode} (expected one of {', '.join(SEARCH_MODES)})")
+
+    if mode != "vector":
+        results = symbol_search(router, query, max_results, source_filter)
+        if results:
+            return {"match": "symbol", **results}
+
+    if mode == "keyword":
+        results = keyword_search(router, query, max_results, source_filter)
+        return {"match": "keyword", "documents": results["documents"], "metadatas": results["metadatas"]}
+    if mode == "hybrid":
+        return {"match": "hybrid", **hybrid_search(router, openai_client, query, max_results, source_filter,
+                                                   embedding_model)}
+    results = vector_search(router, openai_client, query, max_results, source_filter, embedding_model)
+    return {"match": "semantic", "documents": results["documents"], "metadatas": results["metadatas"]}
@@ -3,6 +3,7 @@
 Standalone search script for MCP documentation
 Called by Next.js API endpoint
 """
+import argparse
 import os
 import sys
 import json
@@ -12,89 +13,47 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from dotenv import load_dotenv
-import chromadb
-from chromadb.config import Settings
 from openai import OpenAI
 
+from retrieval import SEARCH_MODES, search
+from sharding import open_router
+
 # Load environment
 load_dotenv()
 
-def search_docs(query: str, max_results: int = 5, source_filter: str = None):
+def search_docs(query: str, max_results: int = 5, source_filter: str = None, mode: str = None):
     """
-    Search documentation using semantic search
+    Search documentation using hybrid keyword + semantic search (exact symbol lookup for identifier queries)
     
     Args:
         query: Search query
         max_results: Maximum number of results
-        source_filter: Optional source name to filter results
+        source_filter: Optional source name (or list of names) to filter results
+        mode: hybrid (default), vector, or keyword (no embedding call)
         
     Returns:
         JSON string with search results
     """
     try:
         # Initialize clients
-        db_path = Path(__file__).parent.parent / "data" / "chroma_db"
         openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        chroma_client = chromadb.PersistentClient(
-            path=str(db_path),
-            settings=Settings(anonymized_telemetry=False)
-        )
-        
-        # Get collection
-        collection = chroma_client.get_collection(name="documentation")
         
-        # Load metadata to determine filter field
-        metadata_path = Path(__file__).parent.parent / "data" / "chunks" / "metadata.json"
-        metadata = {}
-        if metadata_path.exists():
-            with open(metadata_path, 'r') as f:
-                metadata = json.load(f)
+        # Routes the query to the requested sources' collections (or shard servers, if configured)
+        router = open_router()
         
-        # Generate embedding for query
-        embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
-        response = openai_client.embeddings.create(
-            model=embedding_model,
-            input=query
+        # Identifier queries are answered from the symbol index, the rest by keyword and/or vector search
+        results = search(
+            router, openai_client, query,
+            max_results=max_results,
+            source_filter=source_filter,
+            embedding_model=os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+            mode=mode
         )
-        query_embedding = response.data[0].embedding
-        
-        # Search with optional source filter
-        search_params = {
-            "query_embeddings": [query_embedding],
-            "n_results": max_results
-        }
-        
-        # Add source filter if specified
-        if source_filter:
-            # Determine which field to use for filtering
-            # Documentation sources use "source_name", repositories use "source"
-            filter_field = None
-            
-            # Check metadata to see if this is a documentation source
-            for src in metadata.get("sources", []):
-                if src.get("name") == source_filter:
-                    # It's a documentation source, use source_name
-                    if src.get("type") == "documentation":
-                        filter_field = "source_name"
-                    else:
-                        # It's a repository, use source
-                        filter_field = "source"
-                    break
-            
-            # If not found in metadata, try source_name first (for documentation)
-            # then fall back to source (for repositories or URLs)
-            if filter_field is None:
-                # Default to source_name for documentation sources
-                filter_field = "source_name"
-            
-            search_params["where"] = {filter_field: source_filter}
-        
-        results = collection.query(**search_params)
         
         # Format results
         formatted_results = []
-        if results['documents'][0]:
-            for doc, metadata in zip(results['documents'][0], results['metadatas'][0]):
+        if results['documents']:
+            for doc, metadata in zip(results['documents'], results['metadatas']):
                 # Check if this is a repository or documentation chunk
                 is_repository = metadata.get('source_type') == 'repository'
                 
@@ -108,10 +67,14 @@ def search_docs(query: str, max_results: int = 5, source_filter: str = None):
                             'wordCount': len(doc.split()),
                             'source': metadata.get('source', ''),
                             'source_name': metadata.get('source', ''),
+                            'source_id': metadata.get('source_id', ''),
                             'source_type': 'repository',
                             'file_path': metadata.get('file_path', ''),
                             'full_path': metadata.get('full_path', ''),
-                            'lines': metadata.get('lines', '')
+                            'lines': metadata.get('lines', ''),
+                            'symbol': metadata.get('matched_symbol', metadata.get('symbol', '')),
+                            'start_line': metadata.get('symbol_start_line', metadata.get('start_line')),
+                            'end_line': metadata.get('symbol_end_line', metadata.get('end_line'))
                         }
                     })
                 else:
@@ -124,6 +87,7 @@ def search_docs(query: str, max_results: int = 5, source_filter: str = None):
                             'wordCount': len(doc.split()),
                             'source': metadata.get('source', ''),
                             'source_name': metadata.get('source_name', metadata.get('source', '').replace("https://", "").replace("http://", "").split("/")[0]),
+                            'source_id': metadata.get('source_id', ''),
                             'source_type': 'documentation'
                         }
                     })
@@ -132,9 +96,14 @@ def search_docs(query: str, max_results: int = 5, source_filter: str = None):
         output = {
             'success': True,
             'query': query,
+            'match': results['match'],
             'results': formatted_results,
             'totalResults': len(formatted_results)
         }
+        failed_shards = router.take_failures()
+        if failed_shards:
+            # Partial results: some shards failed or timed out
+            output['failedShards'] = failed_shards
         
         print(json.dumps(output))
         return 0
@@ -149,16 +118,16 @@ def search_docs(query: str, max_results: int = 5, source_filter: str = None):
         return 1
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(json.dumps({
-            'success': False,
-            'error': 'Usage: search.py <query> [max_results] [source_filter]'
-        }))
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Search the documentation index")
+    parser.add_argument("query", help="Search query")
+    parser.add_argument("max_results", nargs="?", type=int, default=5, help="Maximum number of results")
+    parser.add_argument("source_filter", nargs="?", default=None, help="Only search this source")
+    parser.add_argument("-s", "--source", action="append", default=[], dest="sources",
+                        help="Only search these sources (repeatable)")
+    parser.add_argument("--mode", choices=SEARCH_MODES, default=None,
+                        help="hybrid: keyword + vector (default), vector: embeddings only, "
+                             "keyword: BM25 only, no embedding call")
+    args = parser.parse_args()
     
-    query = sys.argv[1]
-    max_results = int(sys.argv[2]) if len(sys.argv) > 2 else 5
-    source_filter = sys.argv[3] if len(sys.argv) > 3 else None
-    
-    sys.exit(search_docs(query, max_results, source_filter))
-
+    sources = ([args.source_filter] if args.source_filter else []) + args.sources
+    sys.exit(search_docs(args.query, args.max_results, sources or None, args.mode))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Search-first access to the shared Chroma store
+Indexers, delete/purge scripts and the MCP server all open data/chroma_db in
+separate processes. Searches record their latency in data/search_pressure.json;
+indexing writes go through a WriteThrottle that splits batches and backs off
+while searches are running slower than SEARCH_LATENCY_TARGET_MS, so a bulk
+load yields to queries instead of holding the write lock under them. Reads
+retry briefly on lock errors instead of failing the search.
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+SEARCH_PRESSURE_PATH = Path(__file__).parent.parent / "data" / "search_pressure.json"
+
+# Searches slower than this (moving average) make writers back off
+LATENCY_TARGET_MS = float(os.getenv("SEARCH_LATENCY_TARGET_MS", 250))
+# Searches older than this no longer count as activity
+ACTIVE_WINDOW_SECONDS = 2.0
+# Longest pause between write batches while searches are struggling
+MAX_WRITE_PAUSE_SECONDS = float(os.getenv("WRITE_MAX_PAUSE_MS", 2000)) / 1000
+# Write batch size range (rows per Chroma call)
+MAX_WRITE_BATCH = 100
+MIN_WRITE_BATCH = 10
+
+READ_RETRIES = 5
+
+# Per-process moving average of search latency, and when it was last published
+_latency = None
+_published_at = 0.0
+
+
+def record_search(seconds: float):
+    """Publish a search's latency for writers in other processes (at most every 100 ms)"""
+    global _latency, _published_at
+    _latency = seconds if _latency is None else 0.3 * seconds + 0.7 * _latency
+    now = time.time()
+    if now - _published_at < 0.1:
+        return
+    _published_at = now
+    try:
+        SEARCH_PRESSURE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = SEARCH_PRESSURE_PATH.with_name(f".{SEARCH_PRESSURE_PATH.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({"at": now, "latency_ms": _latency * 1000, "pid": os.getpid()}, f)
+        os.replace(tmp_path, SEARCH_PRESSURE_PATH)
+    except OSError:
+        # Signalling is best effort - never fail a search over it
+        pass
+
+
+def search_pressure() -> Optional[float]:
+    """Recent search latency in ms, or None if nobody has searched lately"""
+    try:
+        with open(SEARCH_PRESSURE_PATH) as f:
+            pressure = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - pressure.get("at", 0) > ACTIVE_WINDOW_SECONDS:
+        return None
+    return pressure.get("latency_ms")
+
+
+class WriteThrottle:
+    """Adaptive pacing for bulk writes: shrink batches and pause while searches are slow, grow back when not"""
+
+    def __init__(self):
+        self.batch_size = MAX_WRITE_BATCH
+        self.pause = 0.0
+
+    def wait(self):
+        """Call before each write; sleeps as long as searches currently need"""
+        latency = search_pressure()
+        if latency is not None and latency > LATENCY_TARGET_MS:
+            self.pause = min(MAX_WRITE_PAUSE_SECONDS, max(0.05, self.pause * 2))
+            self.batch_size = max(MIN_WRITE_BATCH, self.batch_size // 2)
+        else:
+            self.pause = self.pause / 2 if self.pause > 0.01 else 0.0
+            self.batch_size = min(MAX_WRITE_BATCH, self.batch_size * 2)
+        if self.pause:
+            time.sleep(self.pause)
+
+    def run(self, write: Callable, ids: List[str], **columns):
+        """Apply a Chroma write (add/upsert/delete) in throttled slices"""
+        start = 0
+        while start < len(ids):
+            self.wait()
+            end = start + self.batch_size
+            write(ids=ids[start:end], **{key: value[start:end] for key, value in columns.items()
+                                         if value is not None})
+            start = end
+
+
+class ThrottledCollection:
+    """Chroma collection whose writes go through a WriteThrottle (everything else passes through)"""
+
+    def __init__(self, collection, throttle: WriteThrottle):
+        self.collection = collection
+        self.throttle = throttle
+
+    def add(self, ids, **columns):
+        self.throttle.run(self.collection.add, list(ids), **columns)
+
+    def upsert(self, ids, **columns):
+        self.throttle.run(self.collection.upsert, list(ids), **columns)
+
+    def delete(self, ids=None, where=None):
+        if ids is None:
+            self.throttle.wait()
+            self.collection.delete(where=where)
+        else:
+            self.throttle.run(self.collection.delete, list(ids))
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def is_lock_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def retry_read(call: Callable, *args):
+    """Run a read, retrying with backoff while a writer holds the lock"""
+    for attempt in range(READ_RETRIES):
+        try:
+            return call(*args)
+        except Exception as e:
+            if not is_lock_error(e) or attempt == READ_RETRIES - 1:
+                raise
+            time.sleep(0.02 * 2 ** attempt)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Shard server for scatter-gather search
+Serves nearest-neighbour queries over one Chroma store so a coordinator
+(sharding.py) can fan searches out across several machines or processes.
+Keyword and symbol lookups stay on the coordinator; shards only hold vectors.
+
+Index a shard by pointing the indexers at its store, then start it:
+    CHROMA_DB_PATH=data/shards/a python scripts/repo_indexer.py ...
+    python scripts/shard_server.py --db-path data/shards/a --port 8701
+
+Endpoints (JSON over HTTP):
+    POST /query  {"embedding": [...], "n_results": 5, "source_ids": [...]}
+    POST /get    {"ids": [...], "source_ids": [...]}
+    GET  /health
+"""
+import argparse
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from storage import Storage, open_client
+
+
+def make_handler(router, shard_name: str):
+    class ShardHandler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path != "/health":
+                self._send(404, {"error": f"Unknown path: {self.path}"})
+                return
+            collections = router.targets()
+            self._send(200, {
+                "shard": shard_name,
+                "collections": len(collections),
+                "chunks": sum(collection.count() for collection, _ in collections)
+            })
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/query":
+                    result = router.query(request["embedding"], int(request.get("n_results", 5)),
+                                          request.get("source_ids"))
+                elif self.path == "/get":
+                    result = router.get(request["ids"], source_ids=request.get("source_ids"))
+                else:
+                    self._send(404, {"error": f"Unknown path: {self.path}"})
+                    return
+                self._send(200, result)
+            except (KeyError, ValueError) as e:
+                self._send(400, {"error": f"Bad request: {e}"})
+            except Exception as e:
+                self._send(500, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            # Keep stdout quiet; access logs go to stderr like the MCP server's
+            print(f"[{shard_name}] {format % args}", file=sys.stderr)
+
+    return ShardHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve one search shard over HTTP")
+    parser.add_argument("--db-path", help="Chroma store of this shard (default: CHROMA_DB_PATH or data/chroma_db)")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8701, help="Port to listen on (default: 8701)")
+    parser.add_argument("--name", help="Shard name used in logs (default: host:port)")
+    args = parser.parse_args()
+
+    name = args.name or f"{args.host}:{args.port}"
+    router = Storage(open_client(args.db_path)).router()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(router, name))
+    print(f"🧩 Shard {name} serving {len(router.targets())} collections on http://{args.host}:{args.port}")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
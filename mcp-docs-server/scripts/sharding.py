@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Scatter-gather search across shard servers
+When data/shards.json (or SHARDS_CONFIG) exists, searches send the query
+embedding to every shard server that may hold the requested sources, wait at
+most each shard's timeout, and merge the partial top-k lists by distance.
+Shards that fail or time out are skipped and reported, so a slow node costs
+recall on its sources rather than the whole query.
+
+shards.json:
+    {
+      "timeout_ms": 2000,
+      "shards": [
+        {"name": "docs", "url": "http://10.0.0.5:8701", "sources": ["moca-network", "solana"]},
+        {"name": "repos", "url": "http://10.0.0.6:8701", "sources": ["*"], "timeout_ms": 5000}
+      ]
+    }
+
+"sources" lists the source ids a shard owns; "*" marks a shard that is asked
+about every source (e.g. one of several holding hash-partitioned chunk ranges).
+"""
+import json
+import os
+import sys
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List
+
+from catalog import Catalog
+
+DEFAULT_SHARDS_CONFIG = Path(__file__).parent.parent / "data" / "shards.json"
+DEFAULT_TIMEOUT_MS = 2000
+# Unfiltered queries ask each shard for this many times n_results while sources
+# deleted on the coordinator are awaiting their purge (their hits are dropped here)
+TOMBSTONE_OVERFETCH = int(os.getenv("TOMBSTONE_OVERFETCH", 2))
+
+
+def shards_config_path() -> Path:
+    return Path(os.getenv("SHARDS_CONFIG") or DEFAULT_SHARDS_CONFIG)
+
+
+def load_shards(path=None) -> Dict:
+    """Shard configuration, or None when search is not sharded"""
+    path = Path(path or shards_config_path())
+    if not path.exists():
+        return None
+    with open(path) as f:
+        config = json.load(f)
+    for shard in config.get("shards", []):
+        if not shard.get("url"):
+            raise ValueError(f"Shard {shard.get('name', '?')} in {path} has no url")
+        shard.setdefault("name", shard["url"])
+        shard.setdefault("sources", ["*"])
+    return config
+
+
+class ShardCoordinator:
+    """Drop-in replacement for storage.QueryRouter that fans out over HTTP"""
+
+    def __init__(self, config: Dict):
+        self.shards = config.get("shards", [])
+        self.default_timeout_ms = config.get("timeout_ms", DEFAULT_TIMEOUT_MS)
+        # Shards that failed or timed out since the last take_failures()
+        self.failed_shards = []
+        self._catalog = None
+
+    def targets(self, source_ids: List[str] = None) -> List[Dict]:
+        """Shards that may hold any of the requested sources (all shards if None)"""
+        if not source_ids:
+            return list(self.shards)
+        wanted = set(source_ids)
+        return [shard for shard in self.shards
+                if "*" in shard["sources"] or wanted & set(shard["sources"])]
+
+    def tombstoned_sources(self) -> frozenset:
+        """
+        Sources deleted on the coordinator
+
+        Shards only know their own catalogs, so query() and get() drop these
+        sources' hits themselves; retrieval uses the set for keyword search.
+        """
+        if self._catalog is None:
+            self._catalog = Catalog()
+        return self._catalog.tombstoned_ids()
+
+    def _post(self, shard: Dict, path: str, payload: Dict) -> Dict:
+        timeout = shard.get("timeout_ms", self.default_timeout_ms) / 1000
+        request = urllib.request.Request(
+            shard["url"].rstrip('/') + path,
+            data=json.dumps(payload).encode('utf-8'),
+            headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+
+    def _scatter(self, path: str, payload: Dict, source_ids: List[str] = None) -> List[Dict]:
+        """Send a request to the target shards in parallel; returns the answers that arrived in time"""
+        shards = self.targets(source_ids)
+        if not shards:
+            return []
+
+        pool = ThreadPoolExecutor(max_workers=len(shards))
+        futures = {pool.submit(self._post, shard, path, payload): shard for shard in shards}
+        # Overall wait is bounded by the slowest shard's timeout
+        deadline = max(shard.get("timeout_ms", self.default_timeout_ms) for shard in shards) / 1000
+        done, not_done = wait(futures, timeout=deadline)
+        pool.shutdown(wait=False)
+
+        answers, failures = [], []
+        for future in done:
+            shard = futures[future]
+            try:
+                answers.append(future.result())
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                failures.append({"shard": shard["name"], "error": str(getattr(e, 'reason', e))})
+        for future in not_done:
+            failures.append({"shard": futures[future]["name"], "error": "timed out"})
+        for failure in failures:
+            print(f"⚠️  Shard {failure['shard']} skipped: {failure['error']}", file=sys.stderr)
+        self.failed_shards.extend(failures)
+        return answers
+
+    def take_failures(self) -> List[Dict]:
+        """Shards skipped since the last call (results based on them are partial)"""
+        failures, self.failed_shards = self.failed_shards, []
+        return failures
+
+    def _live_source_ids(self, source_ids: List[str], tombstoned: frozenset) -> List[str]:
+        """Requested sources minus the deleted ones ([] when every requested source was deleted)"""
+        return [key for key in source_ids if key not in tombstoned] if source_ids else source_ids
+
+    def query(self, query_embedding: List[float], n_results: int, source_ids: List[str] = None) -> Dict:
+        """Nearest chunks across the shards, merged by distance (same shape as QueryRouter.query)"""
+        tombstoned = self.tombstoned_sources()
+        live_ids = self._live_source_ids(source_ids, tombstoned)
+        answers = []
+        if live_ids or not source_ids:
+            # A filtered query only reaches live sources; an unfiltered one over-fetches
+            # to make up for the deleted sources' hits dropped below
+            fetch = n_results * TOMBSTONE_OVERFETCH if tombstoned and not live_ids else n_results
+            answers = self._scatter("/query", {
+                "embedding": query_embedding,
+                "n_results": fetch,
+                "source_ids": live_ids
+            }, live_ids)
+
+        hits = []
+        for answer in answers:
+            hits.extend(hit for hit in zip(answer["distances"], answer["ids"], answer["documents"], answer["metadatas"])
+                        if (hit[3] or {}).get("source_id") not in tombstoned)
+        hits.sort(key=lambda hit: hit[0])
+        hits = hits[:n_results]
+        return {
+            "ids": [hit[1] for hit in hits],
+            "documents": [hit[2] for hit in hits],
+            "metadatas": [hit[3] for hit in hits],
+            "distances": [hit[0] for hit in hits]
+        }
+
+    def get(self, ids: List[str], include: List[str] = ("documents", "metadatas"),
+            source_ids: List[str] = None) -> Dict:
+        """Chunks by id from whichever shard holds them (same shape as QueryRouter.get)"""
+        tombstoned = self.tombstoned_sources()
+        live_ids = self._live_source_ids(source_ids, tombstoned)
+        found = {"ids": [], "documents": [], "metadatas": []}
+        if source_ids and not live_ids:
+            return found
+        for answer in self._scatter("/get", {"ids": ids, "source_ids": live_ids}, live_ids):
+            for chunk in zip(answer["ids"], answer["documents"], answer["metadatas"]):
+                if (chunk[2] or {}).get("source_id") in tombstoned:
+                    continue
+                for key, value in zip(("ids", "documents", "metadatas"), chunk):
+                    found[key].append(value)
+        return found
+
+
+def open_router(storage=None):
+    """
+    Router for the search path: the shard coordinator if shards are configured, the
+    exact NumPy index with SEARCH_BACKEND=numpy, else the local Chroma collections
+    """
+    config = load_shards()
+    if config is not None:
+        return ShardCoordinator(config)
+    from exact_index import ExactRouter, exact_enabled
+    if exact_enabled():
+        return ExactRouter()
+    from storage import Storage
+    return (storage or Storage()).router()
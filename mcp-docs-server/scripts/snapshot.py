@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Index snapshots for fast cold start and replication
+export writes the live generation of the index to a versioned directory:
+
+    manifest.json      format version, counts, embedding model, dimensions
+    vectors.npy        float32 [chunks x dimensions], memory-mappable
+    chunks.jsonl.gz    one {"id", "document", "metadata", "layout"} per row, same order
+    catalog.json       sources and index settings
+    symbols.sqlite     symbol index (when there is one)
+
+import loads a snapshot into a fresh generation in bulk and swaps it in
+(blue/green, like a rebuild), rebuilding the keyword index from the chunk
+text. Nothing is re-embedded, so a new replica costs no API calls.
+
+    python scripts/snapshot.py export [--name NAME]
+    python scripts/snapshot.py import data/snapshots/NAME [--force]
+
+A snapshot embedded with a different model (or dimensions) than this node's
+EMBEDDING_MODEL is refused, since queries could not be compared against it;
+--force imports it anyway.
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import sys
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from dotenv import load_dotenv
+
+from catalog import Catalog, utc_now
+from exact_index import ExactIndex, exact_enabled
+from lexical_index import LexicalIndex
+from symbol_index import DEFAULT_SYMBOL_INDEX_PATH
+from storage import Storage, collection_generation, collection_names, open_client, shared_collection_name
+
+# Load environment
+load_dotenv()
+
+SNAPSHOTS_PATH = Path(__file__).parent.parent / "data" / "snapshots"
+SNAPSHOT_FORMAT = 1
+BATCH_SIZE = 1000
+
+# Output size of the embedding models this node may be configured with
+MODEL_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536
+}
+
+
+def live_collections(storage: Storage):
+    """(collection, layout, where) for every chunk collection of the live generation, minus deleted sources"""
+    generation = storage.generation
+    tombstoned = storage.tombstoned_sources()
+    for name in sorted(collection_names(storage.client)):
+        if collection_generation(name) != generation:
+            continue
+        collection = storage.client.get_collection(name=name)
+        if name == shared_collection_name(generation):
+            where = {"source_id": {"$nin": sorted(tombstoned)}} if tombstoned else None
+            yield collection, "single", where
+        else:
+            # Per-source collections carry the source_id on every chunk
+            sample = collection.get(limit=1, include=["metadatas"])
+            if sample['ids'] and sample['metadatas'][0].get("source_id") in tombstoned:
+                continue
+            yield collection, "per-source", None
+
+
+def export_snapshot(name: str = None) -> int:
+    storage = Storage()
+    catalog = Catalog()
+    try:
+        snapshot = catalog.snapshot()
+        name = name or f"snapshot-v{catalog.version()}-{utc_now()[:19].replace(':', '').replace('-', '')}"
+        target = SNAPSHOTS_PATH / name
+        if target.exists():
+            print(f"❌ Snapshot {target} already exists")
+            return 1
+        staging = target.with_name(f".{name}.partial")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+
+        # First pass: ids only, so the vector file can be sized exactly
+        collections = []
+        for collection, layout, where in live_collections(storage):
+            ids = collection.get(where=where, include=[])['ids'] if where else collection.get(include=[])['ids']
+            if ids:
+                collections.append((collection, layout, ids))
+        total = sum(len(ids) for _, _, ids in collections)
+        if not total:
+            print("❌ Nothing to export: the index is empty")
+            shutil.rmtree(staging)
+            return 1
+        print(f"📦 Exporting {total} chunks from {len(collections)} collections to {target}")
+
+        vectors = None
+        row = 0
+        with gzip.open(staging / "chunks.jsonl.gz", 'wt', encoding='utf-8') as chunks_file:
+            for collection, layout, ids in collections:
+                for i in range(0, len(ids), BATCH_SIZE):
+                    batch = collection.get(ids=ids[i:i + BATCH_SIZE],
+                                           include=["documents", "metadatas", "embeddings"])
+                    embeddings = np.asarray(batch['embeddings'], dtype=np.float32)
+                    if vectors is None:
+                        vectors = open_memmap(staging / "vectors.npy", mode='w+', dtype=np.float32,
+                                              shape=(total, embeddings.shape[1]))
+                    vectors[row:row + len(embeddings)] = embeddings
+                    row += len(embeddings)
+                    for chunk_id, document, metadata in zip(batch['ids'], batch['documents'], batch['metadatas']):
+                        chunks_file.write(json.dumps({"id": chunk_id, "document": document,
+                                                      "metadata": metadata, "layout": layout}) + "\n")
+                    print(f"  ✓ {row}/{total} chunks")
+        vectors.flush()
+        dimensions = vectors.shape[1]
+        del vectors
+
+        with open(staging / "catalog.json", 'w') as f:
+            json.dump({"sources": snapshot["sources"], "settings": catalog.settings()}, f, indent=2)
+
+        if DEFAULT_SYMBOL_INDEX_PATH.exists():
+            # Online backup: consistent even while an indexer is writing
+            source = sqlite3.connect(str(DEFAULT_SYMBOL_INDEX_PATH))
+            backup = sqlite3.connect(str(staging / "symbols.sqlite"))
+            try:
+                source.backup(backup)
+            finally:
+                backup.close()
+                source.close()
+
+        with open(staging / "manifest.json", 'w') as f:
+            json.dump({
+                "format": SNAPSHOT_FORMAT,
+                "created_at": utc_now(),
+                "catalog_version": catalog.version(),
+                "generation": storage.generation,
+                "chunks": total,
+                "dimensions": dimensions,
+                "embedding_model": snapshot["embedding_model"],
+                "sources": len(snapshot["sources"])
+            }, f, indent=2)
+        # The snapshot only appears under its name once it is complete
+        staging.rename(target)
+    finally:
+        catalog.close()
+
+    print(f"\n✅ Snapshot written to {target}")
+    print(f"   Chunks: {total}, dimensions: {dimensions}")
+    return 0
+
+
+def read_chunks(path: Path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def model_mismatch(manifest) -> str:
+    """Why the snapshot's vectors don't fit this node's query embeddings, or None"""
+    model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    if manifest.get("embedding_model") != model:
+        return f"snapshot was embedded with {manifest.get('embedding_model')}, this node uses {model}"
+    if model in MODEL_DIMENSIONS and manifest.get("dimensions") != MODEL_DIMENSIONS[model]:
+        return (f"snapshot has {manifest.get('dimensions')} dimensions, "
+                f"{model} produces {MODEL_DIMENSIONS[model]}")
+    return None
+
+
+def import_snapshot(path: str, force: bool = False) -> int:
+    source = Path(path)
+    if not source.is_absolute() and not source.exists():
+        source = SNAPSHOTS_PATH / path
+    with open(source / "manifest.json") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        print(f"❌ Unsupported snapshot format {manifest.get('format')} (expected {SNAPSHOT_FORMAT})")
+        return 1
+    with open(source / "catalog.json") as f:
+        saved_catalog = json.load(f)
+
+    vectors = np.load(source / "vectors.npy", mmap_mode='r')
+    if vectors.shape != (manifest["chunks"], manifest["dimensions"]):
+        print(f"❌ vectors.npy has shape {vectors.shape}, manifest says "
+              f"({manifest['chunks']}, {manifest['dimensions']})")
+        return 1
+    mismatch = model_mismatch(manifest)
+    if mismatch:
+        if not force:
+            print(f"❌ Refusing to import: {mismatch} (--force to import anyway)")
+            return 1
+        print(f"⚠️  Importing anyway (--force): {mismatch}")
+    print(f"📥 Importing {manifest['chunks']} chunks ({manifest['embedding_model']}, "
+          f"{manifest['dimensions']} dimensions) from {source}")
+
+    catalog = Catalog()
+    generation = catalog.allocate_generation()
+    client = open_client()
+    # Collections are built with the snapshot's HNSW parameters; the live settings change only at the swap
+    layouts = {layout: Storage(client, layout=layout, generation=generation, settings=saved_catalog["settings"])
+               for layout in ("single", "per-source")}
+    print(f"  🟦 Loading into generation {generation}")
+
+    ids, texts, metadatas = [], [], []
+    try:
+        pending = []
+
+        def flush():
+            # Group the batch by target collection and add each group in one call
+            groups = {}
+            for row, chunk in pending:
+                storage = layouts[chunk["layout"]]
+                key = storage.write_collection_name(chunk["metadata"]["source_id"])
+                groups.setdefault(key, (storage, chunk["metadata"]["source_id"], []))[2].append((row, chunk))
+            for storage, key, rows in groups.values():
+                storage.write_collection(key).add(
+                    ids=[chunk["id"] for _, chunk in rows],
+                    documents=[chunk["document"] for _, chunk in rows],
+                    metadatas=[chunk["metadata"] for _, chunk in rows],
+                    embeddings=vectors[[row for row, _ in rows]].tolist()
+                )
+            pending.clear()
+
+        for row, chunk in enumerate(read_chunks(source / "chunks.jsonl.gz")):
+            pending.append((row, chunk))
+            ids.append(chunk["id"])
+            texts.append(chunk["document"])
+            metadatas.append(chunk["metadata"])
+            if len(pending) == BATCH_SIZE:
+                flush()
+                print(f"  ✓ {row + 1}/{manifest['chunks']} chunks")
+        flush()
+    except BaseException:
+        layouts["single"].drop_generation(generation)
+        catalog.close()
+        raise
+
+    # Swap: sources, settings and the generation pointer in one transaction
+    catalog.replace_all(saved_catalog["sources"], settings=saved_catalog["settings"], generation=generation)
+    catalog.close()
+
+    lexical_index = LexicalIndex()
+    lexical_index.replace_all(ids, texts, metadatas)
+    lexical_index.close()
+
+    if (source / "symbols.sqlite").exists():
+        DEFAULT_SYMBOL_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = DEFAULT_SYMBOL_INDEX_PATH.with_name(f".{DEFAULT_SYMBOL_INDEX_PATH.name}.import")
+        shutil.copyfile(source / "symbols.sqlite", tmp_path)
+        tmp_path.replace(DEFAULT_SYMBOL_INDEX_PATH)
+
+    retired = layouts["single"].drop_generations_before(generation)
+    print(f"🔀 Swapped in generation {generation} ({retired} retired collections removed)")
+    if exact_enabled():
+        ExactIndex().sync_all(layouts["single"])
+        print("🧮 Exact search matrices rebuilt")
+    print(f"\n✅ Imported {len(ids)} chunks from {len(saved_catalog['sources'])} sources")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import an index snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", aliases=["export-snapshot"],
+                                        help="Write the live index to data/snapshots/NAME")
+    export_parser.add_argument("--name", help="Snapshot name (default: snapshot-v<catalog version>-<time>)")
+    import_parser = commands.add_parser("import", aliases=["import-snapshot"],
+                                        help="Load a snapshot and swap it in")
+    import_parser.add_argument("path", help="Snapshot directory (or a name under data/snapshots)")
+    import_parser.add_argument("--force", action="store_true",
+                               help="Import even if the snapshot's embedding model or dimensions "
+                                    "differ from this node's")
+    args = parser.parse_args()
+
+    if args.command in ("export", "export-snapshot"):
+        sys.exit(export_snapshot(args.name))
+    sys.exit(import_snapshot(args.path, args.force))
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Move sources out of the shared "documentation" collection into one collection each
+
+Run once after switching to COLLECTION_LAYOUT=per-source so existing sources get
+the per-source layout without re-embedding them.
+"""
+import sys
+
+from dotenv import load_dotenv
+
+from catalog import Catalog, source_id
+from storage import Storage
+
+# Load environment
+load_dotenv()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Give each indexed source its own collection')
+    parser.add_argument('sources', nargs='*', help='Source names to move (default: all sources)')
+    args = parser.parse_args()
+
+    storage = Storage(layout="per-source")
+    catalog = Catalog()
+    try:
+        names = args.sources or [source["name"] for source in catalog.sources()]
+        total = 0
+        for name in names:
+            source = catalog.get_source(name)
+            key = source.get("source_id") if source else source_id(name)
+            moved = storage.split_source(key)
+            total += moved
+            if source and source.get("collection") != storage.write_collection_name(key):
+                catalog.upsert_source({**source, "collection": storage.write_collection_name(key)})
+            print(f"  ✓ {name}: moved {moved} chunks to {storage.write_collection_name(key)}")
+    finally:
+        catalog.close()
+
+    print(f"\n✅ Moved {total} chunks from {len(names)} sources")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
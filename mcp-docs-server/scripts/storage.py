@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Collection storage and query routing
+Chunks live either in the shared "documentation" collection (the default) or,
+with COLLECTION_LAYOUT=per-source, in one collection per source. Writers ask
+for their source's collection; searches go through a router that queries only
+the requested sources' collections - or fans out to all of them in parallel -
+and merges the top-k by distance. Both layouts can coexist while sources are
+re-indexed.
+
+Full rebuilds are blue/green: they write a new generation of collections
+(g<N>_documentation, g<N>_src_<id>) while searches keep reading the live one,
+then flip the catalog's generation pointer. Storage follows that pointer on
+every use, so a running server switches over without a restart, and the
+retired generation is dropped afterwards.
+
+Sources with a tombstone in the catalog (deleted, purge pending) are routed
+around: their collections are skipped and the shared collection is queried
+with a source_id $nin filter.
+
+Searches get priority over writers (search_priority.py): every routed read
+reports its latency and retries on lock errors, and the collections handed to
+writers pace their add/upsert/delete calls by that latency.
+
+New collections are created with the HNSW parameters (M, construction_ef,
+search_ef) recorded in the catalog settings - "hnsw", with per-source
+"hnsw_overrides" for per-source collections - or set with HNSW_M,
+HNSW_CONSTRUCTION_EF and HNSW_SEARCH_EF, which take precedence. Unset ones
+stay at Chroma's defaults. tune_hnsw.py measures and records them.
+"""
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import chromadb
+from chromadb.config import Settings
+
+from catalog import Catalog
+from search_priority import ThrottledCollection, WriteThrottle, record_search, retry_read
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent / "data" / "chroma_db"
+
+SHARED_COLLECTION = "documentation"
+SOURCE_COLLECTION_PREFIX = "src_"
+COLLECTION_METADATA = {"hnsw:space": "cosine"}
+
+# Tunable HNSW parameters -> (Chroma collection metadata key, environment override)
+HNSW_PARAMETERS = {
+    "M": ("hnsw:M", "HNSW_M"),
+    "construction_ef": ("hnsw:construction_ef", "HNSW_CONSTRUCTION_EF"),
+    "search_ef": ("hnsw:search_ef", "HNSW_SEARCH_EF")
+}
+
+LAYOUTS = ("single", "per-source")
+
+# Chroma collection names: 3-63 characters of [a-zA-Z0-9._-], starting and ending alphanumeric
+VALID_COLLECTION_NAME = re.compile(r'^[a-zA-Z0-9][a-zA-Z0-9._-]{1,61}[a-zA-Z0-9]$')
+
+# Chunk collections of any generation: [g<N>_]documentation or [g<N>_]src_<id>
+CHUNK_COLLECTION = re.compile(r'^(?:g(\d+)_)?(?:documentation$|src_)')
+
+
+def open_client(db_path=None):
+    # CHROMA_DB_PATH points indexers and shard servers at a shard's own store
+    db_path = Path(db_path or os.getenv("CHROMA_DB_PATH") or DEFAULT_DB_PATH)
+    db_path.mkdir(parents=True, exist_ok=True)
+    return chromadb.PersistentClient(
+        path=str(db_path),
+        settings=Settings(anonymized_telemetry=False)
+    )
+
+
+def collection_metadata(hnsw: Dict = None) -> Dict:
+    """Metadata for a new chunk collection with these HNSW parameters"""
+    metadata = dict(COLLECTION_METADATA)
+    for key, value in (hnsw or {}).items():
+        if key not in HNSW_PARAMETERS:
+            raise ValueError(f"Unknown HNSW parameter: {key} (expected one of {', '.join(HNSW_PARAMETERS)})")
+        if value is not None:
+            metadata[HNSW_PARAMETERS[key][0]] = int(value)
+    return metadata
+
+
+def generation_prefix(generation: int) -> str:
+    # Generation 0 keeps the original collection names
+    return f"g{generation}_" if generation else ""
+
+
+def shared_collection_name(generation: int = 0) -> str:
+    return generation_prefix(generation) + SHARED_COLLECTION
+
+
+def source_collection_name(source_id: str, generation: int = 0) -> str:
+    """Collection holding one source under the per-source layout"""
+    prefix = generation_prefix(generation) + SOURCE_COLLECTION_PREFIX
+    name = prefix + source_id
+    if not VALID_COLLECTION_NAME.match(name) or '..' in name:
+        # Non-ASCII or overlong ids: fall back to a stable hash
+        name = prefix + hashlib.sha1(source_id.encode('utf-8')).hexdigest()[:24]
+    return name
+
+
+def collection_generation(name: str) -> Optional[int]:
+    """Generation a chunk collection belongs to, or None for other collections"""
+    match = CHUNK_COLLECTION.match(name)
+    return int(match.group(1) or 0) if match else None
+
+
+def collection_names(client) -> List[str]:
+    # list_collections() returns names in newer Chroma releases, Collection objects in older ones
+    return [c if isinstance(c, str) else c.name for c in client.list_collections()]
+
+
+class Storage:
+    def __init__(self, client=None, layout: str = None, generation: int = None, settings: Dict = None):
+        """
+        Args:
+            client: Chroma client (default: PersistentClient on data/chroma_db)
+            layout: "single" or "per-source" for new writes (COLLECTION_LAYOUT, default single)
+            generation: Generation to read and write (default: the catalog's live
+                        generation, re-read on every use); rebuilds pass their staging one
+            settings: Index settings to build new collections with instead of the catalog's
+                      (a snapshot import stages with the snapshot's HNSW parameters)
+        """
+        self.client = client or open_client()
+        self.layout = layout or os.getenv("COLLECTION_LAYOUT", "single")
+        if self.layout not in LAYOUTS:
+            raise ValueError(f"Unknown COLLECTION_LAYOUT: {self.layout} (expected one of {', '.join(LAYOUTS)})")
+        self._generation = generation
+        self._settings = settings
+        self._catalog = None
+        # Paces this writer's bulk writes while searches are slow
+        self.throttle = WriteThrottle()
+
+    @property
+    def catalog(self) -> Catalog:
+        if self._catalog is None:
+            self._catalog = Catalog()
+        return self._catalog
+
+    @property
+    def generation(self) -> int:
+        if self._generation is not None:
+            return self._generation
+        return self.catalog.generation()
+
+    def tombstoned_sources(self) -> frozenset:
+        """source_ids deleted from the catalog whose chunks may not be purged yet"""
+        return self.catalog.tombstoned_ids()
+
+    def hnsw(self, source_id: str = None) -> Dict[str, int]:
+        """HNSW parameters for a new collection (of one source, under the per-source layout)"""
+        settings = self._settings if self._settings is not None else self.catalog.settings()
+        params = dict(settings.get("hnsw") or {})
+        if source_id:
+            params.update((settings.get("hnsw_overrides") or {}).get(source_id) or {})
+        for key, (_, variable) in HNSW_PARAMETERS.items():
+            if os.getenv(variable):
+                params[key] = int(os.getenv(variable))
+        return params
+
+    def _create(self, name: str, source_id: str = None):
+        return self.client.get_or_create_collection(name=name, metadata=collection_metadata(self.hnsw(source_id)))
+
+    def _get(self, name: str):
+        try:
+            return self.client.get_collection(name=name)
+        except Exception:
+            return None
+
+    def shared_collection(self, create: bool = False):
+        name = shared_collection_name(self.generation)
+        if create:
+            return self._create(name)
+        return self._get(name)
+
+    def write_collection(self, source_id: str) -> ThrottledCollection:
+        """Collection new chunks of a source go to under the configured layout (writes yield to searches)"""
+        if self.layout == "per-source":
+            collection = self._create(source_collection_name(source_id, self.generation), source_id)
+        else:
+            collection = self.shared_collection(create=True)
+        return ThrottledCollection(collection, self.throttle)
+
+    def write_collection_name(self, source_id: str) -> str:
+        if self.layout == "per-source":
+            return source_collection_name(source_id, self.generation)
+        return shared_collection_name(self.generation)
+
+    def remove_source(self, source_id: str) -> int:
+        """
+        Delete a source's chunks wherever they are
+
+        Under the per-source layout this drops the source's collection without
+        touching anyone else's index. Returns the number of chunks removed.
+        """
+        removed = 0
+        own_name = source_collection_name(source_id, self.generation)
+        own = self._get(own_name)
+        if own is not None:
+            removed += own.count()
+            self.client.delete_collection(own_name)
+
+        shared = self.shared_collection()
+        if shared is not None:
+            old = shared.get(where={"source_id": source_id}, include=[])
+            if old['ids']:
+                ThrottledCollection(shared, self.throttle).delete(ids=old['ids'])
+                removed += len(old['ids'])
+        return removed
+
+    def remove_source_batch(self, source_id: str, batch_size: int) -> int:
+        """
+        Delete up to batch_size of a source's chunks (its own collection goes in one step)
+
+        Lets a background purge hold Chroma's write lock only briefly at a time.
+        Returns the number removed; 0 once nothing is left.
+        """
+        own_name = source_collection_name(source_id, self.generation)
+        own = self._get(own_name)
+        if own is not None:
+            removed = own.count()
+            self.client.delete_collection(own_name)
+            return removed
+
+        shared = self.shared_collection()
+        if shared is None:
+            return 0
+        batch = shared.get(where={"source_id": source_id}, limit=batch_size, include=[])
+        if batch['ids']:
+            self.throttle.wait()
+            shared.delete(ids=batch['ids'])
+        return len(batch['ids'])
+
+    def split_source(self, source_id: str, batch_size: int = 500) -> int:
+        """
+        Move a source's chunks from the shared collection into its own collection
+
+        Embeddings are copied as they are, so nothing is re-embedded. Returns the
+        number of chunks moved.
+        """
+        shared = self.shared_collection()
+        if shared is None:
+            return 0
+        target = ThrottledCollection(self._create(source_collection_name(source_id, self.generation), source_id),
+                                     self.throttle)
+        moved = 0
+        while True:
+            # Moved chunks leave the shared collection, so always read the first page
+            batch = shared.get(where={"source_id": source_id}, limit=batch_size,
+                               include=["documents", "metadatas", "embeddings"])
+            if not len(batch['ids']):
+                break
+            target.upsert(ids=batch['ids'], documents=batch['documents'],
+                          metadatas=batch['metadatas'], embeddings=batch['embeddings'])
+            ThrottledCollection(shared, self.throttle).delete(ids=batch['ids'])
+            moved += len(batch['ids'])
+        return moved
+
+    def copy_generation(self, generation: int, batch_size: int = 500) -> Dict[str, str]:
+        """
+        Copy the live collections into another generation, created with the current HNSW parameters
+
+        M and construction_ef are fixed when a collection is built, so changing them
+        means rebuilding its graph; embeddings are copied as they are, so nothing is
+        re-embedded. Deleted (tombstoned) sources are left behind. Returns
+        {live collection name: new name}.
+        """
+        live = self.generation
+        tombstoned = self.tombstoned_sources()
+        copied = {}
+        for name in sorted(collection_names(self.client)):
+            if collection_generation(name) != live:
+                continue
+            collection = self.client.get_collection(name=name)
+            if name == shared_collection_name(live):
+                key = None
+                target_name = shared_collection_name(generation)
+                where = {"source_id": {"$nin": sorted(tombstoned)}} if tombstoned else None
+            else:
+                # Per-source collections carry the source_id on every chunk
+                sample = collection.get(limit=1, include=["metadatas"])
+                if not sample['ids'] or sample['metadatas'][0].get("source_id") in tombstoned:
+                    continue
+                key = sample['metadatas'][0]["source_id"]
+                target_name = source_collection_name(key, generation)
+                where = None
+            target = ThrottledCollection(self._create(target_name, key), self.throttle)
+            offset = 0
+            while True:
+                params = {"limit": batch_size, "offset": offset, "include": ["documents", "metadatas", "embeddings"]}
+                if where:
+                    params["where"] = where
+                batch = collection.get(**params)
+                if not len(batch['ids']):
+                    break
+                target.add(ids=batch['ids'], documents=batch['documents'],
+                           metadatas=batch['metadatas'], embeddings=batch['embeddings'])
+                offset += len(batch['ids'])
+            copied[name] = target_name
+        return copied
+
+    def drop_generation(self, generation: int) -> int:
+        """Delete the collections of one generation (e.g. a failed rebuild); returns how many"""
+        names = [name for name in collection_names(self.client) if collection_generation(name) == generation]
+        for name in names:
+            self.client.delete_collection(name)
+        return len(names)
+
+    def drop_generations_before(self, generation: int) -> int:
+        """Garbage-collect generations retired by a swap (and abandoned older rebuilds)"""
+        names = [name for name in collection_names(self.client)
+                 if collection_generation(name) is not None and collection_generation(name) < generation]
+        for name in names:
+            self.client.delete_collection(name)
+        return len(names)
+
+    def source_chunks(self, source_id: str, include: List[str], ids: List[str] = None) -> Dict:
+        """All chunks of one source (or just those with these ids), like Collection.get"""
+        found = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        own = self._get(source_collection_name(source_id, self.generation))
+        shared = self.shared_collection()
+        for collection, where in ((own, None), (shared, {"source_id": source_id})):
+            if collection is None:
+                continue
+            params = {"include": include}
+            if where:
+                params["where"] = where
+            if ids is not None:
+                params["ids"] = ids
+            part = collection.get(**params)
+            found["ids"].extend(part["ids"])
+            for key in ("documents", "metadatas", "embeddings"):
+                if key in include:
+                    found[key].extend(part[key])
+        return found
+
+    def router(self) -> "QueryRouter":
+        return QueryRouter(self)
+
+
+class QueryRouter:
+    def __init__(self, storage: Storage, max_workers: int = None):
+        """
+        Args:
+            storage: Storage to route over
+            max_workers: Collections queried in parallel (ROUTER_WORKERS, default 8)
+        """
+        self.storage = storage
+        self.max_workers = int(max_workers or os.getenv("ROUTER_WORKERS", 8))
+
+    def targets(self, source_ids: List[str] = None) -> List[tuple]:
+        """
+        (collection, where) pairs covering the requested sources (all sources if None)
+
+        A source with its own collection is queried there unfiltered; sources still in
+        the shared collection are served from it with a source_id filter.
+        """
+        # Only the live generation is searched; it is re-read so swaps take effect immediately
+        generation = self.storage.generation
+        tombstoned = self.storage.tombstoned_sources()
+        names = set(collection_names(self.storage.client))
+        shared_name = shared_collection_name(generation)
+        targets = []
+        if source_ids:
+            shared_ids = []
+            for source_id in source_ids:
+                if source_id in tombstoned:
+                    continue
+                name = source_collection_name(source_id, generation)
+                if name in names:
+                    targets.append((self.storage.client.get_collection(name=name), None))
+                else:
+                    shared_ids.append(source_id)
+            if shared_ids and shared_name in names:
+                where = ({"source_id": shared_ids[0]} if len(shared_ids) == 1
+                         else {"source_id": {"$in": shared_ids}})
+                targets.append((self.storage.client.get_collection(name=shared_name), where))
+            return targets
+
+        deleted = {source_collection_name(source_id, generation) for source_id in tombstoned}
+        for name in sorted(names):
+            if collection_generation(name) != generation or name in deleted:
+                continue
+            where = None
+            if name == shared_name and tombstoned:
+                where = {"source_id": {"$nin": sorted(tombstoned)}}
+            targets.append((self.storage.client.get_collection(name=name), where))
+        return targets
+
+    def tombstoned_sources(self) -> frozenset:
+        return self.storage.tombstoned_sources()
+
+    def _routed(self, source_ids: List[str], call) -> List:
+        """Run call on every target; retried once if a swap retired the collections mid-query"""
+        started = time.perf_counter()
+        generation = self.storage.generation
+        try:
+            return self._fan_out(self.targets(source_ids), call)
+        except Exception:
+            if self.storage.generation == generation:
+                raise
+            # The generation we were reading was swapped out (and collected) under us
+            return self._fan_out(self.targets(source_ids), call)
+        finally:
+            # Writers in other processes slow down while this climbs
+            record_search(time.perf_counter() - started)
+
+    def _fan_out(self, targets: List[tuple], call):
+        if not targets:
+            return []
+        if len(targets) == 1:
+            return [retry_read(call, *targets[0])]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets))) as pool:
+            return list(pool.map(lambda target: retry_read(call, *target), targets))
+
+    def query(self, query_embedding: List[float], n_results: int, source_ids: List[str] = None) -> Dict:
+        """
+        Nearest chunks across the routed collections, merged by distance
+
+        Returns:
+            {"ids", "documents", "metadatas", "distances"} as flat lists, best first
+        """
+        def query_one(collection, where):
+            if collection.count() == 0:
+                return []
+            params = {
+                "query_embeddings": [query_embedding],
+                "n_results": n_results,
+                "include": ["documents", "metadatas", "distances"]
+            }
+            if where:
+                params["where"] = where
+            results = collection.query(**params)
+            return list(zip(results["distances"][0], results["ids"][0],
+                            results["documents"][0], results["metadatas"][0]))
+
+        hits = [hit for part in self._routed(source_ids, query_one) for hit in part]
+        hits.sort(key=lambda hit: hit[0])
+        hits = hits[:n_results]
+        return {
+            "ids": [hit[1] for hit in hits],
+            "documents": [hit[2] for hit in hits],
+            "metadatas": [hit[3] for hit in hits],
+            "distances": [hit[0] for hit in hits]
+        }
+
+    def take_failures(self) -> List[Dict]:
+        """Local collections never drop out of a query (see ShardCoordinator.take_failures)"""
+        return []
+
+    def get(self, ids: List[str], include: List[str] = ("documents", "metadatas"),
+            source_ids: List[str] = None) -> Dict:
+        """Chunks by id from whichever routed collection holds them, like Collection.get"""
+        def get_one(collection, where):
+            return collection.get(ids=ids, where=where, include=list(include))
+
+        found = {"ids": [], "documents": [], "metadatas": []}
+        for part in self._routed(source_ids, get_one):
+            found["ids"].extend(part["ids"])
+            for key in ("documents", "metadatas"):
+                if key in include:
+                    found[key].extend(part[key])
+        return found
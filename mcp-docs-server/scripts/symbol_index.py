@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Symbol index
+On-disk map from code identifiers to where they are defined (file, line range
+and the chunks holding them), built while repositories are indexed. Lets
+identifier queries be answered exactly, without an embedding round trip.
+"""
+import json
+import re
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_SYMBOL_INDEX_PATH = Path(__file__).parent.parent / "data" / "symbols.sqlite"
+
+# Identifier shapes: dotted/namespaced names, optionally called - foo.bar, Foo::bar, Foo#bar, foo()
+IDENTIFIER = re.compile(r'^[A-Za-z_$][\w$]*(?:(?:\.|::|#)[A-Za-z_$][\w$]*)*(?:\(\))?$')
+BACKTICKED = re.compile(r'`([^`\s]+)`')
+LOOKUP_PHRASE = re.compile(
+    r'^(?:where\s+is|where\'s|definition\s+of|find|locate|go\s+to|show(?:\s+me)?)\s+'
+    r'(?:the\s+)?(?:(?:function|class|method|symbol|type)\s+)?(\S+?)(?:\s+(?:defined|declared|implemented))?\s*\??$',
+    re.IGNORECASE
+)
+
+# "config.json" and "package.json" are file names, not dotted identifiers. Suffixes that are
+# also common attribute names (console.log, process.env, mutex.lock) are left out
+FILE_EXTENSIONS = {
+    'json', 'jsonl', 'yaml', 'yml', 'toml', 'ini', 'cfg', 'conf', 'xml', 'csv', 'tsv', 'md', 'mdx', 'rst',
+    'txt', 'html', 'htm', 'css', 'scss', 'sass', 'less', 'js', 'mjs', 'cjs', 'jsx', 'ts', 'tsx', 'py', 'pyi',
+    'rb', 'go', 'rs', 'java', 'kt', 'swift', 'c', 'h', 'cc', 'cpp', 'hpp', 'cs', 'php', 'sh', 'bash', 'zsh',
+    'proto', 'png', 'jpg', 'jpeg', 'gif', 'svg', 'pdf', 'zip', 'gz', 'tar', 'wasm', 'lockb', 'dockerfile'
+}
+
+
+def _is_code_like(name: str) -> bool:
+    """Whether a bare token is distinctive enough to be treated as an identifier"""
+    if not IDENTIFIER.match(name):
+        return False
+    bare = name[:-2] if name.endswith('()') else name
+    return ('_' in bare or '.' in bare or '::' in bare or '#' in bare or name.endswith('()')
+            or bool(re.search(r'[a-z][A-Z]', bare)))
+
+
+def extract_identifier(query: str) -> Optional[str]:
+    """
+    The identifier a query asks for, or None for natural-language queries
+
+    Matches a bare identifier ("RepoIndexer.collect_files", "chunk_text()"),
+    a single backticked identifier, and "where is X defined"-style lookups.
+    Plain words are not treated as identifiers.
+    """
+    query = query.strip()
+    candidate = None
+    if _is_code_like(query.strip('`')):
+        candidate = query.strip('`')
+    else:
+        backticked = [token for token in BACKTICKED.findall(query) if IDENTIFIER.match(token)]
+        if len(backticked) == 1:
+            candidate = backticked[0]
+        else:
+            match = LOOKUP_PHRASE.match(query)
+            if match and _is_code_like(match.group(1).strip('`')):
+                candidate = match.group(1).strip('`')
+    if candidate is None:
+        return None
+    if candidate.endswith('()'):
+        candidate = candidate[:-2]
+    elif '.' in candidate and candidate.rsplit('.', 1)[1].lower() in FILE_EXTENSIONS:
+        # A file name; a call like response.json() is still an identifier
+        return None
+    return candidate.replace('::', '.').replace('#', '.')
+
+
+class SymbolIndex:
+    def __init__(self, path=None):
+        self.path = Path(path or DEFAULT_SYMBOL_INDEX_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS symbols (
+                    source TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    short_name TEXT NOT NULL,
+                    kind TEXT,
+                    file_path TEXT NOT NULL,
+                    full_path TEXT,
+                    start_line INTEGER,
+                    end_line INTEGER,
+                    chunk_ids TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS symbols_short_name ON symbols (short_name COLLATE NOCASE)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS symbols_source ON symbols (source)")
+
+    def replace_source(self, source: str, symbols: Iterable[Dict]):
+        """
+        Replace all symbols of a source
+
+        Args:
+            source: Source id (catalog.source_id of the source name)
+            symbols: {"name", "kind", "file_path", "full_path", "start_line", "end_line", "chunk_ids"}
+        """
+        rows = [
+            (source, s["name"], s["name"].rsplit('.', 1)[-1], s.get("kind"), s["file_path"],
+             s.get("full_path"), s.get("start_line"), s.get("end_line"), json.dumps(s["chunk_ids"]))
+            for s in symbols
+        ]
+        with self.conn:
+            self.conn.execute("DELETE FROM symbols WHERE source = ?", (source,))
+            self.conn.executemany("INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def delete_source(self, source: str) -> int:
+        with self.conn:
+            return self.conn.execute("DELETE FROM symbols WHERE source = ?", (source,)).rowcount
+
+    def lookup(self, identifier: str, sources: List[str] = None, limit: int = 10) -> List[Dict]:
+        """
+        Definitions matching an identifier, best match first
+
+        "collect_files" matches any definition with that name; "RepoIndexer.collect_files"
+        only those whose qualified name ends with it. Exact-case matches rank first.
+        """
+        identifier = identifier.replace('::', '.').replace('#', '.')
+        short_name = identifier.rsplit('.', 1)[-1]
+        sql = "SELECT * FROM symbols WHERE short_name = ? COLLATE NOCASE"
+        params = [short_name]
+        if sources:
+            sql += f" AND source IN ({', '.join('?' for _ in sources)})"
+            params.extend(sources)
+
+        self.conn.row_factory = sqlite3.Row
+        try:
+            rows = [dict(row) for row in self.conn.execute(sql, params)]
+        finally:
+            self.conn.row_factory = None
+
+        matches = []
+        for row in rows:
+            name = row["name"]
+            if '.' in identifier and not (name.lower() == identifier.lower()
+                                          or name.lower().endswith('.' + identifier.lower())):
+                continue
+            rank = (
+                name != identifier,
+                not (name == identifier or name.endswith('.' + identifier)),
+                row["short_name"] != short_name,
+                name.count('.')
+            )
+            row["chunk_ids"] = json.loads(row["chunk_ids"])
+            matches.append((rank, row))
+        matches.sort(key=lambda m: m[0])
+        return [row for _, row in matches[:limit]]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Tune the HNSW index parameters against a held-out query set
+A random sample of indexed chunks is held out: the rest of the sample is
+built into scratch collections (one per M / search_ef combination), and the
+held-out chunks' embeddings are used as queries. Each configuration reports
+recall@k against the exact nearest neighbours (NumPy brute force) and its
+p50/p95 query latency, so the trade-off can be read off one table.
+
+The fastest configuration that reaches --target-recall is recorded in the
+catalog settings ("hnsw", or "hnsw_overrides" with --source, which needs the
+per-source layout), where every collection created from then on picks it up. --apply also rebuilds the live
+collections with it right away: they are copied into a new generation and
+swapped in like a rebuild, without re-embedding anything. The measurements
+are kept in data/hnsw_tuning.json.
+
+    python scripts/tune_hnsw.py --m 8,16,32 --search-ef 10,50,100,200
+    COLLECTION_LAYOUT=per-source python scripts/tune_hnsw.py --source "Moca Network" --target-recall 0.98 --apply
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from dotenv import load_dotenv
+
+from catalog import Catalog, source_id, utc_now
+from storage import DEFAULT_DB_PATH, Storage, collection_metadata, open_client
+
+# Load environment
+load_dotenv()
+
+TUNING_REPORT_PATH = Path(__file__).parent.parent / "data" / "hnsw_tuning.json"
+BATCH_SIZE = 1000
+
+
+def parse_values(text: str) -> List[int]:
+    return sorted({int(value) for value in text.split(',') if value.strip()})
+
+
+def load_embeddings(storage: Storage, catalog: Catalog, count: int, rng: np.random.Generator,
+                    key: str = None) -> np.ndarray:
+    """
+    Embeddings of a random sample of count live chunks (of one source with key)
+
+    Only the chunk ids are listed up front; embeddings are fetched for the
+    sampled ids alone, so a large index is never loaded whole. Rows come back
+    in random order.
+    """
+    keys = [key] if key else [source["source_id"] for source in catalog.sources()]
+    chunks = [(source_key, chunk_id) for source_key in keys
+              for chunk_id in storage.source_chunks(source_key, include=[])["ids"]]
+    picked = [chunks[row] for row in rng.permutation(len(chunks))[:count]]
+
+    by_source = {}
+    for source_key, chunk_id in picked:
+        by_source.setdefault(source_key, []).append(chunk_id)
+    embeddings = {}
+    for source_key, chunk_ids in by_source.items():
+        for start in range(0, len(chunk_ids), BATCH_SIZE):
+            part = storage.source_chunks(source_key, include=["embeddings"],
+                                         ids=chunk_ids[start:start + BATCH_SIZE])
+            embeddings.update(zip(part["ids"], part["embeddings"]))
+    vectors = [embeddings[chunk_id] for _, chunk_id in picked if chunk_id in embeddings]
+    return np.asarray(vectors, dtype=np.float32) if vectors else np.empty((0, 0), dtype=np.float32)
+
+
+def exact_neighbours(corpus: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    """Row numbers of each query's k nearest corpus vectors by cosine distance"""
+    corpus = corpus / np.maximum(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12)
+    queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    similarity = queries @ corpus.T
+    return [set(np.argpartition(-row, k - 1)[:k].tolist()) for row in similarity]
+
+
+def measure(client, corpus: np.ndarray, queries: np.ndarray, truth: List[set], k: int, hnsw: Dict) -> Dict:
+    """Build a scratch collection with these parameters and time the held-out queries against it"""
+    name = f"tune_m{hnsw['M']}_ef{hnsw['search_ef']}"
+    collection = client.create_collection(name=name, metadata=collection_metadata(hnsw))
+    try:
+        started = time.perf_counter()
+        for start in range(0, len(corpus), BATCH_SIZE):
+            rows = range(start, min(start + BATCH_SIZE, len(corpus)))
+            collection.add(ids=[str(row) for row in rows], embeddings=corpus[start:rows.stop].tolist())
+        build_seconds = time.perf_counter() - started
+
+        latencies, found = [], 0
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=["distances"])
+            latencies.append((time.perf_counter() - started) * 1000)
+            found += len({int(row) for row in result["ids"][0]} & expected)
+    finally:
+        client.delete_collection(name)
+
+    return {
+        **hnsw,
+        "recall": found / (k * len(queries)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "build_s": build_seconds
+    }
+
+
+def choose(results: List[Dict], target_recall: float) -> Dict:
+    """Fastest configuration meeting the recall target, else the most accurate one"""
+    good = [result for result in results if result["recall"] >= target_recall]
+    if good:
+        return min(good, key=lambda result: (result["p50_ms"], -result["recall"]))
+    return max(results, key=lambda result: (result["recall"], -result["p50_ms"]))
+
+
+def save_report(scope: str, report: Dict):
+    try:
+        with open(TUNING_REPORT_PATH) as f:
+            reports = json.load(f)
+    except (OSError, ValueError):
+        reports = {}
+    reports[scope] = report
+    TUNING_REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(TUNING_REPORT_PATH, 'w') as f:
+        json.dump(reports, f, indent=2)
+
+
+def apply_live(storage: Storage, catalog: Catalog) -> int:
+    """Rebuild the live collections with the recorded parameters (blue/green); returns the new generation"""
+    generation = catalog.allocate_generation()
+    print(f"  🟦 Copying the live collections into generation {generation}")
+    try:
+        copied = storage.copy_generation(generation)
+    except BaseException:
+        storage.drop_generation(generation)
+        raise
+    sources = [{**source, "collection": copied.get(source["collection"], source["collection"])}
+               if "collection" in source else source for source in catalog.sources()]
+    catalog.replace_all(sources, generation=generation)
+    retired = storage.drop_generations_before(generation)
+    print(f"🔀 Swapped in generation {generation} ({len(copied)} collections rebuilt, {retired} retired)")
+    return generation
+
+
+def tune(args) -> int:
+    storage = Storage()
+    catalog = Catalog()
+    try:
+        key = None
+        if args.source:
+            source = catalog.get_source(args.source)
+            if not source:
+                print(f"❌ Source '{args.source}' not found")
+                return 1
+            key = source.get("source_id") or source_id(source["name"])
+            if storage.layout != "per-source":
+                # Per-source overrides are only read when a source gets its own collection
+                print(f"❌ --source needs the per-source layout (COLLECTION_LAYOUT=per-source); "
+                      f"under the {storage.layout} layout every source shares the index-wide settings")
+                return 1
+
+        rng = np.random.default_rng(args.seed)
+        vectors = load_embeddings(storage, catalog, args.sample + args.queries, rng, key)
+        if len(vectors) < args.queries + args.k:
+            print(f"❌ Not enough chunks to tune on: {len(vectors)} (need at least {args.queries + args.k})")
+            return 1
+
+        queries, corpus = vectors[:args.queries], vectors[args.queries:]
+        print(f"🎛️  Tuning HNSW on {len(corpus)} chunks with {len(queries)} held-out queries "
+              f"(recall@{args.k}, target {args.target_recall})")
+        truth = exact_neighbours(corpus, queries, args.k)
+
+        current = storage.hnsw(key)
+        construction_ef = args.construction_ef or current.get("construction_ef") or 100
+        scratch = tempfile.mkdtemp(prefix=".hnsw-tuning-", dir=DEFAULT_DB_PATH.parent)
+        results = []
+        try:
+            client = open_client(scratch)
+            print(f"\n  {'M':>4} {'search_ef':>10} {'recall':>8} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8}")
+            for m in args.m:
+                for search_ef in args.search_ef:
+                    result = measure(client, corpus, queries, truth, args.k,
+                                     {"M": m, "construction_ef": construction_ef, "search_ef": search_ef})
+                    results.append(result)
+                    print(f"  {m:>4} {search_ef:>10} {result['recall']:>8.3f} {result['p50_ms']:>8.2f} "
+                          f"{result['p95_ms']:>8.2f} {result['build_s']:>8.1f}")
+                    sys.stdout.flush()
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+        best = choose(results, args.target_recall)
+        chosen = {name: best[name] for name in ("M", "construction_ef", "search_ef")}
+        if best["recall"] < args.target_recall:
+            print(f"\n⚠️  No configuration reached recall {args.target_recall}; taking the most accurate")
+        print(f"\n✅ Chosen: M={chosen['M']}, construction_ef={chosen['construction_ef']}, "
+              f"search_ef={chosen['search_ef']} (recall {best['recall']:.3f}, p50 {best['p50_ms']:.2f} ms)")
+
+        scope = args.source or "all sources"
+        save_report(scope, {
+            "tuned_at": utc_now(),
+            "chunks": len(corpus),
+            "queries": len(queries),
+            "k": args.k,
+            "target_recall": args.target_recall,
+            "chosen": chosen,
+            "results": results
+        })
+        if args.dry_run:
+            print("   Dry run: settings not recorded")
+            return 0
+
+        if key:
+            overrides = dict(catalog.settings().get("hnsw_overrides") or {})
+            overrides[key] = chosen
+            catalog.set_settings({"hnsw_overrides": overrides})
+        else:
+            catalog.set_settings({"hnsw": chosen})
+        print(f"   Recorded for {scope}; new collections use it")
+
+        if args.apply:
+            apply_live(storage, catalog)
+        else:
+            print("   Existing collections keep their parameters until rebuilt (--apply, or a --replace re-index)")
+    finally:
+        catalog.close()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep HNSW parameters and record the best recall/latency trade-off")
+    parser.add_argument("--source", help="Tune one source's collection (per-source layout) instead of the whole index")
+    parser.add_argument("--m", type=parse_values, default=[8, 16, 32],
+                        help="Comma-separated M values to try (default: 8,16,32)")
+    parser.add_argument("--search-ef", type=parse_values, default=[10, 25, 50, 100, 200],
+                        help="Comma-separated search_ef values to try (default: 10,25,50,100,200)")
+    parser.add_argument("--construction-ef", type=int, default=None,
+                        help="construction_ef for every build (default: current setting, or 100)")
+    parser.add_argument("-k", type=int, default=10, help="Neighbours per query for recall@k (default: 10)")
+    parser.add_argument("--queries", type=int, default=200, help="Held-out queries (default: 200)")
+    parser.add_argument("--sample", type=int, default=20000,
+                        help="Chunks built into each scratch index (default: 20000)")
+    parser.add_argument("--target-recall", type=float, default=0.95,
+                        help="Recall@k the chosen settings must reach (default: 0.95)")
+    parser.add_argument("--seed", type=int, default=0, help="Sampling seed (default: 0)")
+    parser.add_argument("--dry-run", action="store_true", help="Report only; do not record the chosen settings")
+    parser.add_argument("--apply", action="store_true",
+                        help="Also rebuild the live collections with the chosen settings")
+    args = parser.parse_args()
+
+    try:
+        sys.exit(tune(args))
+    except Exception as e:
+        print(f"❌ Tuning failed: {e}")
+        sys.exit(1)
@@ -9,17 +9,21 @@ from pathlib import Path
 from typing import Optional
 import json
 
-# Add parent directory to path
+# Add parent directory (and the shared scripts) to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
 
 from dotenv import load_dotenv
-import chromadb
-from chromadb.config import Settings
 from openai import OpenAI
 import mcp.server.stdio
 import mcp.types as types
 from mcp.server import NotificationOptions, Server
 
+from retrieval import search
+from catalog import Catalog
+from storage import Storage, open_client
+from sharding import open_router
+
 # Load environment
 load_dotenv()
 
@@ -30,13 +34,10 @@ DEFAULT_RESULTS = int(os.getenv("DEFAULT_RESULTS", 5))
 
 # Initialize clients
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-chroma_client = chromadb.PersistentClient(
-    path=str(DB_PATH),
-    settings=Settings(anonymized_telemetry=False)
-)
+storage = Storage(open_client(DB_PATH))
 
-# Metadata path
-metadata_path = Path(__file__).parent.parent / "data" / "chunks" / "metadata.json"
+# Source catalog (one connection; snapshots are cached until the catalog version changes)
+catalog = Catalog()
 
 # Format metadata for compatibility (support both single and multi-source)
 def get_source_display(sources):
@@ -49,16 +50,12 @@ def get_source_display(sources):
     return first.get("url", first.get("name", "Unknown"))
 
 def load_metadata():
-    """Load and format metadata from file (reloads dynamically)"""
+    """Current catalog state (re-read only when an indexer has changed it)"""
     try:
-        # Resolve absolute path to ensure we're reading the correct file
-        abs_path = metadata_path.resolve()
-        with open(abs_path, 'r') as f:
-            metadata = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        metadata = catalog.snapshot()
+    except Exception as e:
         # Log error for debugging (only to stderr, not in MCP response)
-        print(f"Error loading metadata from {metadata_path.resolve()}: {e}", file=sys.stderr)
-        # Return default metadata if file doesn't exist or is invalid
+        print(f"Error reading catalog {catalog.path}: {e}", file=sys.stderr)
         return {
             "total_pages": 0,
             "total_chunks": 0,
@@ -68,29 +65,31 @@ def load_metadata():
             "indexed_at": "N/A",
             "embedding_model": "text-embedding-3-small",
             "chunk_size": 800,
-            "chunk_overlap": 100
+            "chunk_overlap": 100,
+            "hnsw": {}
         }
     
     return {
-        "total_pages": metadata.get("total_pages", 0) or sum(s.get("pages", 0) for s in metadata.get("sources", [])),
-        "total_chunks": metadata.get("total_chunks", 0),
-        "total_words": metadata.get("total_words", 0),
-        "source": metadata.get("source") or get_source_display(metadata.get("sources", [])),
-        "sources": metadata.get("sources", []),
-        "indexed_at": metadata.get("indexed_at") or metadata.get("last_updated"),
-        "embedding_model": metadata.get("embedding_model", "text-embedding-3-small"),
-        "chunk_size": metadata.get("chunk_size", 800),
-        "chunk_overlap": metadata.get("chunk_overlap", 100)
+        "total_pages": metadata["total_pages"],
+        "total_chunks": metadata["total_chunks"],
+        "total_words": metadata["total_words"],
+        "source": get_source_display(metadata["sources"]),
+        "sources": metadata["sources"],
+        "indexed_at": metadata["last_updated"] or "N/A",
+        "embedding_model": metadata["embedding_model"],
+        "chunk_size": metadata["chunk_size"],
+        "chunk_overlap": metadata["chunk_overlap"],
+        "hnsw": metadata.get("hnsw") or {}
     }
 
 # Load initial metadata
 index_metadata = load_metadata()
 
-# Get collection
-try:
-    collection = chroma_client.get_collection(name="documentation")
-except Exception as e:
-    print(f"Error loading collection: {e}", file=sys.stderr)
+# Routes each search to the collections of the requested sources (or all of them in parallel),
+# or scatters it across the shard servers in data/shards.json
+router = open_router(storage)
+if not router.targets():
+    print(f"Error loading collection: no indexed collections in {DB_PATH}", file=sys.stderr)
     sys.exit(1)
 
 # Create MCP server
@@ -110,7 +109,7 @@ async def handle_list_tools() -> list[types.Tool]:
         types.Tool(
             name="search-docs",
             description=(
-                f"Search through indexed documentation using semantic search. "
+                f"Search through indexed documentation using hybrid keyword + semantic search. "
                 f"Returns relevant documentation chunks with context. "
                 f"Indexed: {current_metadata['total_pages']} pages, "
                 f"{current_metadata['total_chunks']} chunks, "
@@ -132,6 +131,16 @@ async def handle_list_tools() -> list[types.Tool]:
                     "source": {
                         "type": "string",
                         "description": f"Optional: Filter by documentation source. Available sources: {sources_text}. Leave empty to search all sources."
+                    },
+                    "sources": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Optional: Search within several sources at once (combined with 'source' if both are given)"
+                    },
+                    "mode": {
+                        "type": "string",
+                        "enum": ["hybrid", "vector", "keyword"],
+                        "description": "Optional: 'hybrid' (keyword + semantic, default), 'vector' (semantic only) or 'keyword' (exact terms such as error messages and config keys, fastest)"
                     }
                 },
                 "required": ["query"]
@@ -165,8 +174,11 @@ async def handle_call_tool(
             f"**Total Words:** {current_metadata['total_words']:,}\n"
             f"**Embedding Model:** {current_metadata['embedding_model']}\n"
             f"**Chunk Size:** {current_metadata['chunk_size']} tokens\n"
-            f"**Chunk Overlap:** {current_metadata['chunk_overlap']} tokens\n\n"
+            f"**Chunk Overlap:** {current_metadata['chunk_overlap']} tokens\n"
         )
+        if current_metadata['hnsw']:
+            info += f"**HNSW:** {', '.join(f'{key}={value}' for key, value in current_metadata['hnsw'].items())}\n"
+        info += "\n"
         
         # Add sources breakdown if available
         if current_metadata.get('sources'):
@@ -193,7 +205,8 @@ async def handle_call_tool(
     elif name == "search-docs":
         query = arguments.get("query")
         max_results = arguments.get("max_results", DEFAULT_RESULTS)
-        source_filter = arguments.get("source")
+        source_filter = ([arguments["source"]] if arguments.get("source") else []) + list(arguments.get("sources") or [])
+        mode = arguments.get("mode")
         
         if not query:
             return [types.TextContent(
@@ -202,49 +215,17 @@ async def handle_call_tool(
             )]
         
         try:
-            # Generate embedding for query
-            response = openai_client.embeddings.create(
-                model=EMBEDDING_MODEL,
-                input=query
+            # Identifier queries are answered from the symbol index, the rest by keyword and/or vector search
+            results = search(
+                router, openai_client, query,
+                max_results=max_results,
+                source_filter=source_filter,
+                embedding_model=EMBEDDING_MODEL,
+                mode=mode
             )
-            query_embedding = response.data[0].embedding
-            
-            # Build search parameters
-            search_params = {
-                "query_embeddings": [query_embedding],
-                "n_results": max_results,
-                "include": ["documents", "metadatas"]
-            }
-            
-            # Add source filter if specified
-            if source_filter:
-                # Determine which field to use for filtering
-                # Documentation sources use "source_name", repositories use "source"
-                filter_field = None
-                
-                # Check metadata to see if this is a documentation source
-                for src in current_metadata.get("sources", []):
-                    if src.get("name") == source_filter:
-                        # It's a documentation source, use source_name
-                        if src.get("type") == "documentation":
-                            filter_field = "source_name"
-                        else:
-                            # It's a repository, use source
-                            filter_field = "source"
-                        break
-                
-                # If not found in metadata, try source_name first (for documentation)
-                # then fall back to source (for repositories or URLs)
-                if filter_field is None:
-                    # Default to source_name for documentation sources
-                    filter_field = "source_name"
-                
-                search_params["where"] = {filter_field: source_filter}
-            
-            # Search
-            results = collection.query(**search_params)
+            failed_shards = router.take_failures()
             
-            if not results['documents'][0]:
+            if not results['documents']:
                 return [types.TextContent(
                     type="text",
                     text=f"No results found for query: '{query}'"
@@ -253,13 +234,18 @@ async def handle_call_tool(
             # Format results
             output = f"# Search Results for: \"{query}\"\n\n"
             if source_filter:
-                output += f"**Filtered by source:** {source_filter}\n\n"
-            output += f"Found {len(results['documents'][0])} relevant results:\n\n"
+                output += f"**Filtered by source:** {', '.join(source_filter)}\n\n"
+            if failed_shards:
+                output += f"**Partial results:** shards {', '.join(f['shard'] for f in failed_shards)} did not answer\n\n"
+            if results['match'] == "symbol":
+                output += f"Found {len(results['documents'])} exact symbol matches:\n\n"
+            else:
+                output += f"Found {len(results['documents'])} relevant results:\n\n"
             output += "---\n\n"
             
             for i, (doc, metadata) in enumerate(zip(
-                results['documents'][0], 
-                results['metadatas'][0]
+                results['documents'], 
+                results['metadatas']
             ), 1):
                 output += f"## Result {i}\n\n"
                 
@@ -272,6 +258,12 @@ async def handle_call_tool(
                     output += f"**File:** {metadata.get('file_path', 'Unknown')}\n\n"
                     output += f"**Full Path:** {metadata.get('full_path', 'Unknown')}\n\n"
                     output += f"**Lines:** {metadata.get('lines', 'Unknown')}\n\n"
+                    if metadata.get('matched_symbol'):
+                        output += (f"**Symbol:** {metadata['matched_symbol']} "
+                                   f"(lines {metadata['symbol_start_line']}-{metadata['symbol_end_line']})\n\n")
+                    elif metadata.get('symbol'):
+                        output += (f"**Symbols:** {metadata['symbol']} "
+                                   f"(lines {metadata.get('start_line')}-{metadata.get('end_line')})\n\n")
                 else:
                     # Documentation chunk
                     output += f"**Source:** {metadata.get('source_name', 'Unknown')} (Documentation)\n\n"
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Catalog keys: sources whose names fold to the same source_id ("C++" and "C")
+are stored, filtered and tombstoned under different keys.
+
+    python -m unittest discover mcp-docs-server/tests
+"""
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+
+class SourceKeyTest(unittest.TestCase):
+    def setUp(self):
+        from catalog import Catalog
+
+        self.tmp = Path(tempfile.mkdtemp())
+        self.catalog = Catalog(self.tmp / "catalog.sqlite", self.tmp / "metadata.json")
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def add(self, name):
+        key = self.catalog.source_key(name)
+        self.catalog.upsert_source({"name": name, "type": "documentation", "source_id": key})
+        return key
+
+    def test_colliding_names_get_different_keys(self):
+        c = self.add("C")
+        cpp = self.add("C++")
+        csharp = self.add("C#")
+        self.assertEqual(c, "c")
+        self.assertEqual(len({c, cpp, csharp}), 3)
+        self.assertEqual(self.catalog.get_source("C++")["source_id"], cpp)
+        # Re-indexing a source keeps its key
+        self.assertEqual(self.add("C++"), cpp)
+
+    def test_filters_resolve_to_one_source(self):
+        c = self.add("C")
+        cpp = self.add("C++")
+        self.assertEqual(self.catalog.source_ids_for(["C++"]), [cpp])
+        self.assertEqual(self.catalog.source_ids_for(["c"]), [c])
+
+    def test_tombstone_keeps_the_key(self):
+        self.add("C")
+        cpp = self.add("C++")
+        self.catalog.tombstone_source("C++")
+        self.assertEqual(self.catalog.tombstoned_ids(), {cpp})
+        # A new source cannot take the key of one awaiting its purge
+        self.assertNotIn(self.add("c++"), {"c", cpp})
+
+    def test_foreign_key_is_not_shared(self):
+        self.add("Node.js")
+        self.catalog.upsert_source({"name": "node-js", "source_id": "node-js"})
+        self.assertNotEqual(self.catalog.get_source("node-js")["source_id"], "node-js")
+
+
+if __name__ == "__main__":
+    unittest.main()
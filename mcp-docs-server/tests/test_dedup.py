@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection: two copies of a page that differ in a few words
+are clustered, a different page is not.
+
+    python -m unittest discover mcp-docs-server/tests
+"""
+import random
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+try:
+    import numpy  # noqa: F401
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class DedupTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        words = [f"word{rng.randrange(2000)}" for _ in range(3000)]
+        self.page = ' '.join(words)
+        # Same page with a changed footer (a print view or a versioned path)
+        self.near_copy = ' '.join(words[:-10] + ["printed", "from", "the", "docs"])
+        self.other = ' '.join(f"term{rng.randrange(2000)}" for _ in range(3000))
+
+    def test_signatures(self):
+        from dedup import NUM_PERMUTATIONS, minhash, similarity
+
+        page, near_copy, other = minhash(self.page), minhash(self.near_copy), minhash(self.other)
+        self.assertEqual(len(page), NUM_PERMUTATIONS)
+        self.assertGreater(similarity(page, near_copy), 0.9)
+        self.assertLess(similarity(page, other), 0.1)
+        self.assertEqual(minhash(""), ())
+
+    def test_dedupe_pages(self):
+        from dedup import dedupe_pages
+
+        pages = [{"url": "https://docs.example.com/v2/guide", "content": self.page},
+                 {"url": "https://docs.example.com/guide", "content": self.near_copy},
+                 {"url": "https://docs.example.com/api", "content": self.other}]
+        unique, skipped = dedupe_pages(pages)
+        self.assertEqual([page["url"] for page in unique],
+                         ["https://docs.example.com/guide", "https://docs.example.com/api"])
+        self.assertEqual(unique[0]["aliases"], ["https://docs.example.com/v2/guide"])
+        self.assertEqual(skipped, [{"url": "https://docs.example.com/v2/guide",
+                                    "canonical": "https://docs.example.com/guide"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
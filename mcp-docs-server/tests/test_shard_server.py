@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Smoke test: a shard server answers from its handler threads
+The router is first used on the main thread (as shard_server.main() does),
+then /health, /query and /get are hit concurrently from several threads.
+
+    python -m unittest discover mcp-docs-server/tests
+"""
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+try:
+    import chromadb  # noqa: F401
+except ImportError:
+    chromadb = None
+
+
+@unittest.skipIf(chromadb is None, "chromadb is not installed")
+class ShardServerThreadsTest(unittest.TestCase):
+    def setUp(self):
+        import catalog
+        import search_priority
+        from shard_server import make_handler
+        from storage import Storage, open_client
+
+        self.tmp = Path(tempfile.mkdtemp())
+        # Keep the test's catalog and search pressure file out of data/
+        self.patched = [(catalog, "DEFAULT_CATALOG_PATH", self.tmp / "catalog.sqlite"),
+                        (catalog, "METADATA_EXPORT_PATH", self.tmp / "metadata.json"),
+                        (search_priority, "SEARCH_PRESSURE_PATH", self.tmp / "search_pressure.json")]
+        self.saved = [(module, name, getattr(module, name)) for module, name, _ in self.patched]
+        for module, name, value in self.patched:
+            setattr(module, name, value)
+
+        storage = Storage(open_client(self.tmp / "chroma_db"))
+        storage.write_collection("docs").add(
+            ids=[f"docs-{i}" for i in range(3)],
+            documents=[f"chunk {i}" for i in range(3)],
+            metadatas=[{"source_id": "docs", "source": "Docs"} for _ in range(3)],
+            embeddings=[[1.0, float(i), 0.0] for i in range(3)]
+        )
+        router = storage.router()
+        self.assertEqual(len(router.targets()), 1)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(router, "test"))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for module, name, value in self.saved:
+            setattr(module, name, value)
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def request(self, path, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        with urllib.request.urlopen(urllib.request.Request(self.url + path, data=data), timeout=10) as response:
+            return response.status, json.loads(response.read())
+
+    def test_concurrent_requests(self):
+        calls = [("/health", None),
+                 ("/query", {"embedding": [1.0, 0.0, 0.0], "n_results": 2}),
+                 ("/get", {"ids": ["docs-1"]})] * 4
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            responses = list(pool.map(lambda call: self.request(*call), calls))
+
+        for (path, _), (status, body) in zip(calls, responses):
+            self.assertEqual(status, 200, path)
+            if path == "/health":
+                self.assertEqual(body["chunks"], 3)
+            elif path == "/query":
+                self.assertEqual(len(body["ids"]), 2)
+            else:
+                self.assertEqual(body["ids"], ["docs-1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -123,7 +123,7 @@ export default async function handler(req, res) {
         const totalLines = linesMatch ? parseInt(linesMatch[1].replace(/,/g, '')) : 0;
         const estimatedCost = costMatch ? parseFloat(costMatch[1]) : 0;
 
-        // Read metadata to get total stats
+        // Read the catalog export (written by the indexer) to get total stats
         const metadataPath = path.join(
           process.cwd(),
           'mcp-docs-server',
@@ -139,7 +139,8 @@ export default async function handler(req, res) {
           
           if (metadata.sources) {
             const totalSources = metadata.sources.length;
-            const totalChunks = metadata.sources.reduce((sum, s) => sum + (s.total_chunks || 0), 0);
+            const totalChunks = metadata.total_chunks
+              ?? metadata.sources.reduce((sum, s) => sum + (s.total_chunks || s.chunks || 0), 0);
             
             totalStats = {
               sources: totalSources,
@@ -152,18 +153,6 @@ export default async function handler(req, res) {
 
         console.log('Indexing complete!');
         
-        // Update metadata with indexed_at timestamp
-        try {
-          const metadata = JSON.parse(await fs.readFile(metadataPath, 'utf-8'));
-          const sourceIndex = metadata.sources.findIndex(s => s.name === sourceName);
-          if (sourceIndex >= 0) {
-            metadata.sources[sourceIndex].indexed_at = new Date().toISOString();
-            await fs.writeFile(metadataPath, JSON.stringify(metadata, null, 2));
-          }
-        } catch (err) {
-          console.warn('Could not update indexed_at timestamp:', err);
-        }
-        
         // Send final result
         sendProgress({
           type: 'complete',
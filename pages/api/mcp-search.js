@@ -9,7 +9,7 @@ export default async function handler(req, res) {
     return res.status(405).json({ error: 'Method not allowed' });
   }
 
-  const { query, maxResults = 5, sourceFilter = null } = req.body;
+  const { query, maxResults = 5, sourceFilter = null, mode = null } = req.body;
 
   if (!query || typeof query !== 'string') {
     return res.status(400).json({ error: 'Query is required' });
@@ -19,6 +19,10 @@ export default async function handler(req, res) {
     return res.status(400).json({ error: 'maxResults must be between 1 and 20' });
   }
 
+  if (mode && !['hybrid', 'vector', 'keyword'].includes(mode)) {
+    return res.status(400).json({ error: 'mode must be hybrid, vector or keyword' });
+  }
+
   try {
     // Path to the search script
     const searchScriptPath = path.join(
@@ -42,17 +46,21 @@ export default async function handler(req, res) {
 
     // Execute Python search script
     const result = await new Promise((resolve, reject) => {
-      const args = [
-        searchScriptPath,
-        query,
-        maxResults.toString()
-      ];
+      const args = [searchScriptPath];
       
-      // Add source filter if provided
-      if (sourceFilter) {
-        args.push(sourceFilter);
+      // Search mode (hybrid by default)
+      if (mode) {
+        args.push('--mode', mode);
       }
       
+      // Add source filter if provided (a name or a list of names)
+      for (const source of [].concat(sourceFilter || [])) {
+        args.push('--source', source);
+      }
+      
+      // Everything after -- is positional, even a query starting with a dash
+      args.push('--', query, maxResults.toString());
+      
       const process = spawn(pythonPath, args);
 
       let stdout = '';